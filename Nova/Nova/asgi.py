@@ -3,6 +3,11 @@ ASGI config for Nova project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+La aplicación se sirve con WSGI (gunicorn Nova.wsgi); este proceso ASGI atiende solo las rutas de
+RUTAS_ASGI (logs en vivo), que el proxy le envía. Bajo ASGI Django lee completos en memoria los
+StreamingHttpResponse/FileResponse síncronos (exportaciones, ZIP de facturas, PDF, reportes), así
+que cualquier otra ruta responde 404 aquí.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +18,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Nova.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+RUTAS_ASGI = ('/api/logs/stream/',)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and not scope['path'].startswith(RUTAS_ASGI):
+        await send({'type': 'http.response.start', 'status': 404, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b'No disponible en el proceso ASGI.'})
+        return
+    await django_application(scope, receive, send)
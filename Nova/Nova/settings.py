@@ -75,6 +75,25 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Las transacciones toman el bloqueo de escritura al iniciar: las ventas
+        # concurrentes esperan su turno en lugar de fallar con "database is locked"
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+# Caché compartida entre procesos (gunicorn, worker de reportes, comandos de importación): la
+# invalidación de reportes por señales tiene que verse en todos. En producción puede apuntarse a Redis.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / 'cache' / 'django')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 5000))},
     }
 }
 
@@ -122,6 +141,55 @@ STATICFILES_FINDERS = [
     'django.contrib.staticfiles.finders.AppDirectoriesFinder',
 ]
 
+# Caché local de facturas PDF renderizadas (direccionada por contenido, evicción LRU)
+FACTURAS_CACHE_DIR = Path(os.getenv('FACTURAS_CACHE_DIR', BASE_DIR / 'cache' / 'facturas'))
+FACTURAS_CACHE_MAX_BYTES = int(os.getenv('FACTURAS_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+# QR y código de barras: 'vector' (gráficos nativos de ReportLab) o 'raster' (PNG con qrcode/python-barcode)
+FACTURAS_MODO_GRAFICOS = os.getenv('FACTURAS_MODO_GRAFICOS', 'vector')
+# Pre-renderizado al confirmar la venta: 'hilo' (en el proceso) o 'proceso' (pool local)
+FACTURAS_PRERENDER = os.getenv('FACTURAS_PRERENDER', 'True') == 'True'
+FACTURAS_PRERENDER_MODO = os.getenv('FACTURAS_PRERENDER_MODO', 'hilo')
+FACTURAS_PRERENDER_WORKERS = int(os.getenv('FACTURAS_PRERENDER_WORKERS', 2))
+# Exportación masiva de facturas en ZIP: pool de procesos (un worker por núcleo) y ventas por tarea
+FACTURAS_EXPORT_MODO = os.getenv('FACTURAS_EXPORT_MODO', 'proceso')
+FACTURAS_EXPORT_WORKERS = int(os.getenv('FACTURAS_EXPORT_WORKERS', os.cpu_count() or 2))
+FACTURAS_EXPORT_BLOQUE = int(os.getenv('FACTURAS_EXPORT_BLOQUE', 25))
+
+# PDF de reportes: el documento se arma en memoria hasta este tamaño y luego pasa a un temporal en disco
+REPORTES_PDF_MAX_MEMORIA = int(os.getenv('REPORTES_PDF_MAX_MEMORIA', 8 * 1024 * 1024))
+# Resultados de reportes en caché (totales y páginas por filtros). Las señales de los modelos los
+# invalidan al cambiar los datos; el TTL solo limita cuánto ocupan las combinaciones que no se repiten
+REPORTES_CACHE_TTL = int(os.getenv('REPORTES_CACHE_TTL', 3600))
+# Resultados más grandes que esto (p. ej. el reporte de ventas de un año) se calculan sin guardarse
+REPORTES_CACHE_MAX_FILAS = int(os.getenv('REPORTES_CACHE_MAX_FILAS', 2000))
+# Exportaciones en segundo plano (manage.py procesar_reportes): archivos generados, reutilización y retención
+REPORTES_TRABAJOS_DIR = Path(os.getenv('REPORTES_TRABAJOS_DIR', BASE_DIR / 'cache' / 'reportes'))
+REPORTES_TRABAJOS_TTL = int(os.getenv('REPORTES_TRABAJOS_TTL', 15 * 60))
+REPORTES_TRABAJOS_RETENCION = int(os.getenv('REPORTES_TRABAJOS_RETENCION', 24 * 3600))
+REPORTES_TRABAJOS_MODO = os.getenv('REPORTES_TRABAJOS_MODO', 'hilo')
+REPORTES_TRABAJOS_WORKERS = int(os.getenv('REPORTES_TRABAJOS_WORKERS', 2))
+
+# Auditoría (Log): eventos en memoria escritos en lotes de AUDITORIA_LOTE o cada AUDITORIA_INTERVALO
+# segundos. Si la base no responde se guardan hasta AUDITORIA_MAX_PENDIENTES y el resto se descarta.
+# 'sincrono' escribe cada evento en el acto (lo activan las pruebas)
+AUDITORIA_MODO = os.getenv('AUDITORIA_MODO', 'lotes')
+AUDITORIA_LOTE = int(os.getenv('AUDITORIA_LOTE', 100))
+AUDITORIA_INTERVALO = float(os.getenv('AUDITORIA_INTERVALO', 2))
+AUDITORIA_MAX_PENDIENTES = int(os.getenv('AUDITORIA_MAX_PENDIENTES', 10000))
+# Logs en vivo (SSE, /api/logs/stream/): eventos pendientes al conectar, latido para proxies (s),
+# consulta de respaldo por proceso para logs de otros procesos (s), cola por conexión (lotes) y
+# espera del navegador antes de reconectar (ms)
+LOGS_SSE_PENDIENTES = int(os.getenv('LOGS_SSE_PENDIENTES', 50))
+LOGS_SSE_LATIDO = float(os.getenv('LOGS_SSE_LATIDO', 15))
+LOGS_SSE_INTERVALO_DB = float(os.getenv('LOGS_SSE_INTERVALO_DB', 2))
+LOGS_SSE_COLA = int(os.getenv('LOGS_SSE_COLA', 100))
+LOGS_SSE_REINTENTO = int(os.getenv('LOGS_SSE_REINTENTO', 5000))
+# Retención de logs (manage.py archivar_logs): los más antiguos pasan a archivos JSONL comprimidos por
+# mes; logs_listar los busca bajo demanda y muestra como máximo LOGS_ARCHIVO_MAX_RESULTADOS
+LOGS_RETENCION_DIAS = int(os.getenv('LOGS_RETENCION_DIAS', 90))
+LOGS_ARCHIVO_DIR = Path(os.getenv('LOGS_ARCHIVO_DIR', BASE_DIR / 'archivo' / 'logs'))
+LOGS_ARCHIVO_MAX_RESULTADOS = int(os.getenv('LOGS_ARCHIVO_MAX_RESULTADOS', 500))
+
 # AutoField
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
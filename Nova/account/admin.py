@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django import forms
-from .models import Usuario, Rol, Categoria, Proveedor, Almacen, Producto, Venta, DetalleVenta, Kardex, Log 
+from .models import Usuario, Rol, Categoria, Proveedor, Almacen, Producto, Venta, DetalleVenta, Kardex, Log, ConsecutivoFactura, TrabajoReporte, VentaResumenDiario, StockSnapshot, LogResumen
 
 class RolAdminForm(forms.ModelForm):
     class Meta:
@@ -72,6 +72,10 @@ class ProductoAdmin(admin.ModelAdmin):
 class VentaAdmin(admin.ModelAdmin):
     list_display = ['id', 'usuario', 'fecha', 'total']
 
+@admin.register(ConsecutivoFactura)
+class ConsecutivoFacturaAdmin(admin.ModelAdmin):
+    list_display = ['nit_empresa', 'ultimo_numero']
+
 @admin.register(DetalleVenta)
 class DetalleVentaAdmin(admin.ModelAdmin):
     list_display = ['venta', 'producto', 'cantidad', 'precio_unitario']
@@ -80,6 +84,30 @@ class DetalleVentaAdmin(admin.ModelAdmin):
 class KardexAdmin(admin.ModelAdmin):
     list_display = ['producto', 'tipo', 'cantidad', 'fecha', 'motivo']
 
+@admin.register(VentaResumenDiario)
+class VentaResumenDiarioAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'producto', 'usuario', 'unidades', 'neto', 'iva', 'bruto']
+    list_filter = ['fecha']
+    list_select_related = ['producto', 'usuario']
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'producto', 'cantidad', 'precio_unitario']
+    list_select_related = ['producto']
+    date_hierarchy = 'fecha'
+
+@admin.register(LogResumen)
+class LogResumenAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'usuario', 'modelo', 'accion', 'cantidad']
+    list_filter = ['modelo', 'accion']
+    list_select_related = ['usuario']
+    date_hierarchy = 'fecha'
+
+@admin.register(TrabajoReporte)
+class TrabajoReporteAdmin(admin.ModelAdmin):
+    list_display = ['reporte', 'formato', 'usuario', 'estado', 'creado', 'terminado']
+    list_filter = ['estado', 'reporte', 'formato']
+
 @admin.register(Log)
 class LogAdmin(admin.ModelAdmin):
     list_display = ['usuario', 'modelo', 'accion', 'fecha']
\ No newline at end of file
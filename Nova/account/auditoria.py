@@ -0,0 +1,146 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
+from django.utils import timezone
+
+from .log_stream import hub
+from .models import Log
+
+logger = logging.getLogger(__name__)
+
+# ====================================================
+# --- Registro de auditoría en lotes ---
+# ====================================================
+# Cada request autenticado y cada cambio de modelo generan una fila de Log. En lugar de un INSERT por
+# evento (una transacción de escritura por página vista en SQLite), los eventos se acumulan en memoria
+# por proceso y un hilo los escribe con bulk_create al llegar a AUDITORIA_LOTE o cada
+# AUDITORIA_INTERVALO segundos, y una última vez al terminar el proceso. La fecha es la del evento,
+# no la de la escritura. Si la base no está disponible el lote vuelve a la cola (hasta
+# AUDITORIA_MAX_PENDIENTES) y se reintenta en el siguiente ciclo. En modo 'sincrono' (pruebas) cada
+# evento se escribe en el acto. Lo escrito se publica en el hub de logs en vivo (log_stream.py).
+
+
+class BufferAuditoria:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._pendientes = []
+        self._hilo = None
+        self._pid = None
+        self.escritos = 0
+        self.descartados = 0
+        self.fallos = 0
+
+    def agregar(self, log):
+        with self._lock:
+            if len(self._pendientes) >= settings.AUDITORIA_MAX_PENDIENTES:
+                # La base no está recibiendo escrituras: se pierde el evento antes que la memoria del proceso
+                self.descartados += 1
+                return
+            self._pendientes.append(log)
+            lleno = len(self._pendientes) >= settings.AUDITORIA_LOTE
+            self._iniciar_hilo()
+        if lleno:
+            self._despertar.set()
+
+    def _iniciar_hilo(self):
+        # Tras un fork (gunicorn con preload) el hilo del proceso padre no existe en el hijo
+        if self._hilo is None or self._pid != os.getpid() or not self._hilo.is_alive():
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._ciclo, name='auditoria', daemon=True)
+            self._hilo.start()
+
+    def _ciclo(self):
+        while True:
+            self._despertar.wait(settings.AUDITORIA_INTERVALO)
+            self._despertar.clear()
+            try:
+                self.vaciar()
+            finally:
+                close_old_connections()
+
+    def _reencolar(self, lote):
+        """Devuelve un lote no escrito al frente de la cola; lo que no cabe se descarta."""
+        with self._lock:
+            espacio = max(settings.AUDITORIA_MAX_PENDIENTES - len(self._pendientes), 0)
+            self._pendientes = lote[:espacio] + self._pendientes
+            self.descartados += max(len(lote) - espacio, 0)
+
+    def vaciar(self):
+        """Escribe lo pendiente. Devuelve cuántos registros se guardaron."""
+        with self._lock:
+            lote, self._pendientes = self._pendientes, []
+        if not lote:
+            return 0
+        try:
+            escritos = Log.objects.bulk_create(lote, batch_size=500)
+        except (OperationalError, InterfaceError):
+            # Base no disponible: el lote espera al siguiente ciclo
+            logger.exception('No se pudo escribir el lote de auditoría; se reintenta más tarde')
+            self.fallos += 1
+            self._reencolar(lote)
+            return 0
+        except Exception:
+            # Una fila inválida (p. ej. un usuario borrado entre el evento y la escritura) no tumba el lote
+            logger.exception('No se pudo escribir el lote de auditoría; se reintenta fila por fila')
+            self.fallos += 1
+            escritos = []
+            for i, log in enumerate(lote):
+                try:
+                    log.save(force_insert=True)
+                    escritos.append(log)
+                except (OperationalError, InterfaceError):
+                    self._reencolar(lote[i:])
+                    break
+                except Exception:
+                    self.descartados += 1
+        self.escritos += len(escritos)
+        hub.publicar_logs(escritos)
+        return len(escritos)
+
+    def estadisticas(self):
+        with self._lock:
+            pendientes = len(self._pendientes)
+        return {'pendientes': pendientes, 'escritos': self.escritos, 'descartados': self.descartados, 'fallos': self.fallos}
+
+
+buffer = BufferAuditoria()
+atexit.register(buffer.vaciar)
+
+
+def contexto_request(request):
+    """Campos de auditoría del request (ip, ruta, método, request_id) que LogUserMiddleware deja en el hilo."""
+    return {
+        'ip': request.META.get('REMOTE_ADDR') or None,
+        'ruta': request.path[:255],
+        'metodo': request.method,
+        'request_id': getattr(request, 'request_id', ''),
+    }
+
+
+def registrar_log(usuario, modelo, accion, detalles, objeto_tipo='', objeto_id=None, **campos):
+    """
+    Registra un evento de auditoría; si ocurre dentro de una transacción, solo cuenta si se confirma.
+    Los campos del request en curso se toman del hilo salvo que se indiquen en `campos`.
+    """
+    campos = {**getattr(threading.current_thread(), 'auditoria', {}), **campos}
+    log = Log(usuario=usuario, modelo=modelo, accion=accion, detalles=detalles, fecha=timezone.now(),
+              objeto_tipo=objeto_tipo, objeto_id=objeto_id, **campos)
+    if settings.AUDITORIA_MODO == 'sincrono':
+        log.save(force_insert=True)
+        transaction.on_commit(lambda: hub.publicar_logs([log]))
+    else:
+        transaction.on_commit(lambda: buffer.agregar(log))
+
+
+def vaciar_auditoria():
+    return buffer.vaciar()
+
+
+def estadisticas_auditoria():
+    """Contadores del proceso actual: pendientes, escritos, descartados y lotes fallidos."""
+    return buffer.estadisticas()
@@ -0,0 +1,149 @@
+from decimal import Decimal
+
+from django.db import transaction, IntegrityError
+
+from .invoices import encolar_factura
+from .models import Producto, Venta, DetalleVenta, Kardex, VentaResumenDiario, StockInsuficienteError
+from .report_cache import invalidar_reportes
+
+IVA_GENERAL = Decimal('0.19')
+
+
+class VentaError(Exception):
+    """Error de validación o de stock al procesar una venta."""
+
+
+def leer_items_formulario(post_data):
+    """
+    Convierte los campos 'productos[i]' / 'cantidades[i]' del formulario de venta
+    en una lista [(producto_id, cantidad)], emparejando por índice.
+    """
+    productos = {}
+    cantidades = {}
+    for key, value in post_data.items():
+        if not value or not key.endswith(']'):
+            continue
+        if key.startswith('productos['):
+            productos[key[len('productos['):-1]] = value
+        elif key.startswith('cantidades['):
+            cantidades[key[len('cantidades['):-1]] = value
+
+    if not productos or set(productos) != set(cantidades):
+        raise VentaError('Debe agregar al menos un producto con cantidad válida.')
+
+    items = []
+    for indice, prod_id in productos.items():
+        try:
+            items.append((int(prod_id), int(cantidades[indice])))
+        except (TypeError, ValueError):
+            raise VentaError('Debe agregar al menos un producto con cantidad válida.')
+    return items
+
+
+def _agrupar_items(items):
+    """Suma las cantidades de líneas repetidas del mismo producto (conserva el orden)."""
+    agrupados = {}
+    for prod_id, cantidad in items:
+        if cantidad <= 0:
+            raise VentaError('Las cantidades deben ser mayores que cero.')
+        agrupados[prod_id] = agrupados.get(prod_id, 0) + cantidad
+    if not agrupados:
+        raise VentaError('Debe agregar al menos un producto con cantidad válida.')
+    return agrupados
+
+
+def _validar_carrito(agrupados, productos):
+    """Valida el carrito completo en una sola pasada y devuelve todos los errores juntos."""
+    errores = []
+    for prod_id, cantidad in agrupados.items():
+        prod = productos.get(prod_id)
+        if prod is None or not prod.estado:
+            errores.append(f'Producto no encontrado (ID: {prod_id}).')
+        elif prod.cantidad < cantidad:
+            errores.append(f'Stock insuficiente para {prod.nombre}.')
+    if errores:
+        raise VentaError(' '.join(errores))
+
+
+def _construir_detalles(agrupados, productos):
+    """Arma los DetalleVenta (sin guardar) con precio en COP e IVA, y el total de la venta."""
+    detalles = []
+    total = Decimal('0')
+    for prod_id, cantidad in agrupados.items():
+        precio_unitario = productos[prod_id].precio_en_cop()
+        precio_con_iva = precio_unitario * (Decimal(1) + IVA_GENERAL)
+        detalles.append(DetalleVenta(
+            producto_id=prod_id,
+            cantidad=cantidad,
+            precio_unitario=precio_unitario,
+            iva=IVA_GENERAL,
+            precio_con_iva=precio_con_iva,
+        ))
+        total += cantidad * precio_con_iva
+    return detalles, total.quantize(Decimal('0.01'))
+
+
+def validar_clave_idempotencia(clave):
+    clave = (clave or '').strip()
+    if len(clave) > 64:
+        raise VentaError('Clave de idempotencia inválida.')
+    return clave or None
+
+
+def procesar_venta(usuario, items, cliente_nombre=None, cliente_cedula=None, clave_idempotencia=None):
+    """
+    Registra una venta completa como una sola unidad atómica.
+
+    items: lista de (producto_id, cantidad). El número de consultas no depende
+    de la cantidad de líneas: un in_bulk para validar, un UPDATE condicional para
+    el stock (Kardex.registrar_movimientos) y bulk_create para los detalles.
+
+    Si la clave de idempotencia ya fue usada se devuelve la venta original sin
+    volver a validar stock ni escribir nada.
+    """
+    clave_idempotencia = validar_clave_idempotencia(clave_idempotencia)
+    if clave_idempotencia:
+        existente = Venta.objects.filter(clave_idempotencia=clave_idempotencia).first()
+        if existente:
+            return existente
+
+    agrupados = _agrupar_items(items)
+    productos = Producto.objects.only(
+        'id', 'nombre', 'precio_unitario', 'moneda', 'cantidad', 'estado'
+    ).in_bulk(list(agrupados))
+    _validar_carrito(agrupados, productos)
+
+    detalles, total = _construir_detalles(agrupados, productos)
+
+    try:
+        with transaction.atomic():
+            venta = Venta.objects.create(
+                usuario=usuario,
+                total=total,
+                cliente_nombre=cliente_nombre,
+                cliente_cedula=cliente_cedula,
+                clave_idempotencia=clave_idempotencia,
+            )
+            Kardex.registrar_movimientos(
+                [(prod_id, 'salida', cantidad) for prod_id, cantidad in agrupados.items()],
+                motivo='venta',
+                usuario=usuario,
+                extras=[{'venta': venta}] * len(agrupados),
+            )
+            for detalle in detalles:
+                detalle.venta = venta
+            DetalleVenta.objects.bulk_create(detalles)
+            invalidar_reportes(DetalleVenta)
+            VentaResumenDiario.acumular([(venta, detalles)])
+            encolar_factura(venta.id)
+    except StockInsuficienteError as e:
+        # Otra venta concurrente consumió el stock entre la validación y el UPDATE
+        nombres = [productos[prod_id].nombre for prod_id in e.productos_ids if prod_id in productos]
+        raise VentaError(f'Stock insuficiente para {", ".join(nombres) or "uno de los productos"}.')
+    except IntegrityError:
+        # Doble envío simultáneo: el otro request ya insertó la venta con esta clave
+        existente = clave_idempotencia and Venta.objects.filter(clave_idempotencia=clave_idempotencia).first()
+        if not existente:
+            raise
+        return existente
+    return venta
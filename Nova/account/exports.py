@@ -0,0 +1,196 @@
+import csv
+import json
+import tempfile
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, StreamingHttpResponse
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, Spacer, TableStyle
+
+# ====================================================
+# --- CSV / NDJSON en streaming ---
+# ====================================================
+
+# Formatos que se exportan en streaming (el PDF sigue su propio camino)
+FORMATOS_STREAMING = ('csv', 'ndjson')
+TAMANO_CHUNK = 2000
+
+
+def formato_estado(valor):
+    return 'Activo' if valor else 'Inactivo'
+
+
+def formato_opcional(valor):
+    return '-' if valor in (None, '') else valor
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea escrita en vez de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def filas_queryset(queryset, columnas, chunk_size=TAMANO_CHUNK):
+    """Recorre el queryset por bloques con values_list: nunca se instancian modelos ni se carga todo."""
+    campos = [columna[1] for columna in columnas]
+    formatos = [columna[2] if len(columna) > 2 else None for columna in columnas]
+    filas = queryset.select_related(None).prefetch_related(None).values_list(*campos)
+    for fila in filas.iterator(chunk_size=chunk_size):
+        yield [formato(valor) if formato else valor for formato, valor in zip(formatos, fila)]
+
+
+def generar_csv(encabezados, filas):
+    writer = csv.writer(_Eco())
+    yield '\ufeff'  # BOM: Excel abre el archivo en UTF-8 (tildes y eñes)
+    yield writer.writerow(encabezados)
+    for fila in filas:
+        yield writer.writerow(fila)
+
+
+def generar_ndjson(claves, filas):
+    for fila in filas:
+        yield json.dumps(dict(zip(claves, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def generar_texto(formato, columnas, filas):
+    """Líneas CSV o NDJSON para filas ya formateadas según `columnas`."""
+    if formato == 'ndjson':
+        return generar_ndjson([columna[1] for columna in columnas], filas)
+    return generar_csv([columna[0] for columna in columnas], filas)
+
+
+def exportar_streaming(queryset, columnas, formato, nombre, chunk_size=TAMANO_CHUNK):
+    """
+    Respuesta en streaming (CSV o NDJSON) de un queryset filtrado.
+    `columnas`: [(encabezado, campo_orm[, formateador])]; memoria constante sin importar el número de filas.
+    """
+    contenido = generar_texto(formato, columnas, filas_queryset(queryset, columnas, chunk_size))
+    if formato == 'ndjson':
+        content_type = 'application/x-ndjson; charset=utf-8'
+    else:
+        content_type = 'text/csv; charset=utf-8'
+    response = StreamingHttpResponse(contenido, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+    return response
+
+
+# ====================================================
+# --- PDF de reportes grandes ---
+# ====================================================
+
+FILAS_POR_TABLA = 500
+TAMANO_FUENTE = 8
+ALTO_FILA = TAMANO_FUENTE + 4
+PADDING_CELDA = 6  # LEFTPADDING/RIGHTPADDING por defecto de Table
+ESTILO_CELDA = ParagraphStyle('celda', fontName='Helvetica', fontSize=TAMANO_FUENTE, leading=TAMANO_FUENTE + 2,
+                              alignment=TA_CENTER)
+
+ESTILO_TABLA = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.skyblue),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 0), (-1, -1), TAMANO_FUENTE),
+])
+
+
+class _DocumentoPorPartes(SimpleDocTemplate):
+    """
+    SimpleDocTemplate que toma los flowables de un generador a medida que los dibuja: build() recibe solo
+    los primeros y handle_flowable, el punto de extensión de ReportLab para cada flowable, repone la lista
+    cuando quedan pocos. Solo hay unas pocas tablas vivas a la vez.
+    """
+
+    def handle_flowable(self, flowables):
+        super().handle_flowable(flowables)
+        # ReportLab también llama handle_flowable con sus listas internas (acciones de inicio de página)
+        if flowables is self._lista and len(flowables) < 2:
+            flowables.extend(islice(self._pendientes, 2))
+
+    def construir(self, flowables):
+        self._pendientes = iter(flowables)
+        self._lista = list(islice(self._pendientes, 2))
+        self.build(self._lista)
+
+
+def _anchos_columnas(encabezados, muestra, ancho_total):
+    """Anchos fijos a partir de una muestra: evita que LongTable mida cada celda del reporte."""
+    pesos = []
+    for i, encabezado in enumerate(encabezados):
+        largos = sorted(len(fila[i]) for fila in muestra) or [0]
+        tipico = largos[int(len(largos) * 0.9) - 1] if len(largos) > 1 else largos[0]
+        pesos.append(min(max(len(encabezado), tipico, 4), 40))
+    total = sum(pesos)
+    return [ancho_total * peso / total for peso in pesos]
+
+
+def _celda(texto, ancho):
+    """El texto que cabe en una línea queda como cadena; el resto pasa a Paragraph y ocupa varias líneas."""
+    if '\n' not in texto and stringWidth(texto, ESTILO_CELDA.fontName, TAMANO_FUENTE) <= ancho - 2 * PADDING_CELDA:
+        return texto
+    return Paragraph(escape(texto).replace('\n', '<br/>'), ESTILO_CELDA)
+
+
+def _tabla(encabezados, bloque, anchos):
+    datos = [list(encabezados)]
+    altos = [ALTO_FILA]
+    for fila in bloque:
+        celdas = [_celda(valor, ancho) for valor, ancho in zip(fila, anchos)]
+        datos.append(celdas)
+        # Alto fijo para las filas de una línea: LongTable solo mide las que tienen Paragraph
+        altos.append(None if any(isinstance(celda, Paragraph) for celda in celdas) else ALTO_FILA)
+    tabla = LongTable(datos, colWidths=anchos, rowHeights=altos, repeatRows=1)
+    tabla.setStyle(ESTILO_TABLA)
+    return tabla
+
+
+def _tablas(encabezados, filas, ancho_total, filas_por_tabla):
+    """Parte las filas en LongTables de tamaño fijo; el encabezado se repite en cada tabla y página."""
+    filas = ([str(valor) for valor in fila] for fila in filas)
+    bloque = list(islice(filas, filas_por_tabla))
+    anchos = _anchos_columnas(encabezados, bloque, ancho_total)
+    yield _tabla(encabezados, bloque, anchos)  # sin filas queda solo el encabezado
+    while bloque := list(islice(filas, filas_por_tabla)):
+        yield _tabla(encabezados, bloque, anchos)
+
+
+def generar_pdf(titulo, secciones, filas_por_tabla=FILAS_POR_TABLA):
+    """
+    Arma el PDF de un reporte con memoria acotada y devuelve el archivo (posicionado al inicio).
+    `secciones`: [(subtitulo | None, encabezados, filas_iterables)]. Las filas se consumen por bloques
+    y el documento se escribe a un SpooledTemporaryFile que pasa a disco al superar el umbral.
+    """
+    archivo = tempfile.SpooledTemporaryFile(max_size=settings.REPORTES_PDF_MAX_MEMORIA)
+    doc = _DocumentoPorPartes(archivo, pagesize=letter)
+    estilos = getSampleStyleSheet()
+
+    def flowables():
+        yield Paragraph(titulo, estilos['Heading1'])
+        for subtitulo, encabezados, filas in secciones:
+            if subtitulo:
+                yield Spacer(1, 12)
+                yield Paragraph(subtitulo, estilos['Heading2'])
+            yield from _tablas(encabezados, filas, doc.width, filas_por_tabla)
+
+    doc.construir(flowables())
+    archivo.seek(0)
+    return archivo
+
+
+def exportar_pdf(titulo, secciones, nombre):
+    return FileResponse(generar_pdf(titulo, secciones), as_attachment=True, filename=f'{nombre}.pdf',
+                        content_type='application/pdf')
+
+
+def seccion_queryset(queryset, columnas, subtitulo=None):
+    """Sección de exportar_pdf a partir de un queryset, con las mismas columnas que el CSV."""
+    return (subtitulo, [columna[0] for columna in columnas], filas_queryset(queryset, columnas))
@@ -0,0 +1,167 @@
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .auditoria import registrar_log
+from .checkout import (
+    VentaError, _agrupar_items, _construir_detalles, _validar_carrito, validar_clave_idempotencia,
+)
+from .models import (
+    Producto, Venta, DetalleVenta, Kardex, VentaResumenDiario, ConsecutivoFactura, StockInsuficienteError,
+)
+from .report_cache import invalidar_reportes
+
+TAMANO_LOTE = 500
+
+
+def _leer_venta(indice, datos):
+    """Normaliza una venta del archivo/JSON: {'lineas': [{'producto': id, 'cantidad': n}], 'fecha': ISO, ...}."""
+    if not isinstance(datos, dict):
+        raise VentaError('Formato de venta inválido.')
+    lineas = datos.get('lineas')
+    if not isinstance(lineas, list) or not lineas:
+        raise VentaError('La venta no tiene líneas.')
+    try:
+        items = [(int(linea['producto']), int(linea['cantidad'])) for linea in lineas]
+    except (KeyError, TypeError, ValueError):
+        raise VentaError('Cada línea requiere "producto" y "cantidad" enteros.')
+
+    fecha = timezone.now()
+    if datos.get('fecha'):
+        try:
+            # Bien formada pero inexistente (2024-02-30) lanza ValueError en lugar de devolver None
+            fecha = parse_datetime(str(datos['fecha']))
+        except ValueError:
+            raise VentaError(f'Fecha inválida: {datos["fecha"]}.')
+        if fecha is None:
+            raise VentaError(f'Fecha inválida: {datos["fecha"]}.')
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+
+    return {
+        'indice': indice,
+        'referencia': datos.get('referencia'),
+        'agrupados': _agrupar_items(items),
+        'fecha': fecha,
+        'cliente_nombre': datos.get('cliente_nombre'),
+        'cliente_cedula': datos.get('cliente_cedula'),
+        'clave_idempotencia': validar_clave_idempotencia(datos.get('clave_idempotencia')),
+    }
+
+
+def _escribir_lote(lote, productos, usuario, nit_empresa):
+    """Escribe un lote de ventas ya validadas en una transacción, con bulk_create por tabla."""
+    with transaction.atomic():
+        primer_numero = ConsecutivoFactura.reservar(nit_empresa, len(lote))
+        armadas = [_construir_detalles(pendiente['agrupados'], productos) for pendiente in lote]
+        ventas = Venta.objects.bulk_create([
+            Venta(
+                usuario=usuario,
+                fecha=pendiente['fecha'],
+                total=total,
+                cliente_nombre=pendiente['cliente_nombre'],
+                cliente_cedula=pendiente['cliente_cedula'],
+                nit_empresa=nit_empresa,
+                numero_factura=primer_numero + i,
+                clave_idempotencia=pendiente['clave_idempotencia'],
+            )
+            for i, (pendiente, (_, total)) in enumerate(zip(lote, armadas))
+        ])
+
+        movimientos, extras, detalles, resumen = [], [], [], []
+        for venta, pendiente, (detalles_venta, _) in zip(ventas, lote, armadas):
+            resumen.append((venta, detalles_venta))
+            for prod_id, cantidad in pendiente['agrupados'].items():
+                movimientos.append((prod_id, 'salida', cantidad))
+                extras.append({'fecha': venta.fecha, 'venta': venta})
+            for detalle in detalles_venta:
+                detalle.venta = venta
+                detalles.append(detalle)
+        Kardex.registrar_movimientos(movimientos, motivo='venta', usuario=usuario, extras=extras)
+        DetalleVenta.objects.bulk_create(detalles)
+        invalidar_reportes(Venta, DetalleVenta)
+        VentaResumenDiario.acumular(resumen)
+    return len(detalles)
+
+
+def importar_ventas(ventas_datos, usuario, tamano_lote=TAMANO_LOTE):
+    """
+    Importa ventas en bloque (p. ej. reenviadas por terminales offline).
+
+    Todas las ventas se validan contra una sola lectura de los productos involucrados;
+    las válidas se escriben por lotes con bulk_create y un único UPDATE de stock por lote.
+    Los errores se reportan por venta sin abortar el resto de la importación.
+    """
+    resultado = {'recibidas': len(ventas_datos), 'creadas': 0, 'duplicadas': 0, 'lineas': 0, 'errores': []}
+
+    def registrar_error(indice, referencia, mensaje):
+        resultado['errores'].append({'indice': indice, 'referencia': referencia, 'error': mensaje})
+
+    pendientes = []
+    for indice, datos in enumerate(ventas_datos):
+        try:
+            pendientes.append(_leer_venta(indice, datos))
+        except VentaError as e:
+            registrar_error(indice, datos.get('referencia') if isinstance(datos, dict) else None, str(e))
+
+    # Reenvíos: las claves ya registradas (o repetidas en el mismo archivo) se omiten con una sola consulta
+    claves = {pendiente['clave_idempotencia'] for pendiente in pendientes if pendiente['clave_idempotencia']}
+    vistas = set(Venta.objects.filter(clave_idempotencia__in=claves).values_list('clave_idempotencia', flat=True))
+    nuevas = []
+    for pendiente in pendientes:
+        clave = pendiente['clave_idempotencia']
+        if clave and clave in vistas:
+            resultado['duplicadas'] += 1
+            continue
+        if clave:
+            vistas.add(clave)
+        nuevas.append(pendiente)
+    pendientes = nuevas
+
+    # Snapshot único de productos; el stock se va consumiendo en memoria venta a venta
+    ids = {prod_id for pendiente in pendientes for prod_id in pendiente['agrupados']}
+    productos = Producto.objects.only(
+        'id', 'nombre', 'precio_unitario', 'moneda', 'cantidad', 'estado'
+    ).in_bulk(list(ids))
+
+    validas = []
+    for pendiente in pendientes:
+        try:
+            _validar_carrito(pendiente['agrupados'], productos)
+        except VentaError as e:
+            registrar_error(pendiente['indice'], pendiente['referencia'], str(e))
+            continue
+        for prod_id, cantidad in pendiente['agrupados'].items():
+            productos[prod_id].cantidad -= cantidad
+        validas.append(pendiente)
+
+    nit_empresa = Venta._meta.get_field('nit_empresa').default
+    for inicio in range(0, len(validas), tamano_lote):
+        lote = validas[inicio:inicio + tamano_lote]
+        try:
+            resultado['lineas'] += _escribir_lote(lote, productos, usuario, nit_empresa)
+            resultado['creadas'] += len(lote)
+        except (StockInsuficienteError, IntegrityError):
+            # El stock cambió desde el snapshot (ventas en caja) o una importación paralela
+            # registró la misma clave: se reintenta venta a venta
+            for pendiente in lote:
+                try:
+                    resultado['lineas'] += _escribir_lote([pendiente], productos, usuario, nit_empresa)
+                    resultado['creadas'] += 1
+                except StockInsuficienteError as e:
+                    nombres = [productos[prod_id].nombre for prod_id in e.productos_ids]
+                    registrar_error(pendiente['indice'], pendiente['referencia'],
+                                    f'Stock insuficiente para {", ".join(nombres)}.')
+                except IntegrityError:
+                    resultado['duplicadas'] += 1
+
+    resultado['errores'].sort(key=lambda error: error['indice'])
+    if resultado['creadas']:
+        registrar_log(
+            usuario=usuario,
+            modelo='ventas',
+            accion='crear',
+            detalles=f'Usuario {usuario.username} importó {resultado["creadas"]} ventas '
+                     f'({resultado["lineas"]} líneas, {len(resultado["errores"])} con error)'
+        )
+    return resultado
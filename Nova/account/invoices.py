@@ -0,0 +1,424 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import lru_cache
+from pathlib import Path
+
+import qrcode
+from barcode import Code128
+from barcode.writer import ImageWriter
+from django.conf import settings
+from django.db import connection, transaction
+from reportlab.graphics.barcode.code128 import Code128 as Code128Vectorial
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from .workers import crear_pool
+
+logger = logging.getLogger(__name__)
+
+# Subir este número cuando cambie el diseño del PDF: invalida todas las facturas en caché
+VERSION_DISENO = 2
+
+
+# ====================================================
+# --- Renderizado ---
+# ====================================================
+
+def calcular_cufe(venta):
+    """CUFE simulado (educativo) a partir de los datos fijos de la factura."""
+    cufe_data = f"{venta.nit_empresa}{venta.numero_factura}{venta.fecha.strftime('%Y%m%d%H%M%S')}{venta.total}"
+    return hashlib.sha384(cufe_data.encode()).hexdigest().upper()
+
+
+@lru_cache(maxsize=1)
+def _logo_bytes():
+    """El logo se lee una sola vez por proceso (ruta absoluta, no depende del directorio de trabajo)."""
+    try:
+        return (Path(settings.BASE_DIR) / 'account' / 'static' / 'account' / 'img' / 'StockNova.jpg').read_bytes()
+    except OSError:
+        return None
+
+
+def _dibujar_qr_png(p, datos, x, y, lado):
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(datos)
+    qr.make(fit=True)
+    img = qr.make_image(fill='black', back_color='white')
+    img_buffer = io.BytesIO()
+    img.save(img_buffer, format='PNG')
+    img_buffer.seek(0)
+    p.drawImage(ImageReader(img_buffer), x, y, width=lado, height=lado)
+
+
+def _dibujar_barras_png(p, valor, x, y, ancho, alto):
+    barcode = Code128(valor, writer=ImageWriter())
+    barcode_buffer = io.BytesIO()
+    barcode.write(barcode_buffer)
+    barcode_buffer.seek(0)
+    p.drawImage(ImageReader(barcode_buffer), x, y, width=ancho, height=alto)
+
+
+def _dibujar_qr_vectorial(p, datos, x, y, lado):
+    """QR como un único path relleno (módulos oscuros consecutivos unidos por fila), sin PNG intermedio."""
+    qr = qrcode.QRCode(border=5)
+    qr.add_data(datos)
+    qr.make(fit=True)
+    matriz = qr.get_matrix()
+    modulo = lado / len(matriz)
+    path = p.beginPath()
+    for fila, valores in enumerate(matriz):
+        y_fila = y + lado - (fila + 1) * modulo
+        col = 0
+        while col < len(valores):
+            if not valores[col]:
+                col += 1
+                continue
+            inicio = col
+            while col < len(valores) and valores[col]:
+                col += 1
+            path.rect(x + inicio * modulo, y_fila, (col - inicio) * modulo, modulo)
+    p.drawPath(path, stroke=0, fill=1)
+
+
+def _dibujar_barras_vectorial(p, valor, x, y, ancho, alto):
+    """Code128 nativo de ReportLab, escalado horizontalmente al ancho disponible."""
+    barras = Code128Vectorial(valor, barHeight=alto, barWidth=1, quiet=False)
+    p.saveState()
+    p.translate(x, y)
+    p.scale(ancho / barras.width, 1)
+    barras.drawOn(p, 0, 0)
+    p.restoreState()
+
+
+def renderizar_factura(venta, detalles, modo=None):
+    """
+    Genera el PDF de la factura y devuelve sus bytes. `detalles` debe traer el producto cargado.
+    modo 'vector' dibuja QR y código de barras como gráficos nativos de ReportLab;
+    'raster' usa las imágenes PNG de qrcode/python-barcode.
+    """
+    modo = modo or settings.FACTURAS_MODO_GRAFICOS
+    cufe = calcular_cufe(venta)
+
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+
+    # Logo
+    logo = _logo_bytes()
+    if logo:
+        p.drawImage(ImageReader(io.BytesIO(logo)), 50, height - 100, width=100, height=50)
+
+    # Título
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(200, height - 60, "Factura Digital - StockNova")
+
+    # Datos de la factura
+    p.setFont("Helvetica", 10)
+    p.drawString(50, height - 120, f"NIT Emisor: {venta.nit_empresa}")
+    p.drawString(50, height - 140, f"Fecha: {venta.fecha.strftime('%Y-%m-%d %H:%M')}")
+    p.drawString(50, height - 160, f"Número Factura: {venta.numero_factura}")
+    p.drawString(50, height - 180, f"CUFE: {cufe}")  # CUFE simulado
+    p.drawString(50, height - 200, f"Comprador: {venta.cliente_nombre} (Cédula: {venta.cliente_cedula})")
+    p.drawString(50, height - 220, f"Vendedor: {venta.usuario.username}")
+
+    # Tabla de productos
+    y = height - 260
+    p.setFont("Helvetica-Bold", 10)
+    p.drawString(50, y, "Producto")
+    p.drawString(250, y, "Cant.")
+    p.drawString(300, y, "Precio Unit.")
+    p.drawString(380, y, "IVA (19%)")
+    p.drawString(450, y, "Subtotal")
+    y -= 20
+
+    p.setFont("Helvetica", 9)
+    productos_lista = []
+    for detalle in detalles:
+        p.drawString(50, y, detalle.producto.nombre[:20])
+        p.drawString(250, y, str(detalle.cantidad))
+        p.drawString(300, y, f"${detalle.precio_unitario}")
+        p.drawString(380, y, f"${detalle.iva * detalle.precio_unitario * detalle.cantidad:.2f}")
+        p.drawString(450, y, f"${detalle.subtotal:.2f}")
+        productos_lista.append({
+            "nombre": detalle.producto.nombre,
+            "cantidad": detalle.cantidad,
+            "precio_unitario": str(detalle.precio_unitario)
+        })
+        y -= 15
+
+    # Total recalculado (correcto)
+    p.setFont("Helvetica-Bold", 12)
+    total_final = sum(det.subtotal for det in detalles)
+    p.drawString(400, y - 20, f"Total: ${total_final:.2f}")
+
+    # QR con los datos de la factura
+    qr_data = json.dumps({
+        "emisor": "StockNova",
+        "nit_emisor": venta.nit_empresa,
+        "numero_factura": venta.numero_factura,
+        "fecha": venta.fecha.strftime('%Y-%m-%d %H:%M'),
+        "comprador": venta.cliente_nombre,
+        "cedula_comprador": venta.cliente_cedula,
+        "vendedor": venta.usuario.username,
+        "productos": productos_lista,
+        "total": str(venta.total),
+        "cufe": cufe  # Agregado CUFE al QR
+    })
+
+    if modo == 'raster':
+        _dibujar_qr_png(p, qr_data, 50, y - 180, 150)
+        _dibujar_barras_png(p, cufe, 250, y - 180, 200, 50)  # Código de Barras (simulado)
+    else:
+        _dibujar_qr_vectorial(p, qr_data, 50, y - 180, 150)
+        _dibujar_barras_vectorial(p, cufe, 250, y - 180, 200, 50)
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+# ====================================================
+# --- Caché en disco (direccionada por contenido) ---
+# ====================================================
+
+def _directorio_cache():
+    directorio = Path(settings.FACTURAS_CACHE_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def huella_factura(venta, detalles):
+    """Hash del contenido que aparece en la factura: si cambia la venta o sus líneas, cambia la clave."""
+    partes = [
+        VERSION_DISENO, settings.FACTURAS_MODO_GRAFICOS, venta.id, venta.nit_empresa, venta.numero_factura, venta.fecha.isoformat(),
+        venta.total, venta.cliente_nombre, venta.cliente_cedula, venta.usuario.username,
+    ]
+    for detalle in detalles:
+        partes += [detalle.producto_id, detalle.producto.nombre, detalle.cantidad,
+                   detalle.precio_unitario, detalle.iva, detalle.precio_con_iva]
+    return hashlib.sha256('|'.join(str(parte) for parte in partes).encode()).hexdigest()[:40]
+
+
+def _ruta_factura(venta_id, huella):
+    return _directorio_cache() / f'venta_{venta_id}_{huella}.pdf'
+
+
+def _escribir_atomico(ruta, contenido):
+    """Escribe en un temporal del mismo directorio y lo renombra: nunca se sirve un PDF a medias."""
+    fd, temporal = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _evictar(limite_bytes):
+    """Borra las facturas usadas hace más tiempo (mtime) hasta quedar bajo el límite."""
+    archivos = []
+    total = 0
+    for entrada in os.scandir(_directorio_cache()):
+        if entrada.is_file() and entrada.name.endswith('.pdf'):
+            info = entrada.stat()
+            archivos.append((info.st_mtime, info.st_size, entrada.path))
+            total += info.st_size
+    if total <= limite_bytes:
+        return
+    for _, tamano, ruta in sorted(archivos):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            continue
+        total -= tamano
+        if total <= limite_bytes:
+            break
+
+
+def abrir_factura(venta, detalles, huella=None):
+    """
+    Devuelve un archivo abierto (modo binario) con el PDF de la factura.
+    Si está en caché se sirve directo; si no, se renderiza, se guarda y se aplica la evicción LRU.
+    """
+    huella = huella or huella_factura(venta, detalles)
+    ruta = _ruta_factura(venta.id, huella)
+    try:
+        archivo = open(ruta, 'rb')
+    except FileNotFoundError:
+        archivo = None
+    if archivo is not None:
+        try:
+            os.utime(ruta)  # marca de uso para el LRU
+        except FileNotFoundError:
+            pass  # desalojada mientras tanto: el descriptor abierto sigue siendo válido
+        return archivo
+
+    contenido = renderizar_factura(venta, detalles)
+    _escribir_atomico(ruta, contenido)
+    _evictar(settings.FACTURAS_CACHE_MAX_BYTES)
+    try:
+        return open(ruta, 'rb')
+    except FileNotFoundError:
+        # Desalojada por otro proceso entre la escritura y la apertura
+        return io.BytesIO(contenido)
+
+
+def invalidar_factura(venta_id):
+    """Elimina todas las versiones en caché de la factura de una venta."""
+    directorio = Path(settings.FACTURAS_CACHE_DIR)
+    if not directorio.exists():
+        return
+    for ruta in directorio.glob(f'venta_{venta_id}_*.pdf'):
+        try:
+            ruta.unlink()
+        except FileNotFoundError:
+            pass
+        else:
+            logger.info(f'Factura en caché de la venta {venta_id} invalidada')
+
+
+# ====================================================
+# --- Pre-renderizado en segundo plano ---
+# ====================================================
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = crear_pool(
+                settings.FACTURAS_PRERENDER_MODO, settings.FACTURAS_PRERENDER_WORKERS, nombre='factura'
+            )
+        return _pool
+
+
+def prerenderizar_factura(venta_id):
+    """Tarea del pool: deja el PDF de la venta en caché para que la descarga solo lo sirva."""
+    from .models import Venta, DetalleVenta
+
+    try:
+        venta = Venta.objects.select_related('usuario').get(pk=venta_id)
+        detalles = list(DetalleVenta.objects.filter(venta=venta).select_related('producto'))
+        abrir_factura(venta, detalles).close()
+    except Exception:
+        logger.exception(f'No se pudo pre-renderizar la factura de la venta {venta_id}')
+    finally:
+        if settings.FACTURAS_PRERENDER_MODO != 'proceso':
+            connection.close()  # el hilo del pool no pasa por el ciclo de request de Django
+
+
+def encolar_factura(venta_id):
+    """Programa el renderizado de la factura cuando la transacción de la venta confirme."""
+    if settings.FACTURAS_PRERENDER:
+        transaction.on_commit(lambda: _obtener_pool().submit(prerenderizar_factura, venta_id))
+
+
+# ====================================================
+# --- Exportación en lote (ZIP en streaming) ---
+# ====================================================
+
+_pool_exportacion = None
+
+
+def _obtener_pool_exportacion():
+    global _pool_exportacion
+    with _pool_lock:
+        if _pool_exportacion is None:
+            _pool_exportacion = crear_pool(
+                settings.FACTURAS_EXPORT_MODO, settings.FACTURAS_EXPORT_WORKERS, nombre='exportacion'
+            )
+        return _pool_exportacion
+
+
+def renderizar_lote(venta_ids):
+    """
+    Tarea del pool: devuelve [(nombre_archivo, pdf_bytes)] para un bloque de ventas.
+    Una sola consulta (con prefetch de líneas y productos) por bloque; reutiliza la caché en disco.
+    """
+    from .models import Venta
+
+    try:
+        ventas = (
+            Venta.objects.filter(pk__in=venta_ids)
+            .select_related('usuario')
+            .prefetch_related('detalleventa_set__producto')
+            .order_by('numero_factura')
+        )
+        resultado = []
+        for venta in ventas:
+            with abrir_factura(venta, list(venta.detalleventa_set.all())) as archivo:
+                resultado.append((f'factura_{venta.numero_factura}.pdf', archivo.read()))
+        return resultado
+    finally:
+        if settings.FACTURAS_EXPORT_MODO != 'proceso':
+            connection.close()
+
+
+class _SalidaZip:
+    """Destino no posicionable para ZipFile: acumula lo escrito hasta que el generador lo entregue."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def exportar_facturas_zip(venta_ids, tamano_bloque=None):
+    """
+    Generador de bytes de un ZIP con las facturas de `venta_ids`.
+    Los bloques se renderizan en paralelo y cada PDF se escribe al ZIP apenas su bloque termina;
+    solo hay `2 x workers` bloques en vuelo, así que el archivo completo nunca está en memoria.
+    """
+    tamano_bloque = tamano_bloque or settings.FACTURAS_EXPORT_BLOQUE
+    bloques = iter([venta_ids[i:i + tamano_bloque] for i in range(0, len(venta_ids), tamano_bloque)])
+    pool = _obtener_pool_exportacion()
+    en_vuelo = set()
+
+    def llenar():
+        while len(en_vuelo) < 2 * settings.FACTURAS_EXPORT_WORKERS:
+            bloque = next(bloques, None)
+            if bloque is None:
+                return
+            en_vuelo.add(pool.submit(renderizar_lote, bloque))
+
+    salida = _SalidaZip()
+    try:
+        # PDFs de ReportLab sin comprimir: deflate nivel 1 reduce bastante a bajo costo
+        with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archivo_zip:
+            llenar()
+            while en_vuelo:
+                listos, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    en_vuelo.discard(futuro)
+                    for nombre, contenido in futuro.result():
+                        archivo_zip.writestr(nombre, contenido)
+                        yield salida.vaciar()
+                llenar()
+        yield salida.vaciar()  # directorio central
+    finally:
+        # Cliente desconectado o error: no seguir renderizando bloques que nadie va a leer
+        for futuro in en_vuelo:
+            futuro.cancel()
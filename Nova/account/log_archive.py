@@ -0,0 +1,120 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Log, LogResumen
+
+# ====================================================
+# --- Retención y archivo de logs ---
+# ====================================================
+# Los logs con más de LOGS_RETENCION_DIAS días salen de la tabla Log a archivos JSONL comprimidos, uno
+# por mes (fecha local), y quedan contados en LogResumen. Cada lote se añade al archivo como un miembro
+# gzip más; después, en una transacción, se acumula el resumen y se borran las filas. Si el proceso se
+# interrumpe entre ambos pasos un log puede quedar dos veces en el archivo: la búsqueda descarta el
+# repetido por id.
+
+CAMPOS_ESTRUCTURADOS = ('ip', 'ruta', 'metodo', 'objeto_tipo', 'objeto_id', 'request_id')
+CAMPOS_ARCHIVO = ('id', 'fecha', 'usuario_id', 'usuario__username', 'modelo', 'accion', 'detalles', *CAMPOS_ESTRUCTURADOS)
+
+
+def directorio_archivo():
+    return Path(settings.LOGS_ARCHIVO_DIR)
+
+
+def ruta_archivo(anio, mes):
+    return directorio_archivo() / f'logs-{anio:04d}-{mes:02d}.jsonl.gz'
+
+
+def _escribir(ruta, lineas):
+    with open(ruta, 'ab') as crudo:
+        with gzip.GzipFile(fileobj=crudo, mode='ab') as comprimido:
+            comprimido.write(''.join(lineas).encode('utf-8'))
+        crudo.flush()
+        os.fsync(crudo.fileno())  # en disco antes de borrar las filas
+
+
+def archivar_logs(dias=None, lote=5000):
+    """Archiva y borra los logs con más de `dias` días, por lotes de id. Devuelve cuántos se movieron."""
+    limite = timezone.now() - timedelta(days=settings.LOGS_RETENCION_DIAS if dias is None else dias)
+    directorio_archivo().mkdir(parents=True, exist_ok=True)
+    total = ultimo_id = 0
+    while True:
+        filas = list(
+            Log.objects.filter(fecha__lt=limite, id__gt=ultimo_id).order_by('id').values(*CAMPOS_ARCHIVO)[:lote]
+        )
+        if not filas:
+            return total
+        ultimo_id = filas[-1]['id']
+
+        por_mes, conteos = {}, {}
+        for fila in filas:
+            local = timezone.localtime(fila['fecha'])
+            registro = {
+                'id': fila['id'], 'fecha': fila['fecha'].isoformat(), 'usuario_id': fila['usuario_id'],
+                'usuario': fila['usuario__username'], 'modelo': fila['modelo'], 'accion': fila['accion'],
+                'detalles': fila['detalles'], **{campo: fila[campo] for campo in CAMPOS_ESTRUCTURADOS},
+            }
+            por_mes.setdefault((local.year, local.month), []).append(json.dumps(registro, ensure_ascii=False) + '\n')
+            clave = (local.date(), fila['usuario_id'], fila['modelo'], fila['accion'])
+            conteos[clave] = conteos.get(clave, 0) + 1
+
+        for (anio, mes), lineas in por_mes.items():
+            _escribir(ruta_archivo(anio, mes), lineas)
+        with transaction.atomic():
+            LogResumen.acumular(conteos)
+            Log.objects.filter(id__in=[fila['id'] for fila in filas]).delete()
+        total += len(filas)
+
+
+def _meses_archivados():
+    """[(anio, mes, ruta)] de los archivos existentes, del más reciente al más antiguo."""
+    meses = []
+    for ruta in directorio_archivo().glob('logs-*.jsonl.gz'):
+        try:
+            anio, mes = (int(parte) for parte in ruta.name[len('logs-'):-len('.jsonl.gz')].split('-'))
+        except ValueError:
+            continue
+        meses.append((anio, mes, ruta))
+    return sorted(meses, reverse=True)
+
+
+def buscar_archivo(desde=None, hasta=None, limite=None, **exactos):
+    """
+    Logs archivados que cumplen los filtros (mismos criterios que logs_listar: rango de fechas e igualdad
+    en usuario, modelo, accion y los campos estructurados), del más reciente al más antiguo y como máximo
+    `limite`. Solo se descomprimen los meses que se cruzan con [desde, hasta].
+    """
+    limite = limite or settings.LOGS_ARCHIVO_MAX_RESULTADOS
+    exactos = {campo: valor for campo, valor in exactos.items() if valor is not None}
+    resultados, vistos = [], set()
+    for anio, mes, ruta in _meses_archivados():
+        inicio_mes = timezone.make_aware(datetime(anio, mes, 1))
+        fin_mes = timezone.make_aware(datetime(anio + mes // 12, mes % 12 + 1, 1))
+        if (hasta and inicio_mes > hasta) or (desde and fin_mes <= desde):
+            continue
+        del_mes = []
+        with gzip.open(ruta, 'rt', encoding='utf-8') as archivo:
+            for linea in archivo:
+                registro = json.loads(linea)
+                if registro['id'] in vistos:
+                    continue
+                # Los archivos anteriores a los campos estructurados no los tienen: no coinciden con esos filtros
+                if any(registro.get(campo) != valor for campo, valor in exactos.items()):
+                    continue
+                registro['fecha'] = parse_datetime(registro['fecha'])
+                if (desde and registro['fecha'] < desde) or (hasta and registro['fecha'] > hasta):
+                    continue
+                vistos.add(registro['id'])
+                del_mes.append(registro)
+        del_mes.sort(key=lambda registro: (registro['fecha'], registro['id']), reverse=True)
+        resultados.extend(del_mes)
+        if len(resultados) >= limite:
+            break  # los meses siguientes son más antiguos
+    return resultados[:limite]
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import threading
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Log
+
+# ====================================================
+# --- Logs en vivo (Server-Sent Events) ---
+# ====================================================
+# Cada conexión SSE es una corrutina con una cola en memoria: no ocupa un hilo ni consulta la base.
+# El escritor de auditoría publica en el hub los logs que acaba de guardar; los escritos por otros
+# procesos (workers gunicorn, comandos) los trae una única consulta periódica por proceso, sin
+# importar cuántas conexiones haya abiertas.
+
+CAMPOS_EVENTO = ('id', 'fecha', 'modelo', 'accion', 'detalles')
+
+
+def consultar_logs(desde_id=None, limite=50):
+    """
+    (logs, hay_mas): los registros con id > desde_id en orden de id, o los últimos `limite` si no hay
+    cursor. Solo lee las columnas del evento y recorre la clave primaria.
+    """
+    if desde_id is None:
+        return list(Log.objects.order_by('-id').values(*CAMPOS_EVENTO)[:limite])[::-1], False
+    logs = list(Log.objects.filter(id__gt=desde_id).order_by('id').values(*CAMPOS_EVENTO)[:limite + 1])
+    return logs[:limite], len(logs) > limite
+
+
+def formato_sse(evento):
+    return f'id: {evento["id"]}\nevent: log\ndata: {json.dumps(evento, cls=DjangoJSONEncoder)}\n\n'
+
+
+class ColaConexion(asyncio.Queue):
+    # Si la conexión no alcanza a leer, se marca desfasada y vuelve a leer desde la base
+    desfasada = False
+
+
+def _entregar(cola, eventos):
+    try:
+        cola.put_nowait(eventos)
+    except asyncio.QueueFull:
+        cola.desfasada = True
+
+
+class HubLogs:
+    """Difusión en proceso de los logs nuevos a las conexiones SSE abiertas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscriptores = {}  # cola -> event loop de la conexión
+        self._recientes = deque(maxlen=5000)
+        self._recientes_ids = set()
+        self._tarea_tail = None
+
+    def publicar(self, eventos):
+        """Entrega eventos (dicts con CAMPOS_EVENTO) a todas las conexiones. Se puede llamar desde cualquier hilo."""
+        with self._lock:
+            nuevos = []
+            for evento in eventos:
+                if evento['id'] is None or evento['id'] in self._recientes_ids:
+                    continue  # ya llegó por el escritor local o por la consulta periódica
+                if len(self._recientes) == self._recientes.maxlen:
+                    self._recientes_ids.discard(self._recientes[0])
+                self._recientes.append(evento['id'])
+                self._recientes_ids.add(evento['id'])
+                nuevos.append(evento)
+            suscriptores = list(self._suscriptores.items())
+        for cola, loop in suscriptores if nuevos else ():
+            try:
+                loop.call_soon_threadsafe(_entregar, cola, nuevos)
+            except RuntimeError:
+                pass  # el loop de la conexión ya cerró
+
+    def publicar_logs(self, logs):
+        self.publicar([{campo: getattr(log, campo) for campo in CAMPOS_EVENTO} for log in logs])
+
+    def suscribir(self):
+        cola = ColaConexion(maxsize=settings.LOGS_SSE_COLA)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._suscriptores[cola] = loop
+            if self._tarea_tail is None or self._tarea_tail.done():
+                self._tarea_tail = loop.create_task(self._tail())
+        return cola
+
+    def desuscribir(self, cola):
+        with self._lock:
+            self._suscriptores.pop(cola, None)
+
+    async def _tail(self):
+        """Consulta periódica de respaldo: logs escritos por otros procesos. Termina sin conexiones."""
+        cursor = await sync_to_async(lambda: Log.objects.order_by('-id').values_list('id', flat=True).first() or 0)()
+        while self._suscriptores:
+            await asyncio.sleep(settings.LOGS_SSE_INTERVALO_DB)
+            hay_mas = True
+            while hay_mas:
+                logs, hay_mas = await sync_to_async(consultar_logs)(cursor, 500)
+                if logs:
+                    cursor = logs[-1]['id']
+                    self.publicar(logs)
+
+
+hub = HubLogs()
+
+
+async def flujo_logs(desde_id):
+    """Generador SSE de una conexión: lo pendiente desde `desde_id` y después lo que publique el hub."""
+    cola = hub.suscribir()
+    try:
+        yield f'retry: {settings.LOGS_SSE_REINTENTO}\n\n'
+        ultimo = desde_id
+        logs, hay_mas = await sync_to_async(consultar_logs)(desde_id, settings.LOGS_SSE_PENDIENTES)
+        # Lo leído de la base puede llegar también por el hub si se escribió durante la consulta
+        leidos = {evento['id'] for evento in logs}
+        while True:
+            for evento in logs:
+                yield formato_sse(evento)
+                ultimo = evento['id'] if ultimo is None else max(ultimo, evento['id'])
+            if hay_mas or cola.desfasada:
+                cola.desfasada = False
+                while not cola.empty():
+                    cola.get_nowait()
+                logs, hay_mas = await sync_to_async(consultar_logs)(ultimo, settings.LOGS_SSE_PENDIENTES)
+                leidos = {evento['id'] for evento in logs}
+                continue
+            try:
+                logs = [evento for evento in await asyncio.wait_for(cola.get(), settings.LOGS_SSE_LATIDO)
+                        if evento['id'] not in leidos]
+            except asyncio.TimeoutError:
+                logs = []
+                yield ': latido\n\n'  # mantiene la conexión abierta a través de proxies
+    finally:
+        hub.desuscribir(cola)
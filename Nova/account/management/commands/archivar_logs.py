@@ -0,0 +1,22 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from account.log_archive import archivar_logs, directorio_archivo
+
+
+class Command(BaseCommand):
+    help = 'Mueve los logs más antiguos que la retención a archivos JSONL comprimidos por mes y los resume en LogResumen.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.LOGS_RETENCION_DIAS,
+                            help='Se archivan los logs con más de estos días')
+        parser.add_argument('--lote', type=int, default=5000, help='Logs por lote (archivo + borrado)')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        total = archivar_logs(options['dias'], options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} logs archivados en {directorio_archivo()} ({time.monotonic() - inicio:.1f} s).'
+        ))
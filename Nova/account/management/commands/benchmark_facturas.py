@@ -0,0 +1,51 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from account.checkout import IVA_GENERAL
+from account.invoices import renderizar_factura
+from account.models import Usuario, Producto, Venta, DetalleVenta
+
+
+class Command(BaseCommand):
+    help = 'Compara el renderizado de facturas con QR/código de barras vectorial vs. PNG (tiempo y tamaño).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--facturas', type=int, default=50, help='Facturas a renderizar por modo')
+        parser.add_argument('--lineas', type=int, default=10, help='Líneas por factura')
+
+    def _venta_de_prueba(self, lineas):
+        """Venta en memoria (sin tocar la base de datos) con datos representativos."""
+        venta = Venta(
+            id=1, usuario=Usuario(username='benchmark'), fecha=timezone.now(), total=Decimal('0'),
+            cliente_nombre='Cliente de prueba', cliente_cedula='1234567890', numero_factura=1,
+        )
+        detalles = []
+        for i in range(lineas):
+            precio = Decimal('12500.00')
+            detalles.append(DetalleVenta(
+                producto=Producto(id=i + 1, nombre=f'Producto de prueba {i}'), cantidad=i + 1,
+                precio_unitario=precio, iva=IVA_GENERAL, precio_con_iva=precio * (1 + IVA_GENERAL),
+            ))
+        venta.total = sum(d.subtotal for d in detalles)
+        return venta, detalles
+
+    def handle(self, *args, **options):
+        venta, detalles = self._venta_de_prueba(options['lineas'])
+        n = options['facturas']
+        resultados = {}
+        for modo in ('raster', 'vector'):
+            renderizar_factura(venta, detalles, modo=modo)  # calentamiento (imports, logo)
+            inicio = time.perf_counter()
+            for _ in range(n):
+                pdf = renderizar_factura(venta, detalles, modo=modo)
+            ms = (time.perf_counter() - inicio) * 1000 / n
+            resultados[modo] = (ms, len(pdf))
+            self.stdout.write(f'{modo:>7}: {ms:8.1f} ms/factura  {len(pdf) / 1024:8.1f} KB')
+
+        (ms_r, kb_r), (ms_v, kb_v) = resultados['raster'], resultados['vector']
+        self.stdout.write(self.style.SUCCESS(
+            f'vector vs raster: {ms_r / ms_v:.1f}x más rápido, {100 * (1 - kb_v / kb_r):.0f}% menos bytes'
+        ))
@@ -0,0 +1,68 @@
+import resource
+import time
+import tracemalloc
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table
+
+from account.exports import ESTILO_TABLA, generar_pdf
+
+ENCABEZADOS = ['Nombre', 'SKU', 'Categoría', 'Proveedor', 'Stock', 'Estado']
+
+
+def _filas(n):
+    for i in range(n):
+        yield [f'Producto de prueba {i}', f'SKU-{i:07d}', f'Categoría {i % 40}', f'Proveedor {i % 25}',
+               str(i % 500), 'Activo' if i % 7 else 'Inactivo']
+
+
+def _pdf_legado(n):
+    """Camino anterior: una sola Table con todas las filas en un BytesIO."""
+    buffer = BytesIO()
+    tabla = Table([ENCABEZADOS] + list(_filas(n)))
+    tabla.setStyle(ESTILO_TABLA)
+    SimpleDocTemplate(buffer, pagesize=letter).build([tabla])
+    buffer.seek(0)
+    return buffer
+
+
+class Command(BaseCommand):
+    help = 'Mide tiempo, memoria pico y tamaño del PDF de reportes grandes (LongTable por bloques + archivo spooled).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+        parser.add_argument('--legado', type=int, default=10_000,
+                            help='Compara con el PDF anterior (una sola Table) hasta este número de filas; 0 lo omite')
+        parser.add_argument('--tracemalloc', action='store_true',
+                            help='Memoria pico exacta por corrida (mucho más lento); por defecto se informa el RSS máximo del proceso')
+
+    def _medir(self, etiqueta, n, generar, exacta):
+        if exacta:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        archivo = generar()
+        segundos = time.perf_counter() - inicio
+        if exacta:
+            memoria = f'pico {tracemalloc.get_traced_memory()[1] / 1024 ** 2:7.1f} MB'
+            tracemalloc.stop()
+        else:
+            memoria = f'RSS máx. {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:7.1f} MB'
+        archivo.seek(0, 2)
+        tamano = archivo.tell()
+        en_disco = getattr(archivo, '_rolled', False)
+        archivo.close()
+        self.stdout.write(
+            f'{etiqueta:>8} {n:>8} filas: {segundos:8.1f} s  {n / segundos:8.0f} filas/s  '
+            f'{memoria}  pdf {tamano / 1024 ** 2:7.1f} MB{"  (en disco)" if en_disco else ""}'
+        )
+
+    def handle(self, *args, **options):
+        # El legado va después: el RSS máximo es acumulado y así no contamina la medición por bloques
+        exacta = options['tracemalloc']
+        for n in sorted(options['filas']):
+            self._medir('bloques', n, lambda: generar_pdf('Benchmark', [(None, ENCABEZADOS, _filas(n))]), exacta)
+        for n in sorted(options['filas']):
+            if n <= options['legado']:
+                self._medir('legado', n, lambda: _pdf_legado(n), exacta)
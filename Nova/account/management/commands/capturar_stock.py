@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from account.models import StockSnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Toma la foto diaria del stock de todos los productos (programarla una vez al día, p. ej. con cron). '
+        'Las consultas de stock histórico parten de la foto más cercana.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--conservar-dias', type=int, default=0,
+            help='Borra las fotos más viejas que esto (0 = conservar todas). Las consultas siguen siendo '
+                 'correctas, solo recorren más movimientos para fechas anteriores a la foto más vieja.',
+        )
+
+    def handle(self, *args, **options):
+        fecha, filas = StockSnapshot.capturar()
+        self.stdout.write(self.style.SUCCESS(f'Foto de stock {fecha:%Y-%m-%d %H:%M}: {filas} productos.'))
+        if options['conservar_dias'] > 0:
+            limite = timezone.now() - timedelta(days=options['conservar_dias'])
+            borradas = StockSnapshot.objects.filter(fecha__lt=limite).delete()[0]
+            if borradas:
+                self.stdout.write(f'{borradas} filas de fotos anteriores al {limite:%Y-%m-%d} eliminadas.')
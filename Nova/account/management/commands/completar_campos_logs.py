@@ -0,0 +1,83 @@
+import ipaddress
+import re
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from account.models import Log
+
+# Textos que generaban middleware.py y signals.py antes de los campos estructurados
+IP = re.compile(r'\(IP: ([^)]+)\)|inició sesión desde (\S+)$')
+RUTA = re.compile(r' desde (/\S*)')
+OBJETO = re.compile(r'(producto|usuario|rol|almacén|proveedor|categoría) ".*" \(ID: (\d+)\)$')
+VENTA = re.compile(r'[Vv]enta ID (\d+)')
+METODO_GET = re.compile(r' (exportó|descargó|leyó lista o filtro en) ')
+METODO_POST = re.compile(r' (creó|actualizó|eliminó|realizó acción) en ')
+SIN_TILDES = str.maketrans('áéíóú', 'aeiou')
+
+
+def _ip(valor):
+    try:
+        return str(ipaddress.ip_address(valor))
+    except ValueError:
+        return None  # 'desconocida', 'IP desconocida'
+
+
+def campos_desde_detalles(fila):
+    """Campos estructurados que se pueden recuperar del texto de un log antiguo (solo los encontrados)."""
+    detalles, campos = fila['detalles'], {}
+    ip = IP.search(detalles)
+    ip = _ip(ip.group(1) or ip.group(2)) if ip else None
+    if ip:
+        campos['ip'] = ip
+    ruta = RUTA.search(detalles)
+    if ruta:
+        campos['ruta'] = ruta.group(1)[:255]
+    if METODO_GET.search(detalles):
+        campos['metodo'] = 'GET'
+    elif METODO_POST.search(detalles):
+        campos['metodo'] = 'POST'
+
+    objeto, venta = OBJETO.search(detalles), VENTA.search(detalles)
+    if fila['accion'] in ('login', 'logout') and fila['usuario_id']:
+        campos['objeto_tipo'], campos['objeto_id'] = 'usuario', fila['usuario_id']
+    elif objeto:
+        campos['objeto_tipo'], campos['objeto_id'] = objeto.group(1).translate(SIN_TILDES), int(objeto.group(2))
+    elif venta:
+        campos['objeto_tipo'], campos['objeto_id'] = 'venta', int(venta.group(1))
+    return campos
+
+
+class Command(BaseCommand):
+    help = 'Completa los campos estructurados (ip, ruta, método, objeto) de los logs antiguos a partir de su texto.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000, help='Logs por lote (lectura + bulk_update)')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        # Logs sin ningún campo estructurado: los escritos antes de que existieran
+        pendientes = Log.objects.filter(ip__isnull=True, objeto_id__isnull=True, ruta='', metodo='', request_id='')
+        campos_actualizables = ['ip', 'ruta', 'metodo', 'objeto_tipo', 'objeto_id']
+        revisados = actualizados = ultimo_id = 0
+        while True:
+            filas = list(
+                pendientes.filter(id__gt=ultimo_id).order_by('id')
+                .values('id', 'accion', 'usuario_id', 'detalles')[:options['lote']]
+            )
+            if not filas:
+                break
+            ultimo_id = filas[-1]['id']
+            cambios = []
+            for fila in filas:
+                campos = campos_desde_detalles(fila)
+                if campos:
+                    cambios.append(Log(id=fila['id'], **{'ruta': '', 'metodo': '', 'objeto_tipo': '', **campos}))
+            with transaction.atomic():
+                Log.objects.bulk_update(cambios, campos_actualizables)
+            revisados += len(filas)
+            actualizados += len(cambios)
+        self.stdout.write(self.style.SUCCESS(
+            f'{actualizados} de {revisados} logs completados ({time.monotonic() - inicio:.1f} s).'
+        ))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from account.reconciliation import corregir, descuadres
+
+
+class Command(BaseCommand):
+    help = 'Compara el stock de cada producto con lo que dice su Kardex y reporta (o corrige) los descuadres.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corregir', action='store_true',
+                            help='Escribe un movimiento de ajuste por producto para que el Kardex cuadre con el stock')
+        parser.add_argument('--por-almacen', action='store_true', help='Resumen de descuadres por almacén')
+        parser.add_argument('--mostrar', type=int, default=50, help='Descuadres a listar (los de mayor diferencia)')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        filas, sin_movimientos = descuadres()
+        self.stdout.write(
+            f'Conciliación en {time.monotonic() - inicio:.1f} s: {len(filas)} productos descuadrados, '
+            f'{sin_movimientos} sin movimientos en Kardex.'
+        )
+        for fila in filas[:options['mostrar']]:
+            self.stdout.write(
+                f'  [{fila["producto_id"]}] {fila["nombre"]} ({fila["almacen"]}): stock {fila["stock"]}, '
+                f'Kardex {fila["esperado"]} ({fila["diferencia"]:+d}, {fila["movimientos"]} movimientos)'
+            )
+        if len(filas) > options['mostrar']:
+            self.stdout.write(f'  ... y {len(filas) - options["mostrar"]} más.')
+
+        if options['por_almacen']:
+            almacenes = {}
+            for fila in filas:
+                resumen = almacenes.setdefault(fila['almacen'], [0, 0, 0])
+                resumen[0] += 1
+                resumen[1] += fila['diferencia']
+                resumen[2] += abs(fila['diferencia'])
+            self.stdout.write('Por almacén (productos, diferencia neta, diferencia absoluta):')
+            for almacen, (productos, neta, absoluta) in sorted(almacenes.items(), key=lambda item: -item[1][2]):
+                self.stdout.write(f'  {almacen}: {productos}, {neta:+d}, {absoluta}')
+
+        if options['corregir'] and filas:
+            ajustes = corregir([fila['producto_id'] for fila in filas])
+            self.stdout.write(self.style.SUCCESS(f'{len(ajustes)} movimientos de ajuste registrados.'))
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.importer import TAMANO_LOTE, importar_ventas
+from account.models import Usuario
+
+
+class Command(BaseCommand):
+    help = 'Importa ventas en bloque desde un archivo JSON (ventas reenviadas por terminales offline).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta al JSON: lista de ventas o {"ventas": [...]}')
+        parser.add_argument('--usuario', required=True, help='Username al que se atribuyen las ventas')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Ventas por transacción')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = Usuario.objects.get(username=options['usuario'])
+        except Usuario.DoesNotExist:
+            raise CommandError(f'El usuario "{options["usuario"]}" no existe.')
+
+        try:
+            with open(options['archivo'], encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'No se pudo leer {options["archivo"]}: {e}')
+        ventas = payload.get('ventas') if isinstance(payload, dict) else payload
+        if not isinstance(ventas, list):
+            raise CommandError('Se esperaba una lista de ventas.')
+
+        resultado = importar_ventas(ventas, usuario, tamano_lote=options['lote'])
+
+        for error in resultado['errores']:
+            referencia = error['referencia'] or f'#{error["indice"]}'
+            self.stderr.write(f'Venta {referencia}: {error["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado["creadas"]}/{resultado["recibidas"]} ventas importadas '
+            f'({resultado["lineas"]} líneas, {resultado["duplicadas"]} duplicadas, '
+            f'{len(resultado["errores"])} con error).'
+        ))
@@ -0,0 +1,63 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from account.models import TrabajoReporte
+from account.report_jobs import ejecutar_trabajo, limpiar_trabajos
+from account.workers import crear_pool
+
+
+class Command(BaseCommand):
+    help = 'Worker de exportaciones en segundo plano: toma los trabajos de reporte pendientes y los ejecuta en un pool local.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modo', choices=['hilo', 'proceso'], default=settings.REPORTES_TRABAJOS_MODO)
+        parser.add_argument('--workers', type=int, default=settings.REPORTES_TRABAJOS_WORKERS)
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos entre consultas de trabajos nuevos')
+        parser.add_argument('--una-vez', action='store_true', help='Procesa lo pendiente y termina')
+
+    def handle(self, *args, **options):
+        # Un solo worker por instalación: lo que quedó 'en_proceso' se interrumpió con el worker anterior
+        reencolados = TrabajoReporte.objects.filter(estado='en_proceso').update(estado='pendiente', filas_procesadas=0)
+        if reencolados:
+            self.stdout.write(f'{reencolados} trabajos interrumpidos vuelven a la cola.')
+
+        workers = options['workers']
+        pool = crear_pool(options['modo'], workers, nombre='reporte')
+        en_vuelo = {}
+        ultima_limpieza = None
+        self.stdout.write(self.style.SUCCESS(f'Procesando reportes ({options["modo"]}, {workers} workers)...'))
+        try:
+            while True:
+                # Como Django en cada request: descarta la conexión caída o vencida antes de consultar
+                close_old_connections()
+                for trabajo_id, futuro in list(en_vuelo.items()):
+                    if futuro.done():
+                        del en_vuelo[trabajo_id]
+
+                pendientes = []
+                libres = workers - len(en_vuelo)
+                if libres > 0:
+                    pendientes = list(
+                        TrabajoReporte.objects.filter(estado='pendiente').exclude(pk__in=list(en_vuelo))
+                        .order_by('creado').values_list('pk', flat=True)[:libres]
+                    )
+                    for trabajo_id in pendientes:
+                        en_vuelo[trabajo_id] = pool.submit(ejecutar_trabajo, trabajo_id, options['modo'])
+                        self.stdout.write(f'Trabajo {trabajo_id} en curso.')
+
+                if options['una_vez'] and not en_vuelo:
+                    break
+
+                if ultima_limpieza is None or time.monotonic() - ultima_limpieza > 3600:
+                    borrados = limpiar_trabajos()
+                    if borrados:
+                        self.stdout.write(f'{borrados} trabajos vencidos eliminados.')
+                    ultima_limpieza = time.monotonic()
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Deteniendo: se esperan los trabajos en curso...')
+        finally:
+            pool.shutdown(wait=True)
@@ -1,20 +1,25 @@
 from django.utils.deprecation import MiddlewareMixin
-from .models import Log
+from .auditoria import contexto_request, registrar_log
 import logging
+import threading
+import uuid
 
 logger = logging.getLogger(__name__)
 
 class LogUserMiddleware(MiddlewareMixin):
     def process_request(self, request):
-        if hasattr(request, 'user') and request.user.is_authenticated:
-            # Almacena el usuario en el thread local para usarlo en signals
-            import threading
-            threading.current_thread().user = request.user
+        # Almacena el usuario en el thread local para usarlo en signals
+        # (None para anónimos: el hilo se reutiliza entre requests)
+        autenticado = hasattr(request, 'user') and request.user.is_authenticated
+        threading.current_thread().user = request.user if autenticado else None
+        # Campos estructurados de los logs que genere este request (middleware y signals)
+        request.request_id = uuid.uuid4().hex
+        threading.current_thread().auditoria = contexto_request(request)
 
     def process_response(self, request, response):
         if hasattr(request, 'user') and request.user.is_authenticated:
             # Logs de exportación (actualizado para acción 'exportar')
-            if 'exportar' in request.GET and request.GET['exportar'] == '1':
+            if request.GET.get('exportar') == '1' or request.GET.get('formato') in ('csv', 'ndjson'):
                 # Determinar qué se exportó basado en la URL
                 if 'ventas' in request.path:
                     que_exporto = 'reporte de ventas'
@@ -37,7 +42,7 @@ class LogUserMiddleware(MiddlewareMixin):
                 accion = 'exportar'
                 detalles = f'Usuario {request.user.username} exportó {que_exporto} desde {request.path} (IP: {request.META.get("REMOTE_ADDR", "desconocida")})'
                 
-                Log.objects.create(
+                registrar_log(
                     usuario=request.user,
                     modelo=modelo,
                     accion=accion,
@@ -51,13 +56,18 @@ class LogUserMiddleware(MiddlewareMixin):
                 venta_id = request.path.split('/')[-2]  # Asumiendo formato /factura/<id>/
                 modelo = 'ventas'
                 accion = 'exportar'
-                detalles = f'Usuario {request.user.username} descargó factura de venta ID {venta_id} desde {request.path} (IP: {request.META.get("REMOTE_ADDR", "desconocida")})'
+                if venta_id == 'exportar':
+                    detalles = f'Usuario {request.user.username} exportó lote de facturas ({request.GET.urlencode()}) desde {request.path} (IP: {request.META.get("REMOTE_ADDR", "desconocida")})'
+                else:
+                    detalles = f'Usuario {request.user.username} descargó factura de venta ID {venta_id} desde {request.path} (IP: {request.META.get("REMOTE_ADDR", "desconocida")})'
                 
-                Log.objects.create(
+                registrar_log(
                     usuario=request.user,
                     modelo=modelo,
                     accion=accion,
-                    detalles=detalles
+                    detalles=detalles,
+                    objeto_tipo='venta' if venta_id.isdigit() else '',
+                    objeto_id=int(venta_id) if venta_id.isdigit() else None,
                 )
                 logger.info(detalles)
             
@@ -96,12 +106,16 @@ class LogUserMiddleware(MiddlewareMixin):
                 }
                 modelo = modelo_map.get(request.path.split("/")[1], request.path.split("/")[1])
                 
-                Log.objects.create(
+                registrar_log(
                     usuario=request.user,
                     modelo=modelo,
                     accion=accion,
                     detalles=detalles
                 )
                 logger.info(detalles)
-        
+
+        threading.current_thread().user = None
+        threading.current_thread().auditoria = {}
+        if hasattr(request, 'request_id'):
+            response['X-Request-ID'] = request.request_id
         return response
\ No newline at end of file
@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 02:47
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def inicializar_consecutivos(apps, schema_editor):
+    """Arranca cada contador desde el mayor número de factura ya emitido para ese NIT."""
+    Venta = apps.get_model('account', 'Venta')
+    ConsecutivoFactura = apps.get_model('account', 'ConsecutivoFactura')
+    ultimos = Venta.objects.values('nit_empresa').annotate(ultimo=Max('numero_factura'))
+    ConsecutivoFactura.objects.bulk_create([
+        ConsecutivoFactura(nit_empresa=fila['nit_empresa'], ultimo_numero=fila['ultimo'] or 0)
+        for fila in ultimos
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0006_detalleventa_iva_detalleventa_precio_con_iva_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsecutivoFactura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nit_empresa', models.CharField(max_length=20, unique=True)),
+                ('ultimo_numero', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Consecutivo de factura',
+                'verbose_name_plural': 'Consecutivos de factura',
+            },
+        ),
+        migrations.AlterField(
+            model_name='venta',
+            name='numero_factura',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='venta',
+            constraint=models.UniqueConstraint(fields=('nit_empresa', 'numero_factura'), name='venta_nit_numero_factura_uniq'),
+        ),
+        migrations.RunPython(inicializar_consecutivos, migrations.RunPython.noop),
+    ]
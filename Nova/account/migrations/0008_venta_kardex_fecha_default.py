@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 02:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0007_consecutivofactura'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='kardex',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='venta',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0008_venta_kardex_fecha_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='clave_idempotencia',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 03:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0009_venta_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kardex',
+            name='venta',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='account.venta'),
+        ),
+    ]
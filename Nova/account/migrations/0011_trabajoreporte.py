@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 03:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0010_kardex_venta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reporte', models.CharField(max_length=50)),
+                ('formato', models.CharField(max_length=10)),
+                ('parametros', models.JSONField(default=dict)),
+                ('huella', models.CharField(db_index=True, max_length=64)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('completado', 'Completado'), ('error', 'Error')], db_index=True, default='pendiente', max_length=20)),
+                ('filas_totales', models.PositiveIntegerField(blank=True, null=True)),
+                ('filas_procesadas', models.PositiveIntegerField(default=0)),
+                ('archivo', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Trabajo de reporte',
+                'verbose_name_plural': 'Trabajos de reporte',
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-18 03:22
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def cargar_resumen(apps, schema_editor):
+    """Carga inicial desde el historial (lo mismo que `manage.py reconstruir_resumen_ventas`)."""
+    DetalleVenta = apps.get_model('account', 'DetalleVenta')
+    VentaResumenDiario = apps.get_model('account', 'VentaResumenDiario')
+    importe = models.DecimalField(max_digits=14, decimal_places=2)
+    centavos = Decimal('0.01')
+    precio_con_iva = Coalesce('precio_con_iva', F('precio_unitario') * (1 + F('iva')), output_field=importe)
+    filas = (
+        DetalleVenta.objects.filter(venta__estado=True)
+        .annotate(dia=TruncDate('venta__fecha'))
+        .values('dia', 'producto_id', 'venta__usuario_id')
+        .annotate(
+            total_unidades=Sum('cantidad'),
+            total_neto=Sum(F('cantidad') * F('precio_unitario'), output_field=importe),
+            total_bruto=Sum(F('cantidad') * precio_con_iva, output_field=importe),
+        )
+        .order_by()
+    )
+    lote = []
+    for fila in filas.iterator(chunk_size=2000):
+        neto = Decimal(fila['total_neto']).quantize(centavos)
+        bruto = Decimal(fila['total_bruto']).quantize(centavos)
+        lote.append(VentaResumenDiario(
+            fecha=fila['dia'], producto_id=fila['producto_id'], usuario_id=fila['venta__usuario_id'],
+            unidades=fila['total_unidades'], neto=neto, iva=bruto - neto, bruto=bruto,
+        ))
+    VentaResumenDiario.objects.bulk_create(lote, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0011_trabajoreporte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('unidades', models.IntegerField(default=0)),
+                ('neto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('iva', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('bruto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='account.producto')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de ventas',
+                'verbose_name_plural': 'Resúmenes diarios de ventas',
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='resumen_producto_fecha_idx'), models.Index(fields=['usuario', 'fecha'], name='resumen_usuario_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto', 'usuario'), name='resumen_fecha_producto_usuario_uniq')],
+            },
+        ),
+        migrations.RunPython(cargar_resumen, migrations.RunPython.noop),
+    ]
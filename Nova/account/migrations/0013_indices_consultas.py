@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0012_ventaresumendiario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='kardex',
+            index=models.Index(fields=['producto', 'fecha'], name='kardex_producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kardex',
+            index=models.Index(fields=['fecha'], name='kardex_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['fecha'], name='log_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['modelo', 'accion', 'fecha'], name='log_modelo_accion_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha'], name='venta_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 03:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0013_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(db_index=True)),
+                ('cantidad', models.IntegerField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='account.producto')),
+            ],
+            options={
+                'verbose_name': 'Foto de stock',
+                'verbose_name_plural': 'Fotos de stock',
+                'constraints': [models.UniqueConstraint(fields=('producto', 'fecha'), name='snapshot_producto_fecha_uniq')],
+            },
+        ),
+    ]
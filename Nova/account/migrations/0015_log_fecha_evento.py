@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 03:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0014_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='log',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
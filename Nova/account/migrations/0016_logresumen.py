@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 03:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0015_log_fecha_evento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogResumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('modelo', models.CharField(max_length=100)),
+                ('accion', models.CharField(max_length=100)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de logs',
+                'verbose_name_plural': 'Resúmenes diarios de logs',
+                'indexes': [models.Index(fields=['modelo', 'accion', 'fecha'], name='logresumen_modelo_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'usuario', 'modelo', 'accion'), name='logresumen_uniq')],
+            },
+        ),
+    ]
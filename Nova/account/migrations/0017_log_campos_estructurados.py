@@ -0,0 +1,59 @@
+# Generated by Django 5.2 on 2026-10-18 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0016_logresumen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='ip',
+            field=models.GenericIPAddressField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='metodo',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='objeto_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='objeto_tipo',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='request_id',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='ruta',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['ip', 'fecha'], name='log_ip_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['ruta', 'fecha'], name='log_ruta_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['objeto_tipo', 'objeto_id', 'fecha'], name='log_objeto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['request_id'], name='log_request_idx'),
+        ),
+    ]
@@ -1,9 +1,19 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import AbstractUser, User
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import Sum, F, Q, Case, When, Max, Min
+from django.db.models.functions import Coalesce, TruncDate
 import uuid
 from decimal import Decimal
+from .report_cache import invalidar_reportes
+
+class StockInsuficienteError(Exception):
+    """Uno o más productos no tienen stock suficiente para el movimiento solicitado."""
+
+    def __init__(self, productos_ids):
+        self.productos_ids = list(productos_ids)
+        super().__init__(f'Stock insuficiente para los productos {self.productos_ids}')
+
 
 class Usuario(AbstractUser):
     rol = models.ForeignKey('Rol', on_delete=models.SET_NULL, null=True, blank=True)
@@ -136,12 +146,52 @@ class Producto(models.Model):
         verbose_name_plural = 'Productos'
         ordering = ['nombre']
         
+    @classmethod
+    def mover_stock(cls, deltas):
+        """
+        Aplica {producto_id: delta} (negativo = salida) con un único UPDATE condicional:
+        las salidas solo se aplican donde cantidad >= solicitado. Si algún producto no
+        cumple, se revierte todo y se lanza StockInsuficienteError.
+        Devuelve {producto_id: (stock_anterior, stock_actual)} leídos de la base de datos.
+        """
+        condicion = Q()
+        for prod_id, delta in deltas.items():
+            condicion |= Q(pk=prod_id, cantidad__gte=-delta) if delta < 0 else Q(pk=prod_id)
+
+        try:
+            with transaction.atomic():
+                actualizados = cls.objects.filter(condicion).update(
+                    cantidad=Case(
+                        *[When(pk=prod_id, then=F('cantidad') + delta) for prod_id, delta in deltas.items()],
+                        default=F('cantidad'),
+                        output_field=cls._meta.get_field('cantidad'),
+                    ),
+                    fecha_modificacion=timezone.now(),
+                )
+                if actualizados != len(deltas):
+                    raise StockInsuficienteError([])
+                invalidar_reportes(cls)  # update() no emite post_save
+                # Stock posterior leído en la misma transacción (filas ya bloqueadas por el UPDATE)
+                actuales = dict(cls.objects.filter(pk__in=deltas).values_list('id', 'cantidad'))
+        except StockInsuficienteError:
+            # Tras revertir, el stock leído es el de antes del UPDATE: solo faltan los que no alcanzaban
+            previos = dict(cls.objects.filter(pk__in=deltas).values_list('id', 'cantidad'))
+            faltantes = [
+                prod_id for prod_id, delta in deltas.items() if prod_id not in previos or previos[prod_id] < -delta
+            ]
+            # Si otro proceso repuso stock entre ambos pasos, se reportan todas las salidas
+            raise StockInsuficienteError(
+                faltantes or [prod_id for prod_id, delta in deltas.items() if delta < 0]
+            ) from None
+        return {prod_id: (actuales[prod_id] - delta, actuales[prod_id]) for prod_id, delta in deltas.items()}
+
     def reducir_stock(self, cantidad):
-        if self.cantidad >= cantidad:
-            self.cantidad -= cantidad
-            self.save()
-            return True
-        return False
+        try:
+            movimiento = Producto.mover_stock({self.pk: -cantidad})
+        except StockInsuficienteError:
+            return False
+        self.cantidad = movimiento[self.pk][1]
+        return True
 
     def precio_en_cop(self):
         """Convierte precio_unitario a COP usando tasas fijas."""
@@ -152,21 +202,72 @@ class Producto(models.Model):
         }
         return self.precio_unitario * tasas.get(self.moneda, 1)
 
+class ConsecutivoFactura(models.Model):
+    """
+    Contador de numeración de facturas por NIT emisor.
+    La fila se bloquea con un UPDATE atómico dentro de la transacción de la venta,
+    así que un rollback devuelve los números reservados y no quedan huecos.
+    """
+    nit_empresa = models.CharField(max_length=20, unique=True)
+    ultimo_numero = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Consecutivo de factura'
+        verbose_name_plural = 'Consecutivos de factura'
+
+    def __str__(self):
+        return f"{self.nit_empresa}: {self.ultimo_numero}"
+
+    @classmethod
+    def reservar(cls, nit_empresa, cantidad=1):
+        """Reserva `cantidad` números consecutivos para el NIT y devuelve el primero."""
+        with transaction.atomic():
+            actualizados = cls.objects.filter(nit_empresa=nit_empresa).update(
+                ultimo_numero=F('ultimo_numero') + cantidad
+            )
+            if not actualizados:
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(nit_empresa=nit_empresa, ultimo_numero=cantidad)
+                except IntegrityError:
+                    # Otro proceso creó el contador al mismo tiempo
+                    cls.objects.filter(nit_empresa=nit_empresa).update(
+                        ultimo_numero=F('ultimo_numero') + cantidad
+                    )
+            ultimo = cls.objects.filter(nit_empresa=nit_empresa).values_list('ultimo_numero', flat=True).get()
+        return ultimo - cantidad + 1
+
+
 class Venta(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
-    fecha = models.DateTimeField(auto_now_add=True)
+    # default en vez de auto_now_add: la importación de ventas offline conserva su fecha original
+    fecha = models.DateTimeField(default=timezone.now, editable=False)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     estado = models.BooleanField(default=True)
     # Campos nuevos agregados
     cliente_nombre = models.CharField(max_length=100, blank=True, null=True)
     cliente_cedula = models.CharField(max_length=20, blank=True, null=True)
     nit_empresa = models.CharField(max_length=20, default='202266833-4')
-    numero_factura = models.IntegerField(unique=True, blank=True, null=True)
+    numero_factura = models.IntegerField(blank=True, null=True)
+    # Clave generada por el cliente: un reenvío del mismo formulario devuelve la venta original
+    clave_idempotencia = models.CharField(max_length=64, unique=True, blank=True, null=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['nit_empresa', 'numero_factura'], name='venta_nit_numero_factura_uniq'),
+        ]
+        indexes = [
+            # Rangos de fecha del reporte de ventas y la exportación de facturas
+            models.Index(fields=['fecha'], name='venta_fecha_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.numero_factura:
-            last_factura = Venta.objects.order_by('-numero_factura').first()
-            self.numero_factura = (last_factura.numero_factura + 1) if last_factura else 1
+            # El número se reserva en la misma transacción del INSERT
+            with transaction.atomic():
+                self.numero_factura = ConsecutivoFactura.reservar(self.nit_empresa)
+                super().save(*args, **kwargs)
+            return
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -192,15 +293,242 @@ class DetalleVenta(models.Model):
     def __str__(self):
         return f"{self.producto.nombre} x{self.cantidad}"
 
+class VentaResumenDiario(models.Model):
+    """
+    Ventas activas acumuladas por día (fecha local) × producto × vendedor. Se actualiza en la misma
+    transacción que registra o anula la venta; `manage.py reconstruir_resumen_ventas` la recalcula
+    desde el historial. Los totales de reportes y dashboard se leen de aquí, no de Venta/DetalleVenta.
+    """
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    unidades = models.IntegerField(default=0)
+    neto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    iva = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    bruto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    CAMPOS_IMPORTES = ('unidades', 'neto', 'iva', 'bruto')
+    CENTAVOS = Decimal('0.01')
+
+    class Meta:
+        verbose_name = 'Resumen diario de ventas'
+        verbose_name_plural = 'Resúmenes diarios de ventas'
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto', 'usuario'], name='resumen_fecha_producto_usuario_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='resumen_producto_fecha_idx'),
+            models.Index(fields=['usuario', 'fecha'], name='resumen_usuario_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.producto_id}/{self.usuario_id}: {self.unidades} u."
+
+    @classmethod
+    def acumular(cls, ventas, signo=1):
+        """
+        Suma (signo=1) o resta (signo=-1, anulación) las líneas de `ventas`: [(venta, detalles)].
+        Lee las filas afectadas con bloqueo, las actualiza con un bulk_update y crea las que faltan.
+        """
+        deltas = {}
+        for venta, detalles in ventas:
+            fecha = timezone.localdate(venta.fecha)
+            for detalle in detalles:
+                # Mismo redondeo que al guardar los precios: la reconstrucción da los mismos totales
+                neto = detalle.cantidad * Decimal(detalle.precio_unitario).quantize(cls.CENTAVOS)
+                bruto = detalle.cantidad * Decimal(detalle.precio_con_iva).quantize(cls.CENTAVOS)
+                acumulado = deltas.setdefault((fecha, detalle.producto_id, venta.usuario_id), [0, 0, 0, 0])
+                for i, valor in enumerate((detalle.cantidad, neto, bruto - neto, bruto)):
+                    acumulado[i] += signo * valor
+        if not deltas:
+            return
+
+        for intento in range(2):
+            try:
+                with transaction.atomic():
+                    existentes = {
+                        (fila.fecha, fila.producto_id, fila.usuario_id): fila
+                        for fila in cls.objects.select_for_update().filter(
+                            fecha__in={fecha for fecha, _, _ in deltas},
+                            producto_id__in={prod_id for _, prod_id, _ in deltas},
+                            usuario_id__in={usuario_id for _, _, usuario_id in deltas},
+                        )
+                    }
+                    nuevas = []
+                    for clave, valores in deltas.items():
+                        fila = existentes.get(clave)
+                        if fila is None:
+                            fila = cls(fecha=clave[0], producto_id=clave[1], usuario_id=clave[2])
+                            nuevas.append(fila)
+                        for campo, valor in zip(cls.CAMPOS_IMPORTES, valores):
+                            setattr(fila, campo, getattr(fila, campo) + valor)
+                    cls.objects.bulk_update(
+                        [fila for clave, fila in existentes.items() if clave in deltas], cls.CAMPOS_IMPORTES,
+                    )
+                    cls.objects.bulk_create(nuevas)
+                break
+            except IntegrityError:
+                # Otra venta del mismo día creó la fila: se deshace el intento y se vuelve a leer con bloqueo
+                if intento:
+                    raise
+        invalidar_reportes(cls)  # bulk_update/bulk_create no emiten post_save
+
+    @classmethod
+    def reconstruir(cls, desde=None, hasta=None, tamano_lote=2000):
+        """Recalcula el resumen del rango de fechas (todo el historial por defecto). Devuelve las filas creadas."""
+        resumen = cls.objects.all()
+        detalles = DetalleVenta.objects.filter(venta__estado=True)
+        if desde:
+            resumen = resumen.filter(fecha__gte=desde)
+            detalles = detalles.filter(venta__fecha__date__gte=desde)
+        if hasta:
+            resumen = resumen.filter(fecha__lte=hasta)
+            detalles = detalles.filter(venta__fecha__date__lte=hasta)
+
+        importe = models.DecimalField(max_digits=14, decimal_places=2)
+        precio_con_iva = Coalesce('precio_con_iva', F('precio_unitario') * (1 + F('iva')), output_field=importe)
+        filas = (
+            detalles.annotate(dia=TruncDate('venta__fecha'))
+            .values('dia', 'producto_id', 'venta__usuario_id')
+            .annotate(
+                total_unidades=Sum('cantidad'),
+                total_neto=Sum(F('cantidad') * F('precio_unitario'), output_field=importe),
+                total_bruto=Sum(F('cantidad') * precio_con_iva, output_field=importe),
+            )
+            .order_by()
+        )
+        creadas = 0
+        with transaction.atomic():
+            resumen.delete()
+            lote = []
+            for fila in filas.iterator(chunk_size=tamano_lote):
+                neto = Decimal(fila['total_neto']).quantize(cls.CENTAVOS)
+                bruto = Decimal(fila['total_bruto']).quantize(cls.CENTAVOS)
+                lote.append(cls(
+                    fecha=fila['dia'], producto_id=fila['producto_id'], usuario_id=fila['venta__usuario_id'],
+                    unidades=fila['total_unidades'], neto=neto, iva=bruto - neto, bruto=bruto,
+                ))
+                if len(lote) >= tamano_lote:
+                    creadas += len(cls.objects.bulk_create(lote))
+                    lote = []
+            creadas += len(cls.objects.bulk_create(lote))
+            invalidar_reportes(cls)
+        return creadas
+
+    @classmethod
+    def totales(cls, desde=None, hasta=None, **filtros):
+        """Unidades e importes del rango en una consulta sobre el resumen (sin recorrer las ventas)."""
+        resumen = cls.objects.filter(**filtros)
+        if desde:
+            resumen = resumen.filter(fecha__gte=desde)
+        if hasta:
+            resumen = resumen.filter(fecha__lte=hasta)
+        totales = resumen.aggregate(**{campo: Sum(campo) for campo in cls.CAMPOS_IMPORTES})
+        return {campo: valor or 0 for campo, valor in totales.items()}
+
+    @classmethod
+    def agrupado(cls, por, desde=None, hasta=None, **filtros):
+        """Totales del rango agrupados por `por` (p. ej. 'producto__nombre'), de mayor a menor venta bruta."""
+        resumen = cls.objects.filter(**filtros)
+        if desde:
+            resumen = resumen.filter(fecha__gte=desde)
+        if hasta:
+            resumen = resumen.filter(fecha__lte=hasta)
+        return resumen.values(por).annotate(**{campo: Sum(campo) for campo in cls.CAMPOS_IMPORTES}).order_by('-bruto')
+
 class Kardex(models.Model):
     TIPO_CHOICES = [('entrada', 'Entrada'), ('salida', 'Salida')]
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
     tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
     cantidad = models.IntegerField()
     stock_anterior = models.IntegerField(default=0)
-    fecha = models.DateTimeField(auto_now_add=True)
+    fecha = models.DateTimeField(default=timezone.now, editable=False)
     motivo = models.CharField(max_length=100)
     usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True)
+    # Venta que originó el movimiento (None para ajustes manuales y registros anteriores a este campo)
+    venta = models.ForeignKey(Venta, on_delete=models.SET_NULL, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Vista de Kardex: filtro por producto + rango de fechas, ordenado por fecha
+            models.Index(fields=['producto', 'fecha'], name='kardex_producto_fecha_idx'),
+            # Mismo listado sin producto seleccionado
+            models.Index(fields=['fecha'], name='kardex_fecha_idx'),
+        ]
+
+    @classmethod
+    def registrar_movimientos(cls, movimientos, motivo, usuario=None, extras=None):
+        """
+        Mueve el stock y escribe los registros de Kardex en la misma transacción.
+        movimientos: lista de (producto_id, tipo, cantidad) con tipo 'entrada' o 'salida'.
+        extras: lista opcional (alineada con movimientos) de campos adicionales por fila, p. ej. la fecha.
+        El stock_anterior de cada fila sale de la base de datos, no de una lectura previa.
+        """
+        deltas = {}
+        for prod_id, tipo, cantidad in movimientos:
+            deltas[prod_id] = deltas.get(prod_id, 0) + (cantidad if tipo == 'entrada' else -cantidad)
+
+        with transaction.atomic():
+            stock = Producto.mover_stock(deltas)
+            # Con varias líneas del mismo producto se encadena el stock entre filas
+            corriente = {prod_id: anterior for prod_id, (anterior, _) in stock.items()}
+            registros = []
+            for i, (prod_id, tipo, cantidad) in enumerate(movimientos):
+                registros.append(cls(
+                    producto_id=prod_id,
+                    tipo=tipo,
+                    cantidad=cantidad,
+                    stock_anterior=corriente[prod_id],
+                    motivo=motivo,
+                    usuario=usuario,
+                    **(extras[i] if extras else {}),
+                ))
+                corriente[prod_id] += cantidad if tipo == 'entrada' else -cantidad
+            invalidar_reportes(cls)  # bulk_create no emite post_save
+            creados = cls.objects.bulk_create(registros)
+            if extras and any('fecha' in extra for extra in extras):
+                StockSnapshot.ajustar_por_movimientos(creados)
+            return creados
+
+    @classmethod
+    def registrar(cls, producto, tipo, cantidad, motivo, usuario=None):
+        """Atajo para un único movimiento; lanza StockInsuficienteError si no alcanza."""
+        return cls.registrar_movimientos([(producto.pk, tipo, cantidad)], motivo, usuario)[0]
+
+    @classmethod
+    def movimientos_por_venta(cls, ventas, producto_id=None):
+        """
+        {venta_id: [movimientos]} para una lista de ventas con sus detalles precargados, en dos consultas:
+        una por la FK `venta` y otra, solo para ventas sin movimientos enlazados (registros antiguos),
+        con el criterio anterior de mismo producto y mismo día.
+        """
+        base = cls.objects.select_related('producto').order_by('fecha', 'id')
+        if producto_id:
+            base = base.filter(producto_id=producto_id)
+
+        resultado = {venta.id: [] for venta in ventas}
+        for movimiento in base.filter(venta_id__in=list(resultado)):
+            resultado[movimiento.venta_id].append(movimiento)
+
+        antiguas = [venta for venta in ventas if not resultado[venta.id]]
+        if not antiguas:
+            return resultado
+        productos_por_venta = {
+            venta.id: {detalle.producto_id for detalle in venta.detalleventa_set.all()} for venta in antiguas
+        }
+        por_producto_y_dia = {}
+        for movimiento in base.filter(
+            venta__isnull=True,
+            producto_id__in=set().union(*productos_por_venta.values()),
+            fecha__date__in={timezone.localdate(venta.fecha) for venta in antiguas},
+        ):
+            clave = (movimiento.producto_id, timezone.localdate(movimiento.fecha))
+            por_producto_y_dia.setdefault(clave, []).append(movimiento)
+        for venta in antiguas:
+            dia = timezone.localdate(venta.fecha)
+            movimientos = [m for prod_id in productos_por_venta[venta.id] for m in por_producto_y_dia.get((prod_id, dia), [])]
+            resultado[venta.id] = sorted(movimientos, key=lambda m: (m.fecha, m.id))
+        return resultado
 
     def stock_actual(self):
         if self.tipo == 'entrada':
@@ -211,12 +539,234 @@ class Kardex(models.Model):
     def __str__(self):
         return f"{self.tipo} - {self.producto.nombre} ({self.cantidad})"
 
+    @staticmethod
+    def delta_stock():
+        """Expresión del efecto de un movimiento sobre el stock: +cantidad las entradas, -cantidad las salidas."""
+        return Case(When(tipo='entrada', then=F('cantidad')), default=F('cantidad') * -1)
+
+    @classmethod
+    def deltas(cls, productos_ids, desde=None, hasta=None):
+        """{producto_id: entradas - salidas} de los movimientos con desde <= fecha < hasta, en una consulta."""
+        movimientos = cls.objects.filter(producto_id__in=productos_ids)
+        if desde:
+            movimientos = movimientos.filter(fecha__gte=desde)
+        if hasta:
+            movimientos = movimientos.filter(fecha__lt=hasta)
+        return dict(
+            movimientos.values('producto_id').annotate(delta=Sum(cls.delta_stock())).values_list('producto_id', 'delta').order_by()
+        )
+
+class StockSnapshot(models.Model):
+    """
+    Foto del stock de todos los productos en un instante (`manage.py capturar_stock`, una vez al día).
+    La fila incluye los movimientos de Kardex con fecha anterior a `fecha`; el stock en otro instante
+    se obtiene desde la foto más cercana sumando o restando solo los movimientos intermedios.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    fecha = models.DateTimeField(db_index=True)
+    cantidad = models.IntegerField()
+    # Precio en COP al momento de la foto: las valorizaciones históricas usan el precio de entonces
+    precio_unitario = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        verbose_name = 'Foto de stock'
+        verbose_name_plural = 'Fotos de stock'
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='snapshot_producto_fecha_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} @ {self.fecha:%Y-%m-%d %H:%M}: {self.cantidad}"
+
+    @classmethod
+    def capturar(cls, tamano_lote=2000):
+        """Toma una foto de todos los productos. Devuelve (fecha, filas)."""
+        with transaction.atomic():
+            # La fecha se toma dentro de la transacción de escritura: las ventas anteriores ya están
+            # confirmadas y las posteriores tendrán movimientos con fecha mayor
+            fecha = timezone.now()
+            lote, filas = [], 0
+            productos = Producto.objects.values_list('id', 'cantidad', 'precio_unitario', 'moneda')
+            for prod_id, cantidad, precio, moneda in productos.iterator(chunk_size=tamano_lote):
+                precio_cop = Producto(precio_unitario=precio, moneda=moneda).precio_en_cop()
+                lote.append(cls(producto_id=prod_id, fecha=fecha, cantidad=cantidad, precio_unitario=precio_cop))
+                if len(lote) >= tamano_lote:
+                    filas += len(cls.objects.bulk_create(lote))
+                    lote = []
+            filas += len(cls.objects.bulk_create(lote))
+        return fecha, filas
+
+    @classmethod
+    def ajustar_por_movimientos(cls, registros):
+        """
+        Movimientos con fecha pasada (ventas importadas de terminales offline) que caen antes de fotos
+        ya tomadas: se suman a esas fotos para que sigan cuadrando con el Kardex.
+        """
+        if not registros or not cls.objects.filter(fecha__gt=min(r.fecha for r in registros)).exists():
+            return
+        deltas = {}
+        for registro in registros:
+            clave = (registro.producto_id, registro.fecha)
+            deltas[clave] = deltas.get(clave, 0) + (registro.cantidad if registro.tipo == 'entrada' else -registro.cantidad)
+
+        # Cada foto suma los movimientos de su producto anteriores a ella: acumulado por fecha y, en el
+        # Case, de la fecha más reciente a la más antigua (gana la primera anterior a la foto). Un UPDATE.
+        condiciones, filtro, acumulado = [], Q(), {}
+        for (prod_id, fecha), delta in sorted(deltas.items()):
+            acumulado[prod_id] = acumulado.get(prod_id, 0) + delta
+            condiciones.append(When(producto_id=prod_id, fecha__gt=fecha, then=acumulado[prod_id]))
+            filtro |= Q(producto_id=prod_id, fecha__gt=fecha)
+        cls.objects.filter(filtro).update(
+            cantidad=F('cantidad') + Case(*reversed(condiciones), default=0, output_field=models.IntegerField())
+        )
+
+    @classmethod
+    def stock_en(cls, fecha, productos):
+        """
+        Stock y precio de `productos` (queryset de Producto) en el instante `fecha`: {producto_id: (cantidad, precio)}.
+        Cada producto parte de la foto más reciente anterior a `fecha` y suma los movimientos posteriores;
+        si no hay una anterior, parte de la siguiente (o del stock actual) y resta los movimientos hacia atrás.
+        El costo depende de los movimientos entre la foto y `fecha`, no de toda la historia.
+        """
+        pendientes = set(productos.filter(fecha_creacion__lt=fecha).values_list('id', flat=True).order_by())
+        resultado = {}
+
+        anterior = pendientes and cls.objects.filter(fecha__lte=fecha).aggregate(fecha_foto=Max('fecha'))['fecha_foto']
+        if anterior:
+            fotos = cls.objects.filter(fecha=anterior, producto_id__in=pendientes)
+            base = {prod_id: (cantidad, precio) for prod_id, cantidad, precio in fotos.values_list('producto_id', 'cantidad', 'precio_unitario')}
+            deltas = Kardex.deltas(list(base), desde=anterior, hasta=fecha)
+            for prod_id, (cantidad, precio) in base.items():
+                resultado[prod_id] = (cantidad + deltas.get(prod_id, 0), precio)
+            pendientes -= set(base)
+
+        siguiente = pendientes and cls.objects.filter(fecha__gt=fecha).aggregate(fecha_foto=Min('fecha'))['fecha_foto']
+        if siguiente:
+            fotos = cls.objects.filter(fecha=siguiente, producto_id__in=pendientes)
+            base = {prod_id: (cantidad, precio) for prod_id, cantidad, precio in fotos.values_list('producto_id', 'cantidad', 'precio_unitario')}
+            deltas = Kardex.deltas(list(base), desde=fecha, hasta=siguiente)
+            for prod_id, (cantidad, precio) in base.items():
+                resultado[prod_id] = (cantidad - deltas.get(prod_id, 0), precio)
+            pendientes -= set(base)
+
+        if pendientes:
+            # Productos sin ninguna foto: se parte del stock actual
+            actuales = Producto.objects.filter(id__in=pendientes).only('id', 'cantidad', 'precio_unitario', 'moneda')
+            deltas = Kardex.deltas(list(pendientes), desde=fecha)
+            for producto in actuales:
+                resultado[producto.id] = (producto.cantidad - deltas.get(producto.id, 0), producto.precio_en_cop())
+        return resultado
+
 class Log(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True)
     modelo = models.CharField(max_length=100)
     accion = models.CharField(max_length=100)
     detalles = models.TextField()
-    fecha = models.DateTimeField(auto_now_add=True)
-         
+    # Hora del evento: los registros se escriben en lotes (ver auditoria.py), no al ocurrir
+    fecha = models.DateTimeField(default=timezone.now)
+    # Datos estructurados del evento (antes solo dentro de `detalles`): request que lo originó y objeto afectado
+    ip = models.GenericIPAddressField(null=True, blank=True)
+    ruta = models.CharField(max_length=255, blank=True, default='')
+    metodo = models.CharField(max_length=10, blank=True, default='')
+    objeto_tipo = models.CharField(max_length=50, blank=True, default='')
+    objeto_id = models.BigIntegerField(null=True, blank=True)
+    request_id = models.CharField(max_length=32, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # Listado de logs: rangos de fecha ordenados por -fecha, con o sin módulo y acción
+            models.Index(fields=['fecha'], name='log_fecha_idx'),
+            models.Index(fields=['modelo', 'accion', 'fecha'], name='log_modelo_accion_fecha_idx'),
+            # Búsquedas exactas por campo estructurado, ordenadas por fecha
+            models.Index(fields=['ip', 'fecha'], name='log_ip_fecha_idx'),
+            models.Index(fields=['ruta', 'fecha'], name='log_ruta_fecha_idx'),
+            models.Index(fields=['objeto_tipo', 'objeto_id', 'fecha'], name='log_objeto_fecha_idx'),
+            models.Index(fields=['request_id'], name='log_request_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} - {self.accion} por {self.usuario}"
+
+class LogResumen(models.Model):
+    """
+    Conteo de logs archivados por día (fecha local) × usuario × módulo × acción. `manage.py archivar_logs`
+    lo acumula al mover los registros viejos a los archivos comprimidos; los recientes siguen en Log.
+    """
+    fecha = models.DateField()
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    modelo = models.CharField(max_length=100)
+    accion = models.CharField(max_length=100)
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Resumen diario de logs'
+        verbose_name_plural = 'Resúmenes diarios de logs'
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'usuario', 'modelo', 'accion'], name='logresumen_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['modelo', 'accion', 'fecha'], name='logresumen_modelo_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.modelo}/{self.accion}: {self.cantidad}"
+
+    @classmethod
+    def acumular(cls, conteos):
+        """Suma `conteos` ({(fecha, usuario_id, modelo, accion): n}) a las filas existentes o las crea."""
+        if not conteos:
+            return
+        with transaction.atomic():
+            existentes = {
+                (fila.fecha, fila.usuario_id, fila.modelo, fila.accion): fila
+                for fila in cls.objects.select_for_update().filter(
+                    fecha__in={fecha for fecha, _, _, _ in conteos},
+                    modelo__in={modelo for _, _, modelo, _ in conteos},
+                )
+            }
+            nuevas = []
+            for clave, cantidad in conteos.items():
+                fila = existentes.get(clave)
+                if fila is None:
+                    nuevas.append(cls(fecha=clave[0], usuario_id=clave[1], modelo=clave[2], accion=clave[3], cantidad=cantidad))
+                else:
+                    fila.cantidad += cantidad
+            cls.objects.bulk_update([fila for clave, fila in existentes.items() if clave in conteos], ['cantidad'])
+            cls.objects.bulk_create(nuevas)
+
+class TrabajoReporte(models.Model):
+    """Exportación de un reporte ejecutada en segundo plano por `manage.py procesar_reportes`."""
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    reporte = models.CharField(max_length=50)
+    formato = models.CharField(max_length=10)
+    parametros = models.JSONField(default=dict)
+    # Hash de reporte + formato + filtros normalizados: permite reutilizar resultados recientes
+    huella = models.CharField(max_length=64, db_index=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente', db_index=True)
+    filas_totales = models.PositiveIntegerField(null=True, blank=True)
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    archivo = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    creado = models.DateTimeField(default=timezone.now, editable=False)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Trabajo de reporte'
+        verbose_name_plural = 'Trabajos de reporte'
+
+    @property
+    def progreso(self):
+        if self.estado == 'completado':
+            return 100
+        if not self.filas_totales:
+            return 0
+        return min(99, self.filas_procesadas * 100 // self.filas_totales)
+
     def __str__(self):
-        return f"{self.modelo} - {self.accion} por {self.usuario}"
\ No newline at end of file
+        return f"{self.reporte}.{self.formato} ({self.estado})"
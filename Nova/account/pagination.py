@@ -0,0 +1,78 @@
+import base64
+import json
+
+from django.db.models import Q
+
+# ====================================================
+# --- Paginación por cursor (keyset) ---
+# ====================================================
+# En lugar de OFFSET, cada página continúa desde la última fila vista: WHERE (campo, id) > (valor, id)
+# sobre un índice que empieza por `campo`. El costo de una página no depende de qué tan lejos se esté
+# ni del tamaño de la tabla, y las filas nuevas no desplazan las páginas ya vistas.
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no se pudo decodificar."""
+
+
+class PaginaCursor:
+    def __init__(self, objetos, siguiente, anterior):
+        self.objetos = objetos
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+
+def _valor(fila, campo):
+    return fila[campo] if isinstance(fila, dict) else getattr(fila, campo)
+
+
+def codificar_cursor(direccion, valor, pk):
+    contenido = json.dumps([direccion, valor.isoformat() if hasattr(valor, 'isoformat') else valor, pk])
+    return base64.urlsafe_b64encode(contenido.encode()).decode().rstrip('=')
+
+
+def leer_cursor(cursor, campo_modelo):
+    """Devuelve (hacia_adelante, valor, pk). Lanza CursorInvalido si el cursor está mal formado."""
+    try:
+        contenido = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direccion, valor, pk = json.loads(contenido)
+        if direccion not in ('s', 'a') or not isinstance(pk, int):
+            raise ValueError(direccion)
+        return direccion == 's', campo_modelo.to_python(valor), pk
+    except Exception as e:
+        raise CursorInvalido(f'Cursor inválido: {cursor}') from e
+
+
+def paginar_por_cursor(queryset, cursor=None, por_pagina=50, campo='fecha', descendente=False):
+    """
+    Página de `queryset` ordenada por (campo, id), ascendente o descendente, a partir de `cursor`
+    (None = primera página). Funciona con querysets de modelos o de values() (que deben incluir `campo` e 'id').
+    """
+    adelante = True
+    if cursor:
+        adelante, valor, pk = leer_cursor(cursor, queryset.model._meta.get_field(campo))
+        mayor, mayor_igual = ('gt', 'gte') if adelante != descendente else ('lt', 'lte')
+        # El rango sobre `campo` usa el índice; el desempate por id solo afecta a las filas con el mismo valor
+        queryset = queryset.filter(**{f'{campo}__{mayor_igual}': valor}).filter(
+            Q(**{f'{campo}__{mayor}': valor}) | Q(**{campo: valor, f'id__{mayor}': pk})
+        )
+    orden = (campo, 'id') if adelante != descendente else (f'-{campo}', '-id')
+    filas = list(queryset.order_by(*orden)[:por_pagina + 1])
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    if not adelante:
+        filas.reverse()
+
+    siguiente = anterior = None
+    if filas:
+        if hay_mas or not adelante:
+            siguiente = codificar_cursor('s', _valor(filas[-1], campo), _valor(filas[-1], 'id'))
+        if cursor and (adelante or hay_mas):
+            anterior = codificar_cursor('a', _valor(filas[0], campo), _valor(filas[0], 'id'))
+    return PaginaCursor(filas, siguiente, anterior)
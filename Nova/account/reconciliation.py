@@ -0,0 +1,85 @@
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.utils import timezone
+
+from .models import Kardex, Producto
+from .report_cache import invalidar_reportes
+
+# ====================================================
+# --- Conciliación Kardex vs. stock ---
+# ====================================================
+# El stock esperado de un producto es el stock_anterior de su primer movimiento (el saldo con el que
+# arrancó su Kardex) más la suma de entradas y salidas. El primer movimiento es el de menor id y no el
+# de menor fecha: stock_anterior se calcula al insertar, así que la cadena sigue el orden de inserción.
+
+MOTIVO_CONCILIACION = 'ajuste conciliación'
+
+
+def stock_esperado(productos_ids=None):
+    """
+    {producto_id: (stock_esperado, movimientos)} para todo el catálogo en dos consultas agregadas
+    (GROUP BY producto y el saldo inicial de cada uno); en Python solo se recorre una fila por producto.
+    """
+    movimientos = Kardex.objects.all()
+    if productos_ids is not None:
+        movimientos = movimientos.filter(producto_id__in=productos_ids)
+    por_producto = movimientos.values('producto_id').annotate(delta=Sum(Kardex.delta_stock()), total=Count('id'), primero=Min('id')).order_by()
+    aperturas = dict(
+        Kardex.objects.filter(id__in=por_producto.values('primero')).values_list('producto_id', 'stock_anterior')
+    )
+    return {
+        fila['producto_id']: (aperturas[fila['producto_id']] + fila['delta'], fila['total'])
+        for fila in por_producto.values('producto_id', 'delta', 'total')
+    }
+
+
+def descuadres():
+    """
+    Productos cuyo stock no coincide con su Kardex, ordenados por diferencia absoluta.
+    Devuelve (descuadres, productos_sin_movimientos).
+    """
+    esperado = stock_esperado()
+    resultado, sin_movimientos = [], 0
+    productos = Producto.objects.values_list('id', 'nombre', 'cantidad', 'almacen_id', 'almacen__nombre').order_by()
+    for prod_id, nombre, cantidad, almacen_id, almacen in productos.iterator(chunk_size=5000):
+        if prod_id not in esperado:
+            sin_movimientos += 1
+            continue
+        stock_kardex, movimientos = esperado[prod_id]
+        if cantidad != stock_kardex:
+            resultado.append({
+                'producto_id': prod_id, 'nombre': nombre, 'almacen_id': almacen_id, 'almacen': almacen or '-',
+                'stock': cantidad, 'esperado': stock_kardex, 'diferencia': cantidad - stock_kardex,
+                'movimientos': movimientos,
+            })
+    resultado.sort(key=lambda fila: -abs(fila['diferencia']))
+    return resultado, sin_movimientos
+
+
+def corregir(productos_ids, usuario=None):
+    """
+    Escribe un movimiento de ajuste por cada producto descuadrado para que el Kardex explique el stock
+    actual (el stock no se toca: es el último conteo o edición). Se recalcula con las filas bloqueadas,
+    así que una venta simultánea no deja el ajuste desfasado. Devuelve los ajustes creados.
+    """
+    with transaction.atomic():
+        stock = dict(Producto.objects.select_for_update().filter(id__in=productos_ids).values_list('id', 'cantidad'))
+        esperado = stock_esperado(list(stock))
+        ajustes = []
+        for prod_id, cantidad in stock.items():
+            if prod_id not in esperado:
+                continue
+            diferencia = cantidad - esperado[prod_id][0]
+            if diferencia:
+                ajustes.append(Kardex(
+                    producto_id=prod_id,
+                    tipo='entrada' if diferencia > 0 else 'salida',
+                    cantidad=abs(diferencia),
+                    stock_anterior=esperado[prod_id][0],
+                    motivo=MOTIVO_CONCILIACION,
+                    usuario=usuario,
+                    fecha=timezone.now(),
+                ))
+        Kardex.objects.bulk_create(ajustes)
+        invalidar_reportes(Kardex)
+    return ajustes
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# ====================================================
+# --- Caché de reportes con invalidación por modelo ---
+# ====================================================
+# Cada modelo tiene una "versión" en la caché. Las claves de los reportes incluyen las versiones de
+# los modelos que consultan, así que basta con cambiar la versión de un modelo para que todas las
+# entradas que dependen de él dejen de encontrarse (y venzan solas por TTL).
+
+
+def _clave_version(modelo):
+    return f'reportes:version:{modelo._meta.label_lower}'
+
+
+def _nueva_version():
+    # Valor único y no un contador: si la clave se desaloja no puede reaparecer una versión vieja
+    return uuid.uuid4().hex
+
+
+def versiones(modelos):
+    """Firma con la versión actual de cada modelo; los que no tienen versión reciben una nueva."""
+    claves = [_clave_version(modelo) for modelo in modelos]
+    actuales = cache.get_many(claves)
+    nuevas = {clave: _nueva_version() for clave in claves if clave not in actuales}
+    if nuevas:
+        cache.set_many(nuevas, None)
+        actuales.update(nuevas)
+    return '.'.join(actuales[clave] for clave in claves)
+
+
+def invalidar_reportes(*modelos):
+    """
+    Descarta los reportes cacheados que dependen de `modelos`. Se aplica ya y otra vez al confirmar
+    la transacción: lo que se cachee en medio (todavía con los datos viejos) también queda descartado.
+    """
+    def cambiar():
+        cache.set_many({_clave_version(modelo): _nueva_version() for modelo in modelos}, None)
+
+    cambiar()
+    transaction.on_commit(cambiar)
+
+
+def clave_reporte(nombre, parametros, firma_versiones):
+    contenido = json.dumps([parametros, firma_versiones], sort_keys=True, default=str)
+    return f'reporte:{nombre}:{hashlib.sha1(contenido.encode()).hexdigest()}'
+
+
+def cachear(clave, calcular, filas=None):
+    """
+    get_or_set con el TTL de reportes. `filas(valor)` indica el tamaño del resultado: los que superan
+    REPORTES_CACHE_MAX_FILAS se calculan pero no se guardan.
+    """
+    valor = cache.get(clave)
+    if valor is None:
+        valor = calcular()
+        if filas is None or filas(valor) <= settings.REPORTES_CACHE_MAX_FILAS:
+            cache.set(clave, valor, settings.REPORTES_CACHE_TTL)
+    return valor
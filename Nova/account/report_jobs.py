@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .exports import FORMATOS_STREAMING, filas_queryset, generar_pdf, generar_texto
+from .models import TrabajoReporte
+from .reports import REPORTES
+
+logger = logging.getLogger(__name__)
+
+FORMATOS_TRABAJO = FORMATOS_STREAMING + ('pdf',)
+
+
+class TrabajoReporteError(Exception):
+    """Solicitud de trabajo de reporte inválida (reporte o formato desconocido)."""
+
+
+def _directorio():
+    directorio = Path(settings.REPORTES_TRABAJOS_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def ruta_archivo(trabajo):
+    return _directorio() / trabajo.archivo
+
+
+def solicitar_reporte(usuario, nombre, formato, params):
+    """
+    Encola la exportación de un reporte registrado. Si ya hay uno igual en curso, o uno completado
+    dentro de REPORTES_TRABAJOS_TTL, se devuelve ese en lugar de crear otro.
+    """
+    if nombre not in REPORTES:
+        raise TrabajoReporteError(f'Reporte desconocido: {nombre}.')
+    if formato not in FORMATOS_TRABAJO:
+        raise TrabajoReporteError(f'Formato no soportado: {formato}.')
+
+    parametros = REPORTES[nombre](params).activos
+    huella = hashlib.sha256(json.dumps([nombre, formato, parametros], sort_keys=True).encode()).hexdigest()
+    limite = timezone.now() - timedelta(seconds=settings.REPORTES_TRABAJOS_TTL)
+    for trabajo in TrabajoReporte.objects.filter(huella=huella).exclude(estado='error').order_by('-creado'):
+        if trabajo.estado != 'completado' or (trabajo.terminado >= limite and ruta_archivo(trabajo).exists()):
+            return trabajo
+    return TrabajoReporte.objects.create(
+        usuario=usuario, reporte=nombre, formato=formato, parametros=parametros, huella=huella,
+    )
+
+
+def _con_progreso(filas, trabajo_id, cada):
+    """Cuenta las filas que pasan y guarda el avance cada `cada` filas (un UPDATE de una columna)."""
+    procesadas = 0
+    for fila in filas:
+        yield fila
+        procesadas += 1
+        if procesadas % cada == 0:
+            TrabajoReporte.objects.filter(pk=trabajo_id).update(filas_procesadas=procesadas)
+    TrabajoReporte.objects.filter(pk=trabajo_id).update(filas_procesadas=procesadas)
+
+
+def _escribir(trabajo, reporte, filas, destino):
+    """Escribe en un temporal del mismo directorio y lo renombra al terminar."""
+    fd, temporal = tempfile.mkstemp(dir=destino.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as salida:
+            if trabajo.formato == 'pdf':
+                encabezados = [columna[0] for columna in reporte.columnas]
+                with generar_pdf(reporte.titulo, [(None, encabezados, filas)]) as pdf:
+                    shutil.copyfileobj(pdf, salida)
+            else:
+                for linea in generar_texto(trabajo.formato, reporte.columnas, filas):
+                    salida.write(linea.encode('utf-8'))
+        os.replace(temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def ejecutar_trabajo(trabajo_id, modo):
+    """
+    Tarea del pool: genera el archivo de un trabajo pendiente. Solo un worker puede reclamarlo.
+    `modo` es el del pool que la ejecuta ('hilo' o 'proceso'), que puede no ser el de settings.
+    """
+    try:
+        if not TrabajoReporte.objects.filter(pk=trabajo_id, estado='pendiente').update(estado='en_proceso'):
+            return
+        trabajo = TrabajoReporte.objects.get(pk=trabajo_id)
+        try:
+            reporte = REPORTES[trabajo.reporte](trabajo.parametros)
+            queryset = reporte.queryset()
+            total = queryset.count()
+            TrabajoReporte.objects.filter(pk=trabajo_id).update(filas_totales=total)
+
+            trabajo.archivo = f'{trabajo.reporte}_{trabajo.pk}.{trabajo.formato}'
+            filas = _con_progreso(filas_queryset(queryset, reporte.columnas), trabajo_id, max(total // 100, 500))
+            inicio = time.monotonic()
+            _escribir(trabajo, reporte, filas, ruta_archivo(trabajo))
+            TrabajoReporte.objects.filter(pk=trabajo_id).update(
+                estado='completado', archivo=trabajo.archivo, terminado=timezone.now(),
+            )
+            logger.info(f'Trabajo de reporte {trabajo_id} ({trabajo}) listo: {total} filas en {time.monotonic() - inicio:.1f} s')
+        except Exception as e:
+            logger.exception(f'Falló el trabajo de reporte {trabajo_id}')
+            TrabajoReporte.objects.filter(pk=trabajo_id).update(estado='error', error=str(e), terminado=timezone.now())
+    finally:
+        if modo != 'proceso':
+            connection.close()  # el hilo del pool no pasa por el ciclo de request de Django
+
+
+def limpiar_trabajos():
+    """Borra los trabajos (y sus archivos) más viejos que REPORTES_TRABAJOS_RETENCION."""
+    limite = timezone.now() - timedelta(seconds=settings.REPORTES_TRABAJOS_RETENCION)
+    viejos = TrabajoReporte.objects.filter(creado__lt=limite).exclude(estado__in=['pendiente', 'en_proceso'])
+    for trabajo in viejos.exclude(archivo=''):
+        try:
+            ruta_archivo(trabajo).unlink()
+        except FileNotFoundError:
+            pass
+    return viejos.delete()[0]
@@ -0,0 +1,242 @@
+from django.core.paginator import Paginator
+from django.db.models import Count, Sum
+from django.shortcuts import render
+
+from .exports import (
+    FORMATOS_STREAMING, exportar_pdf, exportar_streaming, formato_estado, formato_opcional, seccion_queryset,
+)
+from .models import Usuario, Almacen, Proveedor, Categoria, Producto, Rol
+from .report_cache import cachear, clave_reporte, versiones
+
+# nombre -> clase de reporte; cada reporte registrado obtiene HTML paginado, PDF, CSV/NDJSON y resultados en caché
+REPORTES = {}
+
+
+def registrar(clase):
+    REPORTES[clase.nombre] = clase
+    return clase
+
+
+def filtro_estado(queryset, valor):
+    return queryset.filter(estado=(valor == 'activo'))
+
+
+class Reporte:
+    """
+    Definición declarativa de un reporte. Cada subclase indica:
+      - modelo / select_related / orden: forma de la consulta
+      - columnas: [(encabezado, campo_orm[, formateador])]; definen el only() del HTML y el values_list de las exportaciones
+      - filtros: {parametro_GET: lookup | callable(queryset, valor)}
+      - agregados: {clave_contexto: expresión} calculados junto al conteo y guardados en caché
+      - dependencias: modelos cuyos cambios invalidan la caché del reporte (por defecto, el modelo)
+    """
+    nombre = None
+    titulo = None
+    template = None
+    modulo = None
+    modelo = None
+    contexto_objetos = None
+    contexto_total = None
+    select_related = ()
+    orden = ('pk',)
+    columnas = ()
+    filtros = {}
+    agregados = {}
+    dependencias = ()
+    por_pagina = 50
+
+    def __init__(self, params):
+        self.params = {clave: params.get(clave, '').strip() for clave in self.filtros}
+        self.activos = {clave: valor for clave, valor in self.params.items() if valor}
+
+    def queryset(self):
+        queryset = self.modelo.objects.select_related(*self.select_related)
+        for clave, valor in self.activos.items():
+            filtro = self.filtros[clave]
+            queryset = filtro(queryset, valor) if callable(filtro) else queryset.filter(**{filtro: valor})
+        return queryset.order_by(*self.orden)
+
+    def campos_html(self):
+        return [columna[1] for columna in self.columnas]
+
+    def clave_cache(self, *partes):
+        """Clave por filtros normalizados y versión de las dependencias (se leen una vez por instancia)."""
+        if not hasattr(self, '_versiones'):
+            self._versiones = versiones(self.dependencias or (self.modelo,))
+        return clave_reporte(self.nombre, [self.activos, *partes], self._versiones)
+
+    def totales(self, queryset):
+        """Conteo y agregados en una sola consulta, en caché por combinación de filtros."""
+        return cachear(self.clave_cache('totales'),
+                       lambda: queryset.order_by().aggregate(_total=Count('pk'), **self.agregados))
+
+    def pagina(self, queryset, numero, total):
+        """Página del listado HTML; las filas de la página también quedan en caché."""
+        paginator = Paginator(queryset.only(*self.campos_html()), self.por_pagina)
+        paginator.count = total  # evita un segundo COUNT(*)
+        pagina = paginator.get_page(numero)
+        pagina.object_list = cachear(self.clave_cache('pagina', pagina.number), lambda: list(pagina.object_list))
+        return pagina
+
+    def contexto_extra(self):
+        return {}
+
+    def responder(self, request):
+        queryset = self.queryset()
+        formato = request.GET.get('formato', '').strip()
+        if formato in FORMATOS_STREAMING:
+            return exportar_streaming(queryset, self.columnas, formato, self.nombre)
+        if request.GET.get('exportar') == '1':
+            return exportar_pdf(self.titulo, [seccion_queryset(queryset, self.columnas)], self.nombre)
+
+        contexto = {
+            'consulta_realizada': bool(self.activos), self.contexto_objetos: [], 'pagina': None,
+            'reporte_nombre': self.nombre,
+        }
+        if self.activos:
+            # La página de entrada no consulta nada: los resultados solo se muestran con filtros
+            totales = self.totales(queryset)
+            pagina = self.pagina(queryset, request.GET.get('pagina'), totales['_total'])
+            contexto.update({clave: valor or 0 for clave, valor in totales.items() if clave != '_total'})
+            contexto.update({self.contexto_total: totales['_total'], self.contexto_objetos: pagina.object_list,
+                             'pagina': pagina})
+        contexto.update(self.contexto_extra())
+        return render(request, self.template, contexto)
+
+
+@registrar
+class InventarioReporte(Reporte):
+    nombre = 'inventario_completo'
+    titulo = 'Reporte de Inventario Completo'
+    template = 'account/inventario_completo.html'
+    modulo = 'productos'
+    modelo = Producto
+    contexto_objetos = 'productos'
+    contexto_total = 'total_productos'
+    select_related = ('categoria', 'proveedor', 'almacen')
+    orden = ('nombre', 'pk')
+    columnas = (
+        ('Nombre', 'nombre'),
+        ('SKU', 'sku'),
+        ('Categoría', 'categoria__nombre', formato_opcional),
+        ('Proveedor', 'proveedor__nombre', formato_opcional),
+        ('Almacén', 'almacen__nombre', formato_opcional),
+        ('Stock', 'cantidad'),
+        ('Precio unitario', 'precio_unitario'),
+        ('Estado', 'estado', formato_estado),
+    )
+    filtros = {
+        'nombre': 'nombre__icontains',
+        'categoria': 'categoria_id',
+        'proveedor': 'proveedor_id',
+        'estado': filtro_estado,
+    }
+    agregados = {'total_stock': Sum('cantidad')}
+    dependencias = (Producto, Categoria, Proveedor, Almacen)
+
+    def contexto_extra(self):
+        return {
+            'categorias': Categoria.objects.only('id', 'nombre'),
+            'proveedores': Proveedor.objects.only('id', 'nombre'),
+        }
+
+
+@registrar
+class UsuariosReporte(Reporte):
+    nombre = 'reporte_usuarios'
+    titulo = 'Reporte de Usuarios'
+    template = 'account/reporte_usuarios.html'
+    modulo = 'usuarios'
+    modelo = Usuario
+    contexto_objetos = 'usuarios'
+    contexto_total = 'total_usuarios'
+    select_related = ('rol',)
+    orden = ('username', 'pk')
+    columnas = (
+        ('Username', 'username'),
+        ('Nombres', 'nombres', formato_opcional),
+        ('Apellidos', 'apellidos', formato_opcional),
+        ('Rol', 'rol__nombre', formato_opcional),
+        ('Estado', 'estado', formato_estado),
+    )
+    filtros = {'nombre': 'username__icontains', 'estado': filtro_estado}
+    dependencias = (Usuario, Rol)
+
+
+@registrar
+class ProveedoresReporte(Reporte):
+    nombre = 'reporte_proveedores'
+    titulo = 'Reporte de Proveedores'
+    template = 'account/reporte_proveedores.html'
+    modulo = 'proveedores'
+    modelo = Proveedor
+    contexto_objetos = 'proveedores'
+    contexto_total = 'total_proveedores'
+    orden = ('nombre', 'pk')
+    columnas = (
+        ('Nombre', 'nombre'),
+        ('Contacto', 'contacto', formato_opcional),
+        ('Teléfono', 'telefono', formato_opcional),
+        ('Email', 'email', formato_opcional),
+        ('Estado', 'estado', formato_estado),
+    )
+    filtros = {'nombre': 'nombre__icontains', 'estado': filtro_estado}
+
+
+@registrar
+class AlmacenesReporte(Reporte):
+    nombre = 'reporte_almacenes'
+    titulo = 'Reporte de Almacenes'
+    template = 'account/reporte_almacenes.html'
+    modulo = 'almacenes'
+    modelo = Almacen
+    contexto_objetos = 'almacenes'
+    contexto_total = 'total_almacenes'
+    select_related = ('responsable',)
+    orden = ('nombre', 'pk')
+    columnas = (
+        ('Nombre', 'nombre'),
+        ('Número', 'numero', formato_opcional),
+        ('Ubicación', 'ubicacion', formato_opcional),
+        ('Responsable', 'responsable__username', formato_opcional),
+        ('Estado', 'estado', formato_estado),
+    )
+    filtros = {'nombre': 'nombre__icontains', 'estado': filtro_estado}
+    dependencias = (Almacen, Usuario)
+
+
+@registrar
+class CategoriasReporte(Reporte):
+    nombre = 'reporte_categorias'
+    titulo = 'Reporte de Categorías'
+    template = 'account/reporte_categorias.html'
+    modulo = 'categorias'
+    modelo = Categoria
+    contexto_objetos = 'categorias'
+    contexto_total = 'total_categorias'
+    orden = ('nombre', 'pk')
+    columnas = (
+        ('Nombre', 'nombre'),
+        ('Descripción', 'descripcion', formato_opcional),
+        ('Icono', 'icono'),
+        ('Estado', 'estado', formato_estado),
+    )
+    filtros = {'nombre': 'nombre__icontains', 'estado': filtro_estado}
+
+
+@registrar
+class RolesReporte(Reporte):
+    nombre = 'reporte_roles'
+    titulo = 'Reporte de Roles'
+    template = 'account/reporte_roles.html'
+    modulo = 'roles'
+    modelo = Rol
+    contexto_objetos = 'roles'
+    contexto_total = 'total_roles'
+    columnas = (
+        ('Nombre', 'nombre'),
+        ('Descripción', 'descripcion', formato_opcional),
+        ('Permisos', 'permisos'),
+        ('Estado', 'estado', formato_estado),
+    )
+    filtros = {'nombre': 'nombre__icontains', 'estado': filtro_estado}
@@ -1,7 +1,10 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_in, user_logged_out
-from .models import Log, Producto, Venta, Usuario, Rol, Almacen, Proveedor, Categoria
+from .models import Producto, Venta, DetalleVenta, Kardex, Usuario, Rol, Almacen, Proveedor, Categoria
+from .auditoria import registrar_log
+from .invoices import invalidar_factura
+from .report_cache import invalidar_reportes
 import logging
 import threading
 
@@ -10,21 +13,25 @@ logger = logging.getLogger(__name__)
 # Logs de sesión
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='logs',  # Cambiado a módulo principal
         accion='login',
-        detalles=f'Usuario {user.username} inició sesión desde {request.META.get("REMOTE_ADDR", "IP desconocida")}'
+        detalles=f'Usuario {user.username} inició sesión desde {request.META.get("REMOTE_ADDR", "IP desconocida")}',
+        objeto_tipo='usuario',
+        objeto_id=user.id,
     )
     logger.info(f'Usuario {user.username} inició sesión el {user.last_login}')
 
 @receiver(user_logged_out)
 def log_user_logout(sender, request, user, **kwargs):
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='logs',  # Cambiado a módulo principal
         accion='logout',
-        detalles=f'Usuario {user.username} cerró sesión'
+        detalles=f'Usuario {user.username} cerró sesión',
+        objeto_tipo='usuario',
+        objeto_id=user.id,
     )
     logger.info(f'Usuario {user.username} cerró sesión')
 
@@ -33,22 +40,26 @@ def log_user_logout(sender, request, user, **kwargs):
 def log_producto_change(sender, instance, created, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
     accion = 'crear' if created else 'actualizar'
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='productos',  # Cambiado a módulo principal
         accion=accion,
-        detalles=f'Usuario {user.username if user else "desconocido"} {accion} producto "{instance.nombre}" (ID: {instance.id})'
+        detalles=f'Usuario {user.username if user else "desconocido"} {accion} producto "{instance.nombre}" (ID: {instance.id})',
+        objeto_tipo='producto',
+        objeto_id=instance.id,
     )
     logger.info(f'Producto "{instance.nombre}" fue {accion} por {user.username if user else "usuario desconocido"}')
 
 @receiver(post_delete, sender=Producto)
 def log_producto_delete(sender, instance, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='productos',  # Cambiado a módulo principal
         accion='eliminar',
-        detalles=f'Usuario {user.username if user else "desconocido"} eliminó producto "{instance.nombre}" (ID: {instance.id})'
+        detalles=f'Usuario {user.username if user else "desconocido"} eliminó producto "{instance.nombre}" (ID: {instance.id})',
+        objeto_tipo='producto',
+        objeto_id=instance.id,
     )
     logger.info(f'Producto "{instance.nombre}" fue eliminado por {user.username if user else "usuario desconocido"}')
 
@@ -56,22 +67,26 @@ def log_producto_delete(sender, instance, **kwargs):
 @receiver(post_save, sender=Venta)
 def log_venta_change(sender, instance, created, **kwargs):
     accion = 'crear' if created else 'actualizar'
-    Log.objects.create(
+    registrar_log(
         usuario=instance.usuario,
         modelo='ventas',  # Cambiado a módulo principal
         accion=accion,
-        detalles=f'Venta ID {instance.id} por {instance.usuario.username} - Total: ${instance.total} - Acción: {accion}'
+        detalles=f'Venta ID {instance.id} por {instance.usuario.username} - Total: ${instance.total} - Acción: {accion}',
+        objeto_tipo='venta',
+        objeto_id=instance.id,
     )
     logger.info(f'Venta ID {instance.id} fue {accion} por {instance.usuario.username}')
 
 @receiver(post_delete, sender=Venta)
 def log_venta_delete(sender, instance, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='ventas',  # Cambiado a módulo principal
         accion='eliminar',
-        detalles=f'Usuario {user.username if user else "desconocido"} eliminó venta ID {instance.id}'
+        detalles=f'Usuario {user.username if user else "desconocido"} eliminó venta ID {instance.id}',
+        objeto_tipo='venta',
+        objeto_id=instance.id,
     )
     logger.info(f'Venta ID {instance.id} fue eliminada por {user.username if user else "usuario desconocido"}')
 
@@ -80,22 +95,26 @@ def log_venta_delete(sender, instance, **kwargs):
 def log_usuario_change(sender, instance, created, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
     accion = 'crear' if created else 'actualizar'
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='usuarios',  # Cambiado a módulo principal
         accion=accion,
-        detalles=f'Usuario {user.username if user else "desconocido"} {accion} usuario "{instance.username}" (ID: {instance.id})'
+        detalles=f'Usuario {user.username if user else "desconocido"} {accion} usuario "{instance.username}" (ID: {instance.id})',
+        objeto_tipo='usuario',
+        objeto_id=instance.id,
     )
     logger.info(f'Usuario "{instance.username}" fue {accion} por {user.username if user else "usuario desconocido"}')
 
 @receiver(post_delete, sender=Usuario)
 def log_usuario_delete(sender, instance, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='usuarios',  # Cambiado a módulo principal
         accion='eliminar',
-        detalles=f'Usuario {user.username if user else "desconocido"} eliminó usuario "{instance.username}" (ID: {instance.id})'
+        detalles=f'Usuario {user.username if user else "desconocido"} eliminó usuario "{instance.username}" (ID: {instance.id})',
+        objeto_tipo='usuario',
+        objeto_id=instance.id,
     )
     logger.info(f'Usuario "{instance.username}" fue eliminado por {user.username if user else "usuario desconocido"}')
 
@@ -104,22 +123,26 @@ def log_usuario_delete(sender, instance, **kwargs):
 def log_rol_change(sender, instance, created, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
     accion = 'crear' if created else 'actualizar'
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='roles',  # Cambiado a módulo principal
         accion=accion,
-        detalles=f'Usuario {user.username if user else "desconocido"} {accion} rol "{instance.nombre}" (ID: {instance.id})'
+        detalles=f'Usuario {user.username if user else "desconocido"} {accion} rol "{instance.nombre}" (ID: {instance.id})',
+        objeto_tipo='rol',
+        objeto_id=instance.id,
     )
     logger.info(f'Rol "{instance.nombre}" fue {accion} por {user.username if user else "usuario desconocido"}')
 
 @receiver(post_delete, sender=Rol)
 def log_rol_delete(sender, instance, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='roles',  # Cambiado a módulo principal
         accion='eliminar',
-        detalles=f'Usuario {user.username if user else "desconocido"} eliminó rol "{instance.nombre}" (ID: {instance.id})'
+        detalles=f'Usuario {user.username if user else "desconocido"} eliminó rol "{instance.nombre}" (ID: {instance.id})',
+        objeto_tipo='rol',
+        objeto_id=instance.id,
     )
     logger.info(f'Rol "{instance.nombre}" fue eliminado por {user.username if user else "usuario desconocido"}')
 
@@ -128,22 +151,26 @@ def log_rol_delete(sender, instance, **kwargs):
 def log_almacen_change(sender, instance, created, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
     accion = 'crear' if created else 'actualizar'
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='almacenes',  # Cambiado a módulo principal
         accion=accion,
-        detalles=f'Usuario {user.username if user else "desconocido"} {accion} almacén "{instance.nombre}" (ID: {instance.id})'
+        detalles=f'Usuario {user.username if user else "desconocido"} {accion} almacén "{instance.nombre}" (ID: {instance.id})',
+        objeto_tipo='almacen',
+        objeto_id=instance.id,
     )
     logger.info(f'Almacén "{instance.nombre}" fue {accion} por {user.username if user else "usuario desconocido"}')
 
 @receiver(post_delete, sender=Almacen)
 def log_almacen_delete(sender, instance, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='almacenes',  # Cambiado a módulo principal
         accion='eliminar',
-        detalles=f'Usuario {user.username if user else "desconocido"} eliminó almacén "{instance.nombre}" (ID: {instance.id})'
+        detalles=f'Usuario {user.username if user else "desconocido"} eliminó almacén "{instance.nombre}" (ID: {instance.id})',
+        objeto_tipo='almacen',
+        objeto_id=instance.id,
     )
     logger.info(f'Almacén "{instance.nombre}" fue eliminado por {user.username if user else "usuario desconocido"}')
 
@@ -152,22 +179,26 @@ def log_almacen_delete(sender, instance, **kwargs):
 def log_proveedor_change(sender, instance, created, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
     accion = 'crear' if created else 'actualizar'
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='proveedores',  # Cambiado a módulo principal
         accion=accion,
-        detalles=f'Usuario {user.username if user else "desconocido"} {accion} proveedor "{instance.nombre}" (ID: {instance.id})'
+        detalles=f'Usuario {user.username if user else "desconocido"} {accion} proveedor "{instance.nombre}" (ID: {instance.id})',
+        objeto_tipo='proveedor',
+        objeto_id=instance.id,
     )
     logger.info(f'Proveedor "{instance.nombre}" fue {accion} por {user.username if user else "usuario desconocido"}')
 
 @receiver(post_delete, sender=Proveedor)
 def log_proveedor_delete(sender, instance, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='proveedores',  # Cambiado a módulo principal
         accion='eliminar',
-        detalles=f'Usuario {user.username if user else "desconocido"} eliminó proveedor "{instance.nombre}" (ID: {instance.id})'
+        detalles=f'Usuario {user.username if user else "desconocido"} eliminó proveedor "{instance.nombre}" (ID: {instance.id})',
+        objeto_tipo='proveedor',
+        objeto_id=instance.id,
     )
     logger.info(f'Proveedor "{instance.nombre}" fue eliminado por {user.username if user else "usuario desconocido"}')
 
@@ -176,21 +207,51 @@ def log_proveedor_delete(sender, instance, **kwargs):
 def log_categoria_change(sender, instance, created, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
     accion = 'crear' if created else 'actualizar'
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='categorias',  # Cambiado a módulo principal
         accion=accion,
-        detalles=f'Usuario {user.username if user else "desconocido"} {accion} categoría "{instance.nombre}" (ID: {instance.id})'
+        detalles=f'Usuario {user.username if user else "desconocido"} {accion} categoría "{instance.nombre}" (ID: {instance.id})',
+        objeto_tipo='categoria',
+        objeto_id=instance.id,
     )
     logger.info(f'Categoría "{instance.nombre}" fue {accion} por {user.username if user else "usuario desconocido"}')
 
 @receiver(post_delete, sender=Categoria)
 def log_categoria_delete(sender, instance, **kwargs):
     user = getattr(threading.current_thread(), 'user', None)
-    Log.objects.create(
+    registrar_log(
         usuario=user,
         modelo='categorias',  # Cambiado a módulo principal
         accion='eliminar',
-        detalles=f'Usuario {user.username if user else "desconocido"} eliminó categoría "{instance.nombre}" (ID: {instance.id})'
+        detalles=f'Usuario {user.username if user else "desconocido"} eliminó categoría "{instance.nombre}" (ID: {instance.id})',
+        objeto_tipo='categoria',
+        objeto_id=instance.id,
     )
-    logger.info(f'Categoría "{instance.nombre}" fue eliminada por {user.username if user else "usuario desconocido"}')
\ No newline at end of file
+    logger.info(f'Categoría "{instance.nombre}" fue eliminada por {user.username if user else "usuario desconocido"}')
+
+# Caché de facturas: cualquier cambio en la venta o sus líneas descarta el PDF guardado
+@receiver(post_save, sender=Venta)
+@receiver(post_delete, sender=Venta)
+def invalidar_factura_venta(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidar_factura(instance.id)
+
+@receiver(post_save, sender=DetalleVenta)
+@receiver(post_delete, sender=DetalleVenta)
+def invalidar_factura_detalle(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidar_factura(instance.venta_id)
+
+# Caché de reportes: un cambio en cualquiera de estos modelos invalida los reportes que lo consultan.
+# Los bulk_create y update() no emiten señales: quienes los usan invalidan explícitamente.
+MODELOS_REPORTES = (Producto, Venta, DetalleVenta, Kardex, Categoria, Proveedor, Almacen, Usuario, Rol)
+
+def invalidar_reportes_modelo(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return  # el inicio de sesión no cambia nada de lo que muestran los reportes
+    invalidar_reportes(sender)
+
+for modelo in MODELOS_REPORTES:
+    post_save.connect(invalidar_reportes_modelo, sender=modelo, dispatch_uid=f'reportes_{modelo._meta.model_name}_save')
+    post_delete.connect(invalidar_reportes_modelo, sender=modelo, dispatch_uid=f'reportes_{modelo._meta.model_name}_delete')
@@ -1,3 +1,964 @@
-from django.test import TestCase
+import csv
+import json
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here....
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from reportlab.platypus import Paragraph
+
+from Nova.asgi import application as aplicacion_asgi
+
+from .auditoria import BufferAuditoria, registrar_log
+from .checkout import VentaError, _construir_detalles as construir_detalles, procesar_venta
+from .exports import _tablas, generar_pdf
+from .importer import importar_ventas
+from .report_jobs import ruta_archivo, solicitar_reporte
+from .reconciliation import MOTIVO_CONCILIACION, corregir, descuadres, stock_esperado
+from .reports import REPORTES
+from .forms import ProductoForm
+from .views import _filtrar_kardex, _filtrar_logs, _filtros_logs
+from .invoices import exportar_facturas_zip
+from .log_archive import archivar_logs, buscar_archivo
+from .log_stream import hub
+from .models import (
+    Usuario, Almacen, Producto, Venta, DetalleVenta, Kardex, Log, LogResumen, ConsecutivoFactura, VentaResumenDiario, StockSnapshot,
+    StockInsuficienteError,
+)
+
+# Cada evento de auditoría se escribe en el acto: las pruebas cuentan logs sin esperar al hilo de lotes
+AUDITORIA_SINCRONA = override_settings(AUDITORIA_MODO='sincrono')
+
+
+def setUpModule():
+    AUDITORIA_SINCRONA.enable()
+
+
+def tearDownModule():
+    AUDITORIA_SINCRONA.disable()
+
+
+def _crear_productos(n, cantidad=10):
+    return [
+        Producto.objects.create(
+            nombre=f'Producto {i}', sku=f'SKU-{i}', precio_unitario=Decimal('1000'), cantidad=cantidad
+        )
+        for i in range(n)
+    ]
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='cajero', password='clave-segura-123')
+
+    def test_venta_descuenta_stock_y_registra_kardex(self):
+        prod = _crear_productos(1)[0]
+        venta = procesar_venta(self.usuario, [(prod.id, 3)], 'Cliente', '123')
+
+        prod.refresh_from_db()
+        self.assertEqual(prod.cantidad, 7)
+        self.assertEqual(venta.total, Decimal('3570.00'))
+        kardex = Kardex.objects.get(producto=prod)
+        self.assertEqual((kardex.tipo, kardex.cantidad, kardex.stock_anterior), ('salida', 3, 10))
+
+    def test_consultas_constantes_por_numero_de_lineas(self):
+        productos = _crear_productos(42)
+        # La primera venta crea el consecutivo de factura del NIT
+        procesar_venta(self.usuario, [(productos[0].id, 1)])
+
+        with CaptureQueriesContext(connection) as una_linea:
+            procesar_venta(self.usuario, [(productos[1].id, 1)])
+        with CaptureQueriesContext(connection) as cuarenta_lineas:
+            procesar_venta(self.usuario, [(p.id, 1) for p in productos[2:]])
+
+        self.assertEqual(len(una_linea), len(cuarenta_lineas))
+
+    def test_clave_idempotencia_devuelve_venta_original(self):
+        prod = _crear_productos(1)[0]
+        original = procesar_venta(self.usuario, [(prod.id, 2)], clave_idempotencia='abc123')
+
+        with CaptureQueriesContext(connection) as reenvio:
+            repetida = procesar_venta(self.usuario, [(prod.id, 2)], clave_idempotencia='abc123')
+
+        self.assertEqual(len(reenvio), 1)
+        self.assertEqual((repetida.pk, repetida.numero_factura), (original.pk, original.numero_factura))
+        prod.refresh_from_db()
+        self.assertEqual(prod.cantidad, 8)
+
+    def test_stock_insuficiente_revierte_toda_la_venta(self):
+        prod_ok, prod_sin_stock = _crear_productos(2, cantidad=2)
+
+        with self.assertRaises(VentaError):
+            procesar_venta(self.usuario, [(prod_ok.id, 1), (prod_sin_stock.id, 5)])
+
+        prod_ok.refresh_from_db()
+        self.assertEqual(prod_ok.cantidad, 2)
+        self.assertFalse(Venta.objects.exists())
+        self.assertFalse(DetalleVenta.objects.exists())
+        self.assertFalse(Kardex.objects.exists())
+
+
+class ImportacionVentasTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='cajero', password='clave-segura-123')
+
+    def test_importa_por_lotes_y_reporta_errores_por_venta(self):
+        prod_a, prod_b = _crear_productos(2, cantidad=5)
+        ventas = [
+            {'referencia': 'T1-1', 'fecha': '2026-01-10T09:30:00', 'lineas': [{'producto': prod_a.id, 'cantidad': 2}]},
+            {'referencia': 'T1-2', 'lineas': [{'producto': prod_a.id, 'cantidad': 4}]},
+            {'referencia': 'T1-3', 'lineas': [{'producto': 999999, 'cantidad': 1}]},
+            {'referencia': 'T1-4', 'lineas': [{'producto': prod_a.id, 'cantidad': 3}, {'producto': prod_b.id, 'cantidad': 1}]},
+            {'referencia': 'T1-5', 'lineas': []},
+        ]
+
+        resultado = importar_ventas(ventas, self.usuario, tamano_lote=2)
+
+        self.assertEqual((resultado['creadas'], resultado['lineas']), (2, 3))
+        self.assertEqual([e['referencia'] for e in resultado['errores']], ['T1-2', 'T1-3', 'T1-5'])
+        prod_a.refresh_from_db()
+        self.assertEqual(prod_a.cantidad, 0)
+        self.assertEqual(
+            list(Kardex.objects.filter(producto=prod_a).order_by('id').values_list('stock_anterior', flat=True)),
+            [5, 3],
+        )
+        self.assertEqual(sorted(Venta.objects.values_list('numero_factura', flat=True)), [1, 2])
+        self.assertEqual(Venta.objects.get(numero_factura=1).fecha.date().isoformat(), '2026-01-10')
+
+    def test_fecha_inexistente_es_error_de_la_venta(self):
+        prod = _crear_productos(1, cantidad=5)[0]
+        ventas = [
+            {'referencia': 'F-1', 'fecha': '2024-02-30T10:00', 'lineas': [{'producto': prod.id, 'cantidad': 1}]},
+            {'referencia': 'F-2', 'lineas': [{'producto': prod.id, 'cantidad': 2}]},
+        ]
+
+        resultado = importar_ventas(ventas, self.usuario)
+
+        self.assertEqual(resultado['creadas'], 1)
+        self.assertEqual([(e['referencia'], e['error']) for e in resultado['errores']],
+                         [('F-1', 'Fecha inválida: 2024-02-30T10:00.')])
+        prod.refresh_from_db()
+        self.assertEqual(prod.cantidad, 3)
+
+
+@override_settings(FACTURAS_PRERENDER=False)
+class FacturaCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        override = override_settings(FACTURAS_CACHE_DIR=self.cache_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.usuario = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.client.force_login(self.usuario)
+        prod = _crear_productos(1)[0]
+        self.venta = procesar_venta(self.usuario, [(prod.id, 1)], 'Cliente', '123')
+        self.url = reverse('generar_factura', args=[self.venta.id])
+
+    def _pdfs(self):
+        return sorted(Path(self.cache_dir).glob('*.pdf'))
+
+    def test_segunda_descarga_sale_de_cache_y_respeta_etag(self):
+        primera = self.client.get(self.url)
+        contenido = b''.join(primera.streaming_content)
+        self.assertTrue(contenido.startswith(b'%PDF'))
+        self.assertEqual(len(self._pdfs()), 1)
+
+        segunda = self.client.get(self.url)
+        self.assertEqual(b''.join(segunda.streaming_content), contenido)
+        self.assertEqual(segunda['ETag'], primera['ETag'])
+
+        no_modificada = self.client.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(no_modificada.status_code, 304)
+
+    def test_cambio_en_la_venta_invalida_la_cache(self):
+        b''.join(self.client.get(self.url).streaming_content)
+        self.venta.cliente_nombre = 'Otro cliente'
+        self.venta.save()
+        self.assertEqual(self._pdfs(), [])
+
+    @override_settings(FACTURAS_CACHE_MAX_BYTES=1)
+    def test_evicta_por_tamano(self):
+        b''.join(self.client.get(self.url).streaming_content)
+        self.assertEqual(self._pdfs(), [])
+
+
+class PrerenderFacturaTests(TransactionTestCase):
+    def test_factura_queda_en_cache_al_confirmar_la_venta(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        usuario = Usuario.objects.create_user(username='cajero', password='clave-segura-123')
+        prod = _crear_productos(1)[0]
+
+        with override_settings(FACTURAS_CACHE_DIR=cache_dir, FACTURAS_PRERENDER=True):
+            venta = procesar_venta(usuario, [(prod.id, 1)])
+            limite = time.monotonic() + 10
+            while not list(Path(cache_dir).glob(f'venta_{venta.id}_*.pdf')) and time.monotonic() < limite:
+                time.sleep(0.05)
+
+        self.assertEqual(len(list(Path(cache_dir).glob(f'venta_{venta.id}_*.pdf'))), 1)
+
+
+class ExportacionStreamingTests(TestCase):
+    def setUp(self):
+        admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.client.force_login(admin)
+        _crear_productos(25)
+
+    def test_inventario_csv(self):
+        response = self.client.get(reverse('inventario_completo'), {'formato': 'csv', 'estado': 'activo'})
+        self.assertTrue(response.streaming)
+        filas = list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()))
+        self.assertEqual(filas[0][:2], ['Nombre', 'SKU'])
+        self.assertEqual(len(filas), 26)
+        self.assertEqual(filas[1][-1], 'Activo')
+
+    def test_pdf_grande_por_bloques(self):
+        filas = ([f'Fila {i}', str(i)] for i in range(1200))
+        archivo = generar_pdf('Prueba', [(None, ['Nombre', 'Número'], filas)], filas_por_tabla=100)
+        contenido = archivo.read()
+        self.assertTrue(contenido.startswith(b'%PDF'))
+        self.assertGreater(contenido.count(b'/Type /Page\n'), 10)
+
+        response = self.client.get(reverse('inventario_completo'), {'exportar': '1'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_pdf_no_recorta_celdas_y_siempre_lleva_encabezado(self):
+        largo = ', '.join(f'Producto con nombre largo {i} x3' for i in range(8))
+        tabla, = _tablas(['Factura', 'Productos'], [['F-1', largo]], 500, 100)
+        celda = tabla._cellvalues[1][1]
+        self.assertIsInstance(celda, Paragraph)  # ocupa varias líneas en lugar de cortarse
+        self.assertEqual(celda.getPlainText(), largo)
+        self.assertEqual(tabla._cellvalues[0], ['Factura', 'Productos'])
+
+        tabla, = _tablas(['Factura', 'Productos'], [], 500, 100)
+        self.assertEqual(tabla._cellvalues, [['Factura', 'Productos']])
+        archivo = generar_pdf('Vacío', [(None, ['Factura', 'Productos'], []), (None, ['A'], [[largo]] * 300)])
+        self.assertTrue(archivo.read().startswith(b'%PDF'))
+
+    def test_ventas_ndjson_una_fila_por_linea(self):
+        productos = Producto.objects.all()[:2]
+        procesar_venta(Usuario.objects.get(username='admin'), [(p.id, 1) for p in productos])
+        response = self.client.get(reverse('reporte_ventas'), {'formato': 'ndjson'})
+        lineas = [json.loads(linea) for linea in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(lineas), 2)
+        self.assertEqual({linea['producto__nombre'] for linea in lineas}, {p.nombre for p in productos})
+
+
+class ReportesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.client.force_login(admin)
+        _crear_productos(60, cantidad=2)
+
+    def test_registro(self):
+        self.assertEqual(set(REPORTES), {
+            'inventario_completo', 'reporte_usuarios', 'reporte_proveedores',
+            'reporte_almacenes', 'reporte_categorias', 'reporte_roles',
+        })
+        for nombre in REPORTES:
+            for params in ({'estado': 'activo'}, {'estado': 'activo', 'formato': 'csv'}, {'estado': 'activo', 'exportar': '1'}):
+                self.assertEqual(self.client.get(reverse(nombre), params).status_code, 200, (nombre, params))
+
+    def test_html_paginado_con_totales(self):
+        response = self.client.get(reverse('inventario_completo'), {'estado': 'activo', 'pagina': 2})
+        self.assertEqual(response.context['total_productos'], 60)
+        self.assertEqual(response.context['total_stock'], 120)
+        self.assertEqual(len(response.context['productos']), 10)
+        self.assertContains(response, 'Página 2 de 2')
+
+    def test_totales_en_cache(self):
+        url = reverse('inventario_completo')
+        with CaptureQueriesContext(connection) as primera:
+            self.client.get(url, {'nombre': 'Producto'})
+        with CaptureQueriesContext(connection) as segunda:
+            self.client.get(url, {'nombre': 'Producto'})
+        self.assertEqual(len(segunda), len(primera) - 2)  # totales y filas de la página
+
+    def test_cambios_invalidan_la_cache(self):
+        url = reverse('inventario_completo')
+        self.assertEqual(self.client.get(url, {'estado': 'activo'}).context['total_stock'], 120)
+        producto = Producto.objects.order_by('nombre').first()
+        producto.nombre = 'AAA renombrado'
+        producto.save()
+        response = self.client.get(url, {'estado': 'activo'})
+        self.assertEqual(response.context['productos'][0].nombre, 'AAA renombrado')
+        # update() sin señales: mover_stock invalida por su cuenta
+        Kardex.registrar(producto, 'entrada', 5, motivo='ajuste')
+        self.assertEqual(self.client.get(url, {'estado': 'activo'}).context['total_stock'], 125)
+
+    def test_sin_filtros_no_consulta_resultados(self):
+        response = self.client.get(reverse('reporte_usuarios'))
+        self.assertFalse(response.context['consulta_realizada'])
+        self.assertIsNone(response.context['pagina'])
+
+
+class ReporteVentasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.client.force_login(self.admin)
+        self.productos = _crear_productos(2, cantidad=50)
+
+    def _vender(self, n):
+        return [procesar_venta(self.admin, [(p.id, 1) for p in self.productos]) for _ in range(n)]
+
+    def _consultas_reporte(self):
+        hoy = timezone.localdate().isoformat()
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('reporte_ventas'), {'fecha_inicio': hoy, 'fecha_fin': hoy})
+        return response, len(consultas)
+
+    def test_kardex_enlazado_a_la_venta(self):
+        venta = self._vender(1)[0]
+        self.assertEqual(Kardex.objects.filter(venta=venta).count(), 2)
+
+    def test_consultas_constantes(self):
+        self._vender(2)
+        _, pocas = self._consultas_reporte()
+        self._vender(5)
+        response, muchas = self._consultas_reporte()
+        self.assertEqual(pocas, muchas)
+        self.assertEqual(response.context['total_ventas'], 7)
+        movimientos = response.context['movimientos_por_venta']
+        self.assertTrue(all(len(m) == 2 for m in movimientos.values()))
+
+    def test_repetido_sale_de_cache(self):
+        self._vender(2)
+        _, primera = self._consultas_reporte()
+        response, segunda = self._consultas_reporte()
+        self.assertLess(segunda, primera)
+        self.assertEqual(response.context['total_ventas'], 2)
+
+    def test_registros_antiguos_por_mismo_dia(self):
+        venta = self._vender(1)[0]
+        Kardex.objects.update(venta=None)
+        movimientos = Kardex.movimientos_por_venta(
+            list(Venta.objects.prefetch_related('detalleventa_set')), producto_id=self.productos[0].id
+        )
+        self.assertEqual([m.producto_id for m in movimientos[venta.id]], [self.productos[0].id])
+
+
+class ResumenDiarioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.productos = _crear_productos(2, cantidad=50)
+
+    def _filas(self):
+        return sorted(VentaResumenDiario.objects.values_list('fecha', 'producto_id', 'usuario_id', 'unidades', 'neto', 'iva', 'bruto'))
+
+    def test_incremental_igual_a_reconstruccion(self):
+        prod_a, prod_b = self.productos
+        venta = procesar_venta(self.admin, [(prod_a.id, 2), (prod_b.id, 1)])
+        procesar_venta(self.admin, [(prod_a.id, 3)])
+        importar_ventas([{'fecha': '2026-01-10T09:30:00', 'lineas': [{'producto': prod_b.id, 'cantidad': 4}]}], self.admin)
+
+        fila = VentaResumenDiario.objects.get(producto=prod_a, fecha=timezone.localdate())
+        self.assertEqual((fila.unidades, fila.neto, fila.iva, fila.bruto), (5, Decimal('5000.00'), Decimal('950.00'), Decimal('5950.00')))
+        self.assertEqual(VentaResumenDiario.totales()['bruto'], sum(v.total for v in Venta.objects.all()))
+        incremental = self._filas()
+        self.assertEqual(VentaResumenDiario.reconstruir(), 3)
+        self.assertEqual(self._filas(), incremental)
+
+        # Una anulación (signo=-1) descuenta la venta del resumen
+        VentaResumenDiario.acumular([(venta, venta.detalleventa_set.all())], signo=-1)
+        self.assertEqual(VentaResumenDiario.objects.get(producto=prod_a, fecha=timezone.localdate()).unidades, 3)
+
+    def test_reporte_y_dashboard_leen_el_resumen(self):
+        procesar_venta(self.admin, [(self.productos[0].id, 2)])
+        self.client.force_login(self.admin)
+        hoy = timezone.localdate().isoformat()
+        response = self.client.get(reverse('reporte_ventas'), {'fecha_inicio': hoy, 'fecha_fin': hoy})
+        self.assertEqual(response.context['resumen']['unidades'], 2)
+        self.assertEqual(response.context['resumen_por_producto'][0]['producto__nombre'], self.productos[0].nombre)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['ventas_hoy']['bruto'], Decimal('2380.00'))
+
+
+class KardexPaginacionTests(TestCase):
+    def setUp(self):
+        self.admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.client.force_login(self.admin)
+        producto = _crear_productos(1)[0]
+        # Varias filas con la misma fecha: el desempate por id no debe repetir ni saltar filas
+        fechas = [timezone.now() - timedelta(minutes=i % 7) for i in range(230)]
+        Kardex.objects.bulk_create([
+            Kardex(producto=producto, tipo='entrada', cantidad=1, motivo='ajuste', usuario=self.admin, fecha=fecha)
+            for fecha in fechas
+        ])
+        self.esperado = list(Kardex.objects.order_by('fecha', 'id').values_list('id', flat=True))
+
+    def _pagina(self, cursor):
+        return self.client.get(reverse('kardex_api'), {'limite': 50, **({'cursor': cursor} if cursor else {})}).json()
+
+    def _recorrer(self, datos, clave):
+        paginas = [[fila['id'] for fila in datos['resultados']]]
+        while datos[clave]:
+            datos = self._pagina(datos[clave])
+            paginas.append([fila['id'] for fila in datos['resultados']])
+        return paginas, datos
+
+    def test_api_recorre_en_ambos_sentidos(self):
+        primera = self._pagina(None)
+        self.assertIsNone(primera['anterior'])
+        paginas, ultima = self._recorrer(primera, 'siguiente')
+        self.assertEqual([i for pagina in paginas for i in pagina], self.esperado)
+        self.assertEqual([len(p) for p in paginas], [50, 50, 50, 50, 30])
+        # Desde la última página hacia atrás se obtienen las mismas páginas
+        hacia_atras, _ = self._recorrer(ultima, 'anterior')
+        self.assertEqual(hacia_atras[::-1], paginas)
+
+    def test_html_consultas_constantes(self):
+        url = reverse('kardex')
+        with CaptureQueriesContext(connection) as primera:
+            response = self.client.get(url)
+        with CaptureQueriesContext(connection) as profunda:
+            self.client.get(url, {'cursor': response.context['pagina'].siguiente})
+        self.assertEqual(len(primera), len(profunda))
+        self.assertEqual(len(response.context['kardex_entries']), 100)
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.client.get(reverse('kardex_api'), {'cursor': 'basura'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('kardex'), {'cursor': 'basura'}).status_code, 200)
+
+
+class StockHistoricoTests(TestCase):
+    def setUp(self):
+        self.admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.almacen = Almacen.objects.create(nombre='Central')
+        self.producto = _crear_productos(1)[0]
+        self.t0 = timezone.now() - timedelta(days=10)
+        Producto.objects.update(fecha_creacion=self.t0 - timedelta(days=1), almacen=self.almacen)
+        # Stock inicial 10: -2 el día 1, +5 el día 3, -1 el día 5 -> 12
+        self._mover([('salida', 2, 1), ('entrada', 5, 3), ('salida', 1, 5)])
+
+    def _mover(self, movimientos):
+        Kardex.registrar_movimientos(
+            [(self.producto.id, tipo, cantidad) for tipo, cantidad, _ in movimientos], motivo='ajuste',
+            extras=[{'fecha': self.t0 + timedelta(days=dia)} for _, _, dia in movimientos],
+        )
+
+    def _stock(self):
+        productos = Producto.objects.all()
+        return [StockSnapshot.stock_en(self.t0 + timedelta(days=dia), productos)[self.producto.id][0] for dia in (0.5, 2, 4, 6)]
+
+    def test_desde_foto_o_stock_actual(self):
+        self.assertEqual(self._stock(), [10, 8, 13, 12])  # sin fotos: hacia atrás desde el stock actual
+
+        StockSnapshot.capturar()
+        StockSnapshot.objects.update(fecha=self.t0 + timedelta(days=2.5), cantidad=8)
+        self.assertEqual(self._stock(), [10, 8, 13, 12])  # hacia atrás y hacia adelante desde la foto
+        with self.assertNumQueries(4):
+            StockSnapshot.stock_en(self.t0 + timedelta(days=4), Producto.objects.all())
+
+        # Una venta importada con fecha anterior a la foto también corrige la foto
+        self._mover([('entrada', 3, 1.5)])
+        self.assertEqual(StockSnapshot.objects.get().cantidad, 11)
+        self.assertEqual(self._stock(), [10, 11, 16, 15])
+        StockSnapshot.objects.all().delete()
+        self.assertEqual(self._stock(), [10, 11, 16, 15])
+
+    def test_importacion_con_fecha_pasada_ajusta_fotos_en_un_update(self):
+        otro = Producto.objects.create(nombre='Otro', sku='SKU-O', precio_unitario=Decimal('1000'), cantidad=20)
+        for dia, cantidad in ((2.5, 8), (4.5, 13)):
+            for prod in (self.producto, otro):
+                StockSnapshot.objects.create(producto=prod, fecha=self.t0 + timedelta(days=dia), cantidad=cantidad,
+                                             precio_unitario=Decimal('1000'))
+        ventas = [
+            {'referencia': f'F-{dia}', 'fecha': (self.t0 + timedelta(days=dia)).isoformat(),
+             'lineas': [{'producto': self.producto.id, 'cantidad': 1}, {'producto': otro.id, 'cantidad': 2}]}
+            for dia in (1.5, 3.5)
+        ]
+
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = importar_ventas(ventas, self.admin)
+
+        self.assertEqual(resultado['creadas'], 2)
+        self.assertEqual(sum('UPDATE "account_stocksnapshot"' in q['sql'] for q in consultas.captured_queries), 1)
+        fotos = StockSnapshot.objects.order_by('fecha', 'producto_id').values_list('producto_id', 'cantidad')
+        self.assertEqual(list(fotos), [(self.producto.id, 7), (otro.id, 6), (self.producto.id, 11), (otro.id, 9)])
+
+    def test_api_valoriza_un_almacen(self):
+        Producto.objects.create(nombre='Sin almacén', sku='SKU-X', precio_unitario=Decimal('1000'), cantidad=3)
+        self.client.force_login(self.admin)
+        fecha = (self.t0 + timedelta(days=4)).astimezone(timezone.get_current_timezone()).date().isoformat()
+        datos = self.client.get(reverse('stock_historico_api'), {'fecha': fecha, 'almacen': self.almacen.id}).json()
+        self.assertEqual([(fila['producto_id'], fila['cantidad']) for fila in datos['resultados']], [(self.producto.id, 13)])
+        self.assertEqual(Decimal(datos['valor_total']), Decimal('13000'))
+        self.assertEqual(self.client.get(reverse('stock_historico_api'), {'fecha': 'ayer'}).status_code, 400)
+
+
+class ConciliacionKardexTests(TestCase):
+    def setUp(self):
+        self.admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.almacen = Almacen.objects.create(nombre='Central')
+        self.productos = _crear_productos(3)
+        Producto.objects.update(almacen=self.almacen)
+        for producto in self.productos:
+            Kardex.registrar(producto, 'salida', 4, motivo='venta')
+            Kardex.registrar(producto, 'entrada', 2, motivo='compra')
+
+    def test_detecta_y_corrige_descuadres(self):
+        self.assertEqual(stock_esperado(), {producto.id: (8, 2) for producto in self.productos})
+        Producto.objects.filter(pk=self.productos[0].pk).update(cantidad=5)  # cambio fuera de Kardex
+        Producto.objects.filter(pk=self.productos[1].pk).update(cantidad=9)
+        Producto.objects.create(nombre='Sin movimientos', sku='SKU-X', precio_unitario=Decimal('1000'), cantidad=3)
+
+        with self.assertNumQueries(3):
+            filas, sin_movimientos = descuadres()
+        self.assertEqual([(fila['producto_id'], fila['diferencia']) for fila in filas],
+                         [(self.productos[0].id, -3), (self.productos[1].id, 1)])
+        self.assertEqual((filas[0]['almacen'], sin_movimientos), ('Central', 1))
+
+        ajustes = corregir([fila['producto_id'] for fila in filas], usuario=self.admin)
+        self.assertEqual(sorted((ajuste.tipo, ajuste.cantidad, ajuste.motivo) for ajuste in ajustes),
+                         [('entrada', 1, MOTIVO_CONCILIACION), ('salida', 3, MOTIVO_CONCILIACION)])
+        self.assertEqual(descuadres()[0], [])
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).cantidad, 5)
+
+    def test_comando_por_almacen(self):
+        Producto.objects.filter(pk=self.productos[2].pk).update(cantidad=1)
+        salida = StringIO()
+        call_command('conciliar_kardex', '--por-almacen', '--corregir', stdout=salida)
+        self.assertIn('1 productos descuadrados', salida.getvalue())
+        self.assertIn('Central: 1, -7, 7', salida.getvalue())
+        self.assertEqual(descuadres()[0], [])
+
+    def test_editar_y_crear_producto_registran_kardex(self):
+        self.client.force_login(self.admin)
+        producto = self.productos[0]
+        datos = {campo: valor for campo, valor in ProductoForm(instance=producto).initial.items() if valor is not None}
+        self.client.post(reverse('producto_editar', args=[producto.pk]), {**datos, 'cantidad': 15})
+        ajuste = Kardex.objects.filter(producto=producto).latest('id')
+        self.assertEqual((ajuste.tipo, ajuste.cantidad, ajuste.stock_anterior, ajuste.motivo), ('entrada', 7, 8, 'ajuste manual'))
+        self.assertEqual(Producto.objects.get(pk=producto.pk).cantidad, 15)
+
+        self.client.post(reverse('producto_crear'), {**datos, 'sku': 'SKU-NUEVO', 'cantidad': 6})
+        nuevo = Producto.objects.get(sku='SKU-NUEVO')
+        self.assertEqual((nuevo.cantidad, stock_esperado([nuevo.id])[nuevo.id]), (6, (6, 1)))
+        self.assertEqual(descuadres()[0], [])
+
+
+@override_settings(AUDITORIA_MODO='lotes', AUDITORIA_LOTE=1000, AUDITORIA_INTERVALO=3600, AUDITORIA_MAX_PENDIENTES=3)
+class AuditoriaTests(TestCase):
+    def setUp(self):
+        self.admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.buffer = BufferAuditoria()
+
+    def test_escribe_en_lote_y_cuenta_descartados(self):
+        antes = timezone.now()
+        for i in range(4):
+            self.buffer.agregar(Log(usuario=self.admin, modelo='productos', accion='leer', detalles=f'{i}', fecha=timezone.now()))
+        self.assertEqual(self.buffer.estadisticas(), {'pendientes': 3, 'escritos': 0, 'descartados': 1, 'fallos': 0})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.vaciar(), 3)
+        self.assertEqual(list(Log.objects.order_by('id').values_list('detalles', flat=True)), ['0', '1', '2'])
+        self.assertTrue(all(fecha >= antes for fecha in Log.objects.values_list('fecha', flat=True)))
+        self.assertEqual(self.buffer.estadisticas()['escritos'], 3)
+
+    def test_base_no_disponible_reencola_el_lote(self):
+        for i in range(2):
+            self.buffer.agregar(Log(usuario=self.admin, modelo='productos', accion='leer', detalles=f'{i}', fecha=timezone.now()))
+        with mock.patch.object(Log.objects, 'bulk_create', side_effect=OperationalError('database is locked')):
+            self.assertEqual(self.buffer.vaciar(), 0)
+        self.buffer.agregar(Log(usuario=self.admin, modelo='productos', accion='leer', detalles='2', fecha=timezone.now()))
+        self.buffer.agregar(Log(usuario=self.admin, modelo='productos', accion='leer', detalles='3', fecha=timezone.now()))
+        self.assertEqual(self.buffer.estadisticas(), {'pendientes': 3, 'escritos': 0, 'descartados': 1, 'fallos': 1})
+
+        self.assertEqual(self.buffer.vaciar(), 3)
+        self.assertEqual(list(Log.objects.order_by('id').values_list('detalles', flat=True)), ['0', '1', '2'])
+
+    def test_solo_encola_al_confirmar(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            registrar_log(self.admin, 'ventas', 'crear', 'venta')
+        self.assertEqual(len(callbacks), 1)  # una transacción revertida no deja el evento
+
+
+class LogsApiTests(TestCase):
+    def setUp(self):
+        self.admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.client.force_login(self.admin)
+        Log.objects.all().delete()
+        self.logs = Log.objects.bulk_create(
+            [Log(usuario=self.admin, modelo='productos', accion='leer', detalles=f'evento {i}') for i in range(5)]
+        )
+        self.url = reverse('logs_api')
+
+    def test_incremental_por_cursor(self):
+        datos = self.client.get(self.url, {'limite': 3}).json()
+        self.assertEqual([fila['detalles'] for fila in datos['resultados']], ['evento 2', 'evento 3', 'evento 4'])
+
+        datos = self.client.get(self.url, {'desde_id': self.logs[0].id, 'limite': 2}).json()
+        self.assertEqual([fila['detalles'] for fila in datos['resultados']], ['evento 1', 'evento 2'])
+        self.assertTrue(datos['hay_mas'])
+        datos = self.client.get(self.url, {'desde_id': datos['ultimo_id'], 'limite': 2}).json()
+        self.assertEqual(([fila['detalles'] for fila in datos['resultados']], datos['hay_mas']), (['evento 3', 'evento 4'], False))
+
+        datos = self.client.get(self.url, {'desde_id': datos['ultimo_id']}).json()
+        self.assertEqual((datos['resultados'], datos['ultimo_id']), ([], self.logs[-1].id))
+        self.assertEqual(self.client.get(self.url, {'desde_id': 'x'}).status_code, 400)
+
+    def test_sin_cambios_responde_304(self):
+        respuesta = self.client.get(self.url, {'desde_id': self.logs[-1].id})
+        etag = respuesta['ETag']
+        self.assertEqual(self.client.get(self.url, {'desde_id': self.logs[-1].id}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Log.objects.create(usuario=self.admin, modelo='ventas', accion='crear', detalles='nuevo')
+        respuesta = self.client.get(self.url, {'desde_id': self.logs[-1].id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual([fila['detalles'] for fila in respuesta.json()['resultados']], ['nuevo'])
+
+
+class LogsStreamTests(TestCase):
+    def setUp(self):
+        self.admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+
+    def _crear_logs(self):
+        # Después del login, que también registra logs
+        self.logs = Log.objects.bulk_create(
+            [Log(usuario=self.admin, modelo='productos', accion='leer', detalles=f'evento {i}') for i in range(3)]
+        )
+
+    def test_wsgi_envia_pendientes_y_pide_reconectar(self):
+        self.client.force_login(self.admin)
+        self._crear_logs()
+        respuesta = self.client.get(reverse('logs_stream'), HTTP_LAST_EVENT_ID=str(self.logs[0].id))
+        contenido = respuesta.content.decode()
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        self.assertTrue(contenido.startswith('retry: '))
+        self.assertEqual([linea for linea in contenido.splitlines() if linea.startswith('id: ')],
+                         [f'id: {self.logs[1].id}', f'id: {self.logs[2].id}'])
+
+    async def test_asgi_recibe_eventos_del_hub(self):
+        await self.async_client.aforce_login(self.admin)
+        await sync_to_async(self._crear_logs)()
+        respuesta = await self.async_client.get(reverse('logs_stream'), {'desde_id': self.logs[1].id})
+        flujo = aiter(respuesta.streaming_content)
+        self.assertTrue((await anext(flujo)).startswith(b'retry: '))
+        self.assertIn(f'id: {self.logs[2].id}'.encode(), await anext(flujo))
+
+        nuevo = await Log.objects.acreate(usuario=self.admin, modelo='ventas', accion='crear', detalles='en vivo')
+        hub.publicar_logs([nuevo, self.logs[2]])  # lo ya enviado no se repite
+        evento = (await anext(flujo)).decode()
+        self.assertTrue(evento.startswith(f'id: {nuevo.id}\nevent: log\n'))
+        self.assertEqual(json.loads(evento.split('data: ')[1])['detalles'], 'en vivo')
+        await flujo.aclose()
+
+    async def test_proceso_asgi_solo_atiende_logs_en_vivo(self):
+        async def estado(ruta):
+            comunicador = ApplicationCommunicator(aplicacion_asgi, {
+                'type': 'http', 'method': 'GET', 'path': ruta, 'query_string': b'', 'headers': [],
+                'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80),
+            })
+            await comunicador.send_input({'type': 'http.request', 'body': b''})
+            inicio = await comunicador.receive_output()
+            await comunicador.wait()
+            return inicio['status']
+
+        # Las descargas en streaming quedarían completas en memoria bajo ASGI: se sirven por WSGI
+        self.assertEqual(await estado(reverse('facturas_exportar')), 404)
+        self.assertNotEqual(await estado(reverse('logs_stream')), 404)
+
+
+class ArchivoLogsTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        override = override_settings(LOGS_ARCHIVO_DIR=self.directorio)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        Log.objects.all().delete()
+        ahora = timezone.now()
+        Log.objects.bulk_create(
+            [Log(usuario=self.admin, modelo='productos', accion='leer', detalles=f'viejo {i}', fecha=ahora - timedelta(days=100 + i))
+             for i in range(5)]
+            + [Log(usuario=None, modelo='ventas', accion='crear', detalles='viejo venta', fecha=ahora - timedelta(days=120))]
+            + [Log(usuario=self.admin, modelo='productos', accion='leer', detalles='reciente', fecha=ahora)]
+        )
+
+    def test_archiva_resume_y_busca(self):
+        self.assertEqual(archivar_logs(dias=90, lote=2), 6)
+        self.assertEqual(list(Log.objects.values_list('detalles', flat=True)), ['reciente'])
+        self.assertEqual(sum(LogResumen.objects.filter(modelo='productos').values_list('cantidad', flat=True)), 5)
+        self.assertEqual(LogResumen.objects.get(modelo='ventas').usuario, None)
+        self.assertTrue(list(Path(self.directorio).glob('logs-*.jsonl.gz')))
+        self.assertEqual(archivar_logs(dias=90), 0)
+
+        encontrados = buscar_archivo(modelo='productos', usuario='admin')
+        self.assertEqual([log['detalles'] for log in encontrados], [f'viejo {i}' for i in range(5)])
+        self.assertEqual(len(buscar_archivo(limite=2)), 2)
+        desde = timezone.now() - timedelta(days=101, hours=12)
+        self.assertEqual([log['detalles'] for log in buscar_archivo(desde=desde)], ['viejo 0', 'viejo 1'])
+
+    def test_listado_paginado_y_con_archivo(self):
+        archivar_logs(dias=90)
+        self.client.force_login(self.admin)
+        respuesta = self.client.get(reverse('logs_listar'), {'modelo': 'productos'})
+        self.assertEqual([log.detalles for log in respuesta.context['logs']], ['reciente'])
+        self.assertIsNone(respuesta.context['archivados'])
+        respuesta = self.client.get(reverse('logs_listar'), {'modelo': 'ventas', 'archivo': '1'})
+        self.assertEqual([log['detalles'] for log in respuesta.context['archivados']], ['viejo venta'])
+        self.assertContains(respuesta, 'viejo venta')
+
+
+class LogsEstructuradosTests(TestCase):
+    def setUp(self):
+        self.admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.client.force_login(self.admin)
+
+    def test_middleware_y_signals_llenan_los_campos(self):
+        producto = _crear_productos(1)[0]
+        datos = {campo: valor for campo, valor in ProductoForm(instance=producto).initial.items() if valor is not None}
+        respuesta = self.client.post(reverse('producto_editar', args=[producto.pk]), {**datos, 'nombre': 'Nuevo'},
+                                     REMOTE_ADDR='10.1.2.3')
+        request_id = respuesta['X-Request-ID']
+        logs = Log.objects.filter(request_id=request_id)
+        self.assertEqual(set(logs.values_list('ip', 'ruta', 'metodo')), {('10.1.2.3', f'/productos/editar/{producto.pk}/', 'POST')})
+        self.assertTrue(logs.filter(objeto_tipo='producto', objeto_id=producto.pk, accion='actualizar').exists())
+
+        filtrados = self.client.get(reverse('logs_listar'), {'objeto_tipo': 'producto', 'objeto_id': producto.pk}).context['logs']
+        self.assertTrue(filtrados and all(log.objeto_id == producto.pk for log in filtrados))
+        self.assertEqual(len(self.client.get(reverse('logs_listar'), {'ip': '10.9.9.9'}).context['logs']), 0)
+
+    def test_completa_logs_antiguos(self):
+        Log.objects.all().delete()
+        antiguos = Log.objects.bulk_create([
+            Log(usuario=self.admin, modelo='informes', accion='exportar',
+                detalles='Usuario admin exportó inventario completo desde /inventario/ (IP: 127.0.0.1)'),
+            Log(usuario=self.admin, modelo='categorias', accion='eliminar', detalles='Usuario admin eliminó categoría "A (ID: 1)" (ID: 4)'),
+            Log(usuario=self.admin, modelo='ventas', accion='crear', detalles='Venta ID 12 por admin - Total: $1 - Acción: crear'),
+            Log(usuario=self.admin, modelo='productos', accion='leer', detalles='texto libre'),
+        ])
+        call_command('completar_campos_logs', '--lote', '2', stdout=StringIO())
+        campos = {log.id: (log.ip, log.ruta, log.metodo, log.objeto_tipo, log.objeto_id) for log in Log.objects.all()}
+        self.assertEqual([campos[log.id] for log in antiguos], [
+            ('127.0.0.1', '/inventario/', 'GET', '', None),
+            (None, '', '', 'categoria', 4),
+            (None, '', '', 'venta', 12),
+            (None, '', '', '', None),
+        ])
+
+
+class IndicesTests(TestCase):
+    """Los filtros de las vistas usan los índices compuestos (EXPLAIN en SQLite y PostgreSQL)."""
+
+    def setUp(self):
+        self.admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.client.force_login(self.admin)
+        self.producto = _crear_productos(1)[0]
+        self.hoy = timezone.localdate().isoformat()
+
+    def assertUsaIndice(self, queryset, indice):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Con tablas de prueba casi vacías el planificador prefiere recorrerlas enteras
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn(indice, queryset.explain())
+
+    def test_kardex(self):
+        rango = {'fecha_inicio': self.hoy, 'fecha_fin': self.hoy}
+        self.assertUsaIndice(_filtrar_kardex({'producto': self.producto.id, **rango}), 'kardex_producto_fecha_idx')
+        self.assertUsaIndice(_filtrar_kardex(rango), 'kardex_fecha_idx')
+
+    def test_logs(self):
+        rango = {'fecha_desde': self.hoy, 'fecha_hasta': self.hoy}
+        self.assertUsaIndice(_filtrar_logs(_filtros_logs(rango)), 'log_fecha_idx')
+        filtrados = _filtrar_logs(_filtros_logs({'modelo': 'ventas', 'accion': 'crear', **rango}))
+        self.assertUsaIndice(filtrados, 'log_modelo_accion_fecha_idx')
+        self.assertUsaIndice(_filtrar_logs(_filtros_logs({'objeto_tipo': 'venta', 'objeto_id': '7'})), 'log_objeto_fecha_idx')
+        self.assertUsaIndice(_filtrar_logs(_filtros_logs({'ip': '10.0.0.1'})), 'log_ip_fecha_idx')
+
+    def test_ventas_por_fecha(self):
+        inicio = timezone.now() - timedelta(days=7)
+        self.assertUsaIndice(Venta.objects.filter(fecha__gte=inicio, fecha__lte=timezone.now()), 'venta_fecha_idx')
+
+
+class ExportacionFacturasTests(TransactionTestCase):
+    def test_zip_contiene_una_factura_por_venta(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        usuario = Usuario.objects.create_user(username='cajero', password='clave-segura-123')
+        productos = _crear_productos(3)
+
+        with override_settings(FACTURAS_CACHE_DIR=cache_dir, FACTURAS_PRERENDER=False,
+                               FACTURAS_EXPORT_MODO='hilo', FACTURAS_EXPORT_WORKERS=2):
+            ventas = [procesar_venta(usuario, [(p.id, 1)]) for p in productos * 2]
+            partes = list(exportar_facturas_zip([v.id for v in ventas], tamano_bloque=2))
+
+        self.assertGreater(len(partes), 2)  # se entrega por partes, no en un solo bloque
+        with zipfile.ZipFile(BytesIO(b''.join(partes))) as archivo_zip:
+            self.assertEqual(
+                sorted(archivo_zip.namelist()),
+                sorted(f'factura_{v.numero_factura}.pdf' for v in ventas),
+            )
+            self.assertTrue(archivo_zip.read(f'factura_{ventas[0].numero_factura}.pdf').startswith(b'%PDF'))
+            self.assertIsNone(archivo_zip.testzip())
+
+
+class TrabajoReporteTests(TransactionTestCase):
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajustes = override_settings(REPORTES_TRABAJOS_DIR=directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.admin = Usuario.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.client.force_login(self.admin)
+        _crear_productos(30)
+
+    def _procesar(self):
+        call_command('procesar_reportes', '--una-vez', '--modo', 'hilo', '--intervalo', '0.05', stdout=StringIO())
+
+    def test_worker_genera_y_reutiliza(self):
+        trabajo = solicitar_reporte(self.admin, 'inventario_completo', 'csv', {'estado': 'activo'})
+        self.assertEqual(solicitar_reporte(self.admin, 'inventario_completo', 'csv', {'estado': 'activo'}), trabajo)
+        self._procesar()
+
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.progreso, trabajo.filas_procesadas), ('completado', 100, 30))
+        self.assertEqual(len(ruta_archivo(trabajo).read_text(encoding='utf-8-sig').splitlines()), 31)
+        # Mismos filtros dentro del TTL: se reutiliza el archivo; otros filtros: trabajo nuevo
+        self.assertEqual(solicitar_reporte(self.admin, 'inventario_completo', 'csv', {'estado': 'activo'}), trabajo)
+        self.assertNotEqual(solicitar_reporte(self.admin, 'inventario_completo', 'pdf', {'estado': 'activo'}), trabajo)
+
+    def test_worker_renueva_conexion_en_cada_vuelta(self):
+        solicitar_reporte(self.admin, 'inventario_completo', 'csv', {'estado': 'activo'})
+        with mock.patch('account.management.commands.procesar_reportes.close_old_connections') as cerrar:
+            self._procesar()
+        # Una vuelta que encola el trabajo y al menos otra que lo ve terminar
+        self.assertGreaterEqual(cerrar.call_count, 2)
+
+    def test_endpoints_polling_y_descarga(self):
+        response = self.client.post(reverse('reporte_trabajo_crear'),
+                                    {'reporte': 'reporte_usuarios', 'formato': 'ndjson', 'estado': 'activo'})
+        self.assertEqual(response.status_code, 202)
+        url_estado = reverse('reporte_trabajo_estado', args=[response.json()['id']])
+        self.assertEqual(self.client.get(url_estado).json()['estado'], 'pendiente')
+
+        self._procesar()
+        datos = self.client.get(url_estado).json()
+        self.assertEqual(datos['estado'], 'completado')
+        descarga = self.client.get(datos['url_descarga'])
+        self.assertEqual(json.loads(b''.join(descarga.streaming_content))['username'], 'admin')
+
+
+@override_settings(FACTURAS_PRERENDER=False)
+class ConsecutivoFacturaTests(TransactionTestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='cajero', password='clave-segura-123')
+
+    def test_numeros_por_nit_independientes(self):
+        self.assertEqual(ConsecutivoFactura.reservar('900-1'), 1)
+        self.assertEqual(ConsecutivoFactura.reservar('900-1', cantidad=5), 2)
+        self.assertEqual(ConsecutivoFactura.reservar('900-2'), 1)
+        self.assertEqual(ConsecutivoFactura.reservar('900-1'), 7)
+
+    def test_rollback_no_deja_huecos(self):
+        prod = _crear_productos(1, cantidad=2)[0]
+        procesar_venta(self.usuario, [(prod.id, 1)])
+
+        def vender_stock_entretanto(*args):
+            # Otra venta se lleva el stock después de la validación: falla dentro de la transacción,
+            # con el número de factura ya reservado
+            Producto.objects.filter(pk=prod.pk).update(cantidad=0)
+            return construir_detalles(*args)
+
+        with mock.patch('account.checkout._construir_detalles', side_effect=vender_stock_entretanto) as espia:
+            with self.assertRaises(VentaError):
+                procesar_venta(self.usuario, [(prod.id, 1)])
+        self.assertTrue(espia.called)
+        self.assertEqual(Venta.objects.count(), 1)
+
+        Producto.objects.filter(pk=prod.pk).update(cantidad=1)
+        venta = procesar_venta(self.usuario, [(prod.id, 1)])
+        self.assertEqual(venta.numero_factura, 2)
+
+    def test_ventas_concurrentes_numeracion_continua(self):
+        hilos, ventas_por_hilo = 8, 5
+        productos = _crear_productos(hilos, cantidad=ventas_por_hilo)
+        errores = []
+
+        def vender(producto):
+            try:
+                for _ in range(ventas_por_hilo):
+                    procesar_venta(self.usuario, [(producto.id, 1)])
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=vender, args=(p,)) for p in productos]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        self.assertEqual(errores, [])
+        numeros = sorted(Venta.objects.values_list('numero_factura', flat=True))
+        self.assertEqual(numeros, list(range(1, hilos * ventas_por_hilo + 1)))
+        self.assertFalse(Producto.objects.exclude(cantidad=0).exists())
+
+
+class MovimientoStockTests(TransactionTestCase):
+    def test_salidas_concurrentes_no_sobrevenden(self):
+        prod = _crear_productos(1, cantidad=5)[0]
+        resultados = []
+
+        def descontar():
+            try:
+                Kardex.registrar(prod, 'salida', 1, motivo='venta')
+                resultados.append(True)
+            except StockInsuficienteError:
+                resultados.append(False)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=descontar) for _ in range(12)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        prod.refresh_from_db()
+        self.assertEqual(prod.cantidad, 0)
+        self.assertEqual(resultados.count(True), 5)
+        anteriores = sorted(Kardex.objects.filter(producto=prod).values_list('stock_anterior', flat=True))
+        self.assertEqual(anteriores, [1, 2, 3, 4, 5])
+
+    def test_movimiento_devuelve_stock_de_la_base(self):
+        prod = _crear_productos(1, cantidad=5)[0]
+        Producto.objects.filter(pk=prod.pk).update(cantidad=8)  # cambio que la instancia no conoce
+
+        entrada = Kardex.registrar(prod, 'entrada', 2, motivo='compra')
+        self.assertEqual((entrada.stock_anterior, entrada.stock_actual()), (8, 10))
+        self.assertTrue(prod.reducir_stock(10))
+        self.assertEqual(prod.cantidad, 0)
+        self.assertFalse(prod.reducir_stock(1))
+
+    def test_stock_insuficiente_solo_reporta_los_faltantes(self):
+        con_stock, sin_stock = _crear_productos(2, cantidad=5)
+        Producto.objects.filter(pk=sin_stock.pk).update(cantidad=1)
+
+        with self.assertRaises(StockInsuficienteError) as error:
+            Producto.mover_stock({con_stock.id: -3, sin_stock.id: -2})
+
+        self.assertEqual(error.exception.productos_ids, [sin_stock.id])
+        self.assertEqual(dict(Producto.objects.values_list('id', 'cantidad')), {con_stock.id: 5, sin_stock.id: 1})
@@ -8,7 +8,8 @@ from .views import (
     productos_listar, producto_crear, producto_editar, producto_eliminar,
     roles_listar, roles_crear, roles_editar, roles_eliminar, informes_listar, inventario_completo,
     reporte_usuarios, reporte_proveedores, reporte_almacenes, reporte_categorias, reporte_roles,
-    ventas_listar, venta_crear, kardex, reporte_ventas, logs_api, logs_listar, generar_factura,
+    ventas_listar, venta_crear, ventas_importar, kardex, kardex_api, stock_historico_api, reporte_ventas, logs_api, logs_stream, logs_listar, generar_factura, facturas_exportar,
+    reporte_trabajo_crear, reporte_trabajo_estado, reporte_trabajo_descargar,
     user_register,
 )
 
@@ -62,21 +63,30 @@ urlpatterns = [
     path('informes/almacenes/', reporte_almacenes, name='reporte_almacenes'),
     path('informes/categorias/', reporte_categorias, name='reporte_categorias'),
     path('informes/roles/', reporte_roles, name='reporte_roles'),  
+    # Exportaciones en segundo plano (el polling va bajo api/ para no registrarse en los logs)
+    path('api/informes/trabajos/', reporte_trabajo_crear, name='reporte_trabajo_crear'),
+    path('api/informes/trabajos/<int:trabajo_id>/', reporte_trabajo_estado, name='reporte_trabajo_estado'),
+    path('informes/trabajos/<int:trabajo_id>/descargar/', reporte_trabajo_descargar, name='reporte_trabajo_descargar'),
     
     # Ventas
     path('ventas/', ventas_listar, name='ventas_listar'),
     path('ventas/crear/', venta_crear, name='venta_crear'),
+    path('ventas/importar/', ventas_importar, name='ventas_importar'),
     
     #Factura
     path('factura/<int:venta_id>/', generar_factura, name='generar_factura'),
+    path('factura/exportar/', facturas_exportar, name='facturas_exportar'),
     
     # Kardex
     path('kardex/', kardex, name='kardex'),
+    path('api/kardex/', kardex_api, name='kardex_api'),
+    path('api/inventario/historico/', stock_historico_api, name='stock_historico_api'),
     
     # Informes adicionales
     path('informes/ventas/', reporte_ventas, name='reporte_ventas'),
     
     # Logs
     path('api/logs/', logs_api, name='logs_api'),
+    path('api/logs/stream/', logs_stream, name='logs_stream'),
     path('logs/', logs_listar, name='logs_listar'),
 ]
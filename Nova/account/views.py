@@ -1,33 +1,42 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
-from django.db.models import Count, Sum, Q 
+from django.db import transaction
+from django.db.models import F
 from .forms import (
     LoginForm, CustomUserCreationForm, CustomUserChangeForm,
     AlmacenForm, ProveedorForm, CategoriaForm, ProductoForm, RolForm
 )
-from .models import Usuario, Almacen, Proveedor, Categoria, Producto, Rol, Venta, DetalleVenta, Kardex, Log
+from .models import (
+    Usuario, Almacen, Proveedor, Categoria, Producto, Rol, Venta, DetalleVenta, Kardex, Log, TrabajoReporte,
+    VentaResumenDiario, StockSnapshot,
+)
 from .decorators import login_required_custom, role_required, _user_has_permission
+from .checkout import VentaError, leer_items_formulario, procesar_venta
+from .importer import importar_ventas
+from .invoices import abrir_factura, huella_factura, exportar_facturas_zip
+from .exports import FORMATOS_STREAMING, exportar_pdf, exportar_streaming, formato_opcional
+from .reports import (
+    REPORTES, InventarioReporte, UsuariosReporte, ProveedoresReporte, AlmacenesReporte, CategoriasReporte, RolesReporte,
+)
+from .report_jobs import TrabajoReporteError, ruta_archivo, solicitar_reporte
+from .report_cache import cachear, clave_reporte, versiones
+from .pagination import CursorInvalido, paginar_por_cursor
+from .log_stream import consultar_logs, flujo_logs, formato_sse
+from . import log_archive
 from account.models import Usuario
 
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfgen import canvas
-from io import BytesIO
-from django.http import FileResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
 from django.http import JsonResponse
-from django.http import HttpResponse
-from django.utils.timezone import make_aware
-from datetime import datetime
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.timezone import is_aware, localdate, make_aware
+from datetime import datetime, timedelta
 import json
-import qrcode
-import hashlib
-import io
-from barcode import Code128
-from barcode.writer import ImageWriter
+import uuid
 
 
 # ====================================================
@@ -115,12 +124,17 @@ def dashboard(request):
     # Calcular módulos permitidos basados en permisos de "leer"
     modulos = _get_dashboard_modules() # ← Cambia esto para incluir 'ventas'
     modulos_permitidos = [modulo for modulo in modulos if _user_has_permission(request.user, modulo, 'leer')]
-    
-    return render(request, 'account/dashboard.html', {
+    contexto = {
         'username': request.user.username,
         'rol': request.user.rol,
         'modulos_permitidos': modulos_permitidos  # Nuevo contexto
-    })
+    }
+    if 'ventas' in modulos_permitidos:
+        # Leídos del resumen diario: una consulta pequeña sin importar el volumen histórico
+        hoy = localdate()
+        contexto['ventas_hoy'] = VentaResumenDiario.totales(hoy, hoy)
+        contexto['ventas_mes'] = VentaResumenDiario.totales(hoy.replace(day=1), hoy)
+    return render(request, 'account/dashboard.html', contexto)
 
 
 # ====================================================
@@ -234,7 +248,12 @@ def producto_crear(request):
         if form.is_valid():
             producto = form.save(commit=False)
             producto.estado = True  # ← FORZAR a activo
-            producto.save()
+            inicial, producto.cantidad = producto.cantidad, 0
+            with transaction.atomic():
+                producto.save()
+                # El stock inicial entra por Kardex para que la conciliación cuadre desde el primer día
+                if inicial:
+                    Kardex.registrar(producto, 'entrada', inicial, motivo='stock inicial', usuario=request.user)
             messages.success(request, 'Producto creado exitosamente.')
             return redirect('productos_listar')
         else:
@@ -265,7 +284,15 @@ def producto_editar(request, pk):
         if form.is_valid():
             producto = form.save(commit=False)
             producto.estado = True  # ← FUERZA ACTIVO AL EDITAR (evita cambios accidentales)
-            producto.save()
+            with transaction.atomic():
+                # Un cambio de cantidad en el formulario es un ajuste: se registra en Kardex sobre el stock
+                # vigente (bloqueado), no sobre el que tenía el formulario al abrirse
+                actual = Producto.objects.select_for_update().values_list('cantidad', flat=True).get(pk=producto.pk)
+                nueva, producto.cantidad = producto.cantidad, actual
+                producto.save()
+                if nueva != actual:
+                    Kardex.registrar(producto, 'entrada' if nueva > actual else 'salida', abs(nueva - actual),
+                                     motivo='ajuste manual', usuario=request.user)
             messages.success(request, 'Producto actualizado exitosamente.')
             return redirect('productos_listar')
         else:
@@ -659,311 +686,79 @@ def informes_listar(request):
     })
     
     
-@login_required_custom
-@role_required(module='productos', action='leer')
-def inventario_completo(request):
-    # Leer parámetros de filtros
-    nombre = request.GET.get("nombre", "").strip()
-    categoria_id = request.GET.get("categoria", "").strip()
-    proveedor_id = request.GET.get("proveedor", "").strip()
-    estado = request.GET.get("estado", "").strip()
-    exportar = request.GET.get("exportar") == "1"
-    # Consulta base con productos activos/inactivos
-    productos = Producto.objects.select_related('categoria', 'proveedor', 'almacen').all()
-    # Aplicar filtros
-    if nombre:
-        productos = productos.filter(nombre__icontains=nombre)
-    if categoria_id:
-        productos = productos.filter(categoria__id=categoria_id)
-    if proveedor_id:
-        productos = productos.filter(proveedor__id=proveedor_id)
-    if estado:
-        productos = productos.filter(estado=(estado == "activo"))
-    # Calcular totales (ej. stock total)
-    total_productos = productos.count()
-    total_stock = productos.aggregate(total=Sum('cantidad'))['total'] or 0
-    consulta_realizada = any([nombre, categoria_id, proveedor_id, estado])
-    # Exportar a PDF si se solicita
-    if exportar:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        title = Paragraph("Reporte de Inventario Completo", styles['Heading1'])
-        elements.append(title)
-        data = [['Nombre', 'SKU', 'Categoría', 'Proveedor', 'Stock', 'Estado']]
-        for prod in productos:
-            data.append([
-                prod.nombre,
-                prod.sku,
-                prod.categoria.nombre if prod.categoria else '-',
-                prod.proveedor.nombre if prod.proveedor else '-',
-                str(prod.cantidad),
-                'Activo' if prod.estado else 'Inactivo'
-            ])
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.skyblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(table)
-        doc.build(elements)
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename="inventario_completo.pdf")
-    # Datos para filtros en template
-    categorias = Categoria.objects.all()
-    proveedores = Proveedor.objects.all()
-    return render(request, 'account/inventario_completo.html', {
-        'productos': productos,
-        'consulta_realizada': consulta_realizada,
-        'categorias': categorias,
-        'proveedores': proveedores,
-        'total_productos': total_productos,
-        'total_stock': total_stock,
-    })
+def vista_reporte(reporte):
+    """Vista para un reporte declarado en reports.py (mismo permiso de lectura del módulo)."""
+    @login_required_custom
+    @role_required(module=reporte.modulo, action='leer')
+    def vista(request):
+        return reporte(request.GET).responder(request)
+    vista.__name__ = reporte.nombre
+    return vista
+
+
+inventario_completo = vista_reporte(InventarioReporte)
+reporte_usuarios = vista_reporte(UsuariosReporte)
+reporte_proveedores = vista_reporte(ProveedoresReporte)
+reporte_almacenes = vista_reporte(AlmacenesReporte)
+reporte_categorias = vista_reporte(CategoriasReporte)
+reporte_roles = vista_reporte(RolesReporte)
+
+
+def _trabajo_json(trabajo):
+    return {
+        'id': trabajo.id,
+        'reporte': trabajo.reporte,
+        'formato': trabajo.formato,
+        'estado': trabajo.estado,
+        'progreso': trabajo.progreso,
+        'filas_procesadas': trabajo.filas_procesadas,
+        'filas_totales': trabajo.filas_totales,
+        'error': trabajo.error,
+        'url_descarga': reverse('reporte_trabajo_descargar', args=[trabajo.id]) if trabajo.estado == 'completado' else None,
+    }
 
-@login_required_custom
-@role_required(module='usuarios', action='leer')
-def reporte_usuarios(request):
-    nombre = request.GET.get("nombre", "").strip()
-    estado = request.GET.get("estado", "").strip()
-    exportar = request.GET.get("exportar") == "1"
-    usuarios = Usuario.objects.all()
-    if nombre:
-        usuarios = usuarios.filter(username__icontains=nombre)
-    if estado:
-        usuarios = usuarios.filter(estado=(estado == "activo"))
-    total_usuarios = usuarios.count()
-    consulta_realizada = any([nombre, estado])
-    if exportar:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        title = Paragraph("Reporte de Usuarios", styles['Heading1'])
-        elements.append(title)
-        data = [['Username', 'Nombres', 'Apellidos', 'Rol', 'Estado']]
-        for user in usuarios:
-            data.append([
-                user.username,
-                user.nombres or '-',
-                user.apellidos or '-',
-                user.rol.nombre if user.rol else '-',
-                'Activo' if user.estado else 'Inactivo'
-            ])
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.skyblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(table)
-        doc.build(elements)
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename="reporte_usuarios.pdf")
-    return render(request, 'account/reporte_usuarios.html', {
-        'usuarios': usuarios,
-        'consulta_realizada': consulta_realizada,
-        'total_usuarios': total_usuarios,
-    })
 
-@login_required_custom
-@role_required(module='proveedores', action='leer')
-def reporte_proveedores(request):
-    nombre = request.GET.get("nombre", "").strip()
-    estado = request.GET.get("estado", "").strip()
-    exportar = request.GET.get("exportar") == "1"
-    proveedores = Proveedor.objects.all()
-    if nombre:
-        proveedores = proveedores.filter(nombre__icontains=nombre)
-    if estado:
-        proveedores = proveedores.filter(estado=(estado == "activo"))
-    total_proveedores = proveedores.count()
-    consulta_realizada = any([nombre, estado])
-    if exportar:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        title = Paragraph("Reporte de Proveedores", styles['Heading1'])
-        elements.append(title)
-        data = [['Nombre', 'Contacto', 'Teléfono', 'Email', 'Estado']]
-        for prov in proveedores:
-            data.append([
-                prov.nombre,
-                prov.contacto or '-',
-                prov.telefono or '-',
-                prov.email or '-',
-                'Activo' if prov.estado else 'Inactivo'
-            ])
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.skyblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(table)
-        doc.build(elements)
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename="reporte_proveedores.pdf")
-    return render(request, 'account/reporte_proveedores.html', {
-        'proveedores': proveedores,
-        'consulta_realizada': consulta_realizada,
-        'total_proveedores': total_proveedores,
-    })
+def _puede_ver_reporte(user, nombre):
+    return nombre in REPORTES and _user_has_permission(user, REPORTES[nombre].modulo, 'leer')
+
 
 @login_required_custom
-@role_required(module='almacenes', action='leer')
-def reporte_almacenes(request):
-    nombre = request.GET.get("nombre", "").strip()
-    estado = request.GET.get("estado", "").strip()
-    exportar = request.GET.get("exportar") == "1"
-    almacenes = Almacen.objects.select_related('responsable').all()
-    if nombre:
-        almacenes = almacenes.filter(nombre__icontains=nombre)
-    if estado:
-        almacenes = almacenes.filter(estado=(estado == "activo"))
-    total_almacenes = almacenes.count()
-    consulta_realizada = any([nombre, estado])
-    if exportar:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        title = Paragraph("Reporte de Almacenes", styles['Heading1'])
-        elements.append(title)
-        data = [['Nombre', 'Número', 'Ubicación', 'Responsable', 'Estado']]
-        for alm in almacenes:
-            data.append([
-                alm.nombre,
-                alm.numero or '-',
-                alm.ubicacion or '-',
-                alm.responsable.username if alm.responsable else '-',
-                'Activo' if alm.estado else 'Inactivo'
-            ])
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.skyblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(table)
-        doc.build(elements)
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename="reporte_almacenes.pdf")
-    return render(request, 'account/reporte_almacenes.html', {
-        'almacenes': almacenes,
-        'consulta_realizada': consulta_realizada,
-        'total_almacenes': total_almacenes,
-    })
+def reporte_trabajo_crear(request):
+    """Encola una exportación (POST con reporte, formato y los filtros del formulario del reporte)."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido.'}, status=405)
+    nombre = request.POST.get('reporte', '')
+    if not _puede_ver_reporte(request.user, nombre):
+        return JsonResponse({'error': 'No tienes permiso para este reporte.'}, status=403)
+    try:
+        trabajo = solicitar_reporte(request.user, nombre, request.POST.get('formato', 'csv'), request.POST)
+    except TrabajoReporteError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(_trabajo_json(trabajo), status=202)
+
 
 @login_required_custom
-@role_required(module='categorias', action='leer')
-def reporte_categorias(request):
-    nombre = request.GET.get("nombre", "").strip()
-    estado = request.GET.get("estado", "").strip()
-    exportar = request.GET.get("exportar") == "1"
-    categorias = Categoria.objects.all()
-    if nombre:
-        categorias = categorias.filter(nombre__icontains=nombre)
-    if estado:
-        categorias = categorias.filter(estado=(estado == "activo"))
-    total_categorias = categorias.count()
-    consulta_realizada = any([nombre, estado])
-    if exportar:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        title = Paragraph("Reporte de Categorías", styles['Heading1'])
-        elements.append(title)
-        data = [['Nombre', 'Descripción', 'Icono', 'Estado']]
-        for cat in categorias:
-            data.append([
-                cat.nombre,
-                cat.descripcion or '-',
-                cat.icono,
-                'Activo' if cat.estado else 'Inactivo'
-            ])
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.skyblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(table)
-        doc.build(elements)
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename="reporte_categorias.pdf")
-    return render(request, 'account/reporte_categorias.html', {
-        'categorias': categorias,
-        'consulta_realizada': consulta_realizada,
-        'total_categorias': total_categorias,
-    })
+def reporte_trabajo_estado(request, trabajo_id):
+    """Consulta liviana para el polling del progreso."""
+    trabajo = get_object_or_404(TrabajoReporte.objects.defer('parametros', 'huella'), id=trabajo_id)
+    if not _puede_ver_reporte(request.user, trabajo.reporte):
+        return JsonResponse({'error': 'No tienes permiso para este reporte.'}, status=403)
+    return JsonResponse(_trabajo_json(trabajo))
+
 
 @login_required_custom
-@role_required(module='roles', action='leer')
-def reporte_roles(request):
-    nombre = request.GET.get("nombre", "").strip()
-    estado = request.GET.get("estado", "").strip()
-    exportar = request.GET.get("exportar") == "1"
-    roles = Rol.objects.all()
-    if nombre:
-        roles = roles.filter(nombre__icontains=nombre)
-    if estado:
-        roles = roles.filter(estado=(estado == "activo"))
-    total_roles = roles.count()
-    consulta_realizada = any([nombre, estado])
-    if exportar:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        title = Paragraph("Reporte de Roles", styles['Heading1'])
-        elements.append(title)
-        data = [['Nombre', 'Descripción', 'Permisos', 'Estado']]
-        for rol in roles:
-            data.append([
-                rol.nombre,
-                rol.descripcion or '-',
-                rol.permisos,
-                'Activo' if rol.estado else 'Inactivo'
-            ])
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.skyblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(table)
-        doc.build(elements)
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename="reporte_roles.pdf")
-    return render(request, 'account/reporte_roles.html', {
-        'roles': roles,
-        'consulta_realizada': consulta_realizada,
-        'total_roles': total_roles,
-    })
-    
+def reporte_trabajo_descargar(request, trabajo_id):
+    trabajo = get_object_or_404(TrabajoReporte, id=trabajo_id, estado='completado')
+    if not _puede_ver_reporte(request.user, trabajo.reporte):
+        messages.error(request, 'No tienes permiso para este reporte.')
+        return redirect('informes_listar')
+    try:
+        archivo = open(ruta_archivo(trabajo), 'rb')
+    except FileNotFoundError:
+        messages.error(request, 'El archivo del reporte ya no está disponible; vuelve a generarlo.')
+        return redirect('informes_listar')
+    return FileResponse(archivo, as_attachment=True, filename=f'{trabajo.reporte}.{trabajo.formato}')
+
 # ====================================================
 # --- Funciones para Reportes --- lógica para ventas, Kardex y reporte.
 # ====================================================
@@ -989,207 +784,212 @@ def venta_crear(request):
         # Procesar campos nuevos del cliente
         cliente_nombre = request.POST.get('cliente_nombre')
         cliente_cedula = request.POST.get('cliente_cedula')
-        
-        productos_ids = []
-        cantidades = []
-        for key, value in request.POST.items():
-            if key.startswith('productos[') and value:
-                productos_ids.append(value)
-            elif key.startswith('cantidades[') and value:
-                cantidades.append(int(value))
-        
-        if not productos_ids or not cantidades or len(productos_ids) != len(cantidades):
-            messages.error(request, 'Debe agregar al menos un producto con cantidad válida.')
+
+        try:
+            items = leer_items_formulario(request.POST)
+            venta = procesar_venta(
+                request.user, items, cliente_nombre, cliente_cedula,
+                clave_idempotencia=request.POST.get('clave_idempotencia'),
+            )
+        except VentaError as e:
+            messages.error(request, str(e))
             return redirect('venta_crear')
-        
-        venta = Venta.objects.create(
-            usuario=request.user, 
-            total=0, 
-            cliente_nombre=cliente_nombre, 
-            cliente_cedula=cliente_cedula
-        )
-        total = 0
-        for prod_id, cant in zip(productos_ids, cantidades):
-            try:
-                prod = Producto.objects.get(id=prod_id)
-                stock_anterior = prod.cantidad
-                if prod.reducir_stock(cant):
-                    precio_en_cop = prod.precio_en_cop()
-                    detalle = DetalleVenta.objects.create(
-                        venta=venta, 
-                        producto=prod, 
-                        cantidad=cant, 
-                        precio_unitario=precio_en_cop
-                    )
-                    # Suma el subtotal (que incluye IVA)
-                    total += detalle.subtotal
-                    Kardex.objects.create(
-                        producto=prod, 
-                        tipo='salida', 
-                        cantidad=cant,
-                        stock_anterior=stock_anterior, 
-                        motivo='venta', 
-                        usuario=request.user,
-                        fecha=venta.fecha
-                    )
-                else:
-                    messages.error(request, f'Stock insuficiente para {prod.nombre}.')
-                    return redirect('venta_crear')
-            except Producto.DoesNotExist:
-                messages.error(request, 'Producto no encontrado.')
-                return redirect('venta_crear')
-        
-        venta.total = total  # Ahora incluye IVA
-        venta.save()
+
         messages.success(request, f'Venta creada exitosamente. Número de factura: {venta.numero_factura}.')
         return redirect('ventas_listar')
     
     productos = Producto.objects.filter(estado=True)
-    return render(request, 'account/venta_form.html', {'productos': productos, 'titulo': 'Nueva Venta'})
+    return render(request, 'account/venta_form.html', {
+        'productos': productos,
+        'titulo': 'Nueva Venta',
+        'clave_idempotencia': uuid.uuid4().hex,  # Un reenvío del mismo formulario no duplica la venta
+    })
 
 
 @login_required_custom
-def generar_factura(request, venta_id):
-    venta = get_object_or_404(Venta, id=venta_id)
-    detalles = DetalleVenta.objects.filter(venta=venta)
-    
-    # Datos para CUFE simulado (educativo)
-    cufe_data = f"{venta.nit_empresa}{venta.numero_factura}{venta.fecha.strftime('%Y%m%d%H%M%S')}{venta.total}"
-    cufe = hashlib.sha384(cufe_data.encode()).hexdigest().upper()
-    
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    
-    # Logo (ajusta la ruta si es necesario)
+@role_required(module='ventas', action='crear')
+def ventas_importar(request):
+    """Importación masiva de ventas en JSON: {"ventas": [{"lineas": [...], ...}, ...]}."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido.'}, status=405)
     try:
-        logo_path = 'account/static/account/img/StockNova.jpg'
-        p.drawImage(ImageReader(logo_path), 50, height - 100, width=100, height=50)
-    except:
-        pass  # Si no hay logo, continúa
-    
-    # Título
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(200, height - 60, "Factura Digital - StockNova")
-    
-    # Datos de la factura
-    p.setFont("Helvetica", 10)
-    p.drawString(50, height - 120, f"NIT Emisor: {venta.nit_empresa}")
-    p.drawString(50, height - 140, f"Fecha: {venta.fecha.strftime('%Y-%m-%d %H:%M')}")
-    p.drawString(50, height - 160, f"Número Factura: {venta.numero_factura}")
-    p.drawString(50, height - 180, f"CUFE: {cufe}")  # CUFE simulado
-    p.drawString(50, height - 200, f"Comprador: {venta.cliente_nombre} (Cédula: {venta.cliente_cedula})")
-    p.drawString(50, height - 220, f"Vendedor: {venta.usuario.username}")
-    
-    # Tabla de productos
-    y = height - 260
-    p.setFont("Helvetica-Bold", 10)
-    p.drawString(50, y, "Producto")
-    p.drawString(250, y, "Cant.")
-    p.drawString(300, y, "Precio Unit.")
-    p.drawString(380, y, "IVA (19%)")
-    p.drawString(450, y, "Subtotal")
-    y -= 20
-    
-    p.setFont("Helvetica", 9)
-    productos_lista = []
-    for detalle in detalles:
-        p.drawString(50, y, detalle.producto.nombre[:20])
-        p.drawString(250, y, str(detalle.cantidad))
-        p.drawString(300, y, f"${detalle.precio_unitario}")
-        p.drawString(380, y, f"${detalle.iva * detalle.precio_unitario * detalle.cantidad:.2f}")
-        p.drawString(450, y, f"${detalle.subtotal:.2f}")
-        productos_lista.append({
-            "nombre": detalle.producto.nombre,
-            "cantidad": detalle.cantidad,
-            "precio_unitario": str(detalle.precio_unitario)
-        })
-        y -= 15
-    
-    # Total recalculado (correcto)
-    p.setFont("Helvetica-Bold", 12)
-    total_final = sum(det.subtotal for det in detalles)
-    p.drawString(400, y - 20, f"Total: ${total_final:.2f}")
-    
-    # ===============================
-    # QR MÁS GRANDE Y MÁS ABAJO
-    # ===============================
-    qr_data = json.dumps({
-        "emisor": "StockNova",
-        "nit_emisor": venta.nit_empresa,
-        "numero_factura": venta.numero_factura,
-        "fecha": venta.fecha.strftime('%Y-%m-%d %H:%M'),
-        "comprador": venta.cliente_nombre,
-        "cedula_comprador": venta.cliente_cedula,
-        "vendedor": venta.usuario.username,
-        "productos": productos_lista,
-        "total": str(venta.total),
-        "cufe": cufe  # Agregado CUFE al QR
-    })
+        payload = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'error': 'JSON inválido.'}, status=400)
+    ventas = payload.get('ventas') if isinstance(payload, dict) else payload
+    if not isinstance(ventas, list):
+        return JsonResponse({'error': 'Se esperaba una lista de ventas.'}, status=400)
 
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    img = qr.make_image(fill='black', back_color='white')
-    img_buffer = io.BytesIO()
-    img.save(img_buffer, format='PNG')
-    img_buffer.seek(0)
-
-    # ⬇ QR aumentado y más abajo
-    p.drawImage(
-        ImageReader(img_buffer),
-        50,             # posición horizontal
-        y - 180,        # más abajo que antes (120 → 180)
-        width=150,      # antes 100
-        height=150      # antes 100
+    resultado = importar_ventas(ventas, request.user)
+    return JsonResponse(resultado)
+
+
+@login_required_custom
+def generar_factura(request, venta_id):
+    venta = get_object_or_404(Venta.objects.select_related('usuario'), id=venta_id)
+    detalles = list(DetalleVenta.objects.filter(venta=venta).select_related('producto'))
+
+    # Las facturas emitidas no cambian: se sirven desde caché con ETag
+    huella = huella_factura(venta, detalles)
+    etag = f'"{huella}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    response = FileResponse(
+        abrir_factura(venta, detalles, huella),
+        as_attachment=True,
+        filename=f"factura_{venta.numero_factura}.pdf",
+        content_type='application/pdf',
     )
-    
-    # Código de Barras (simulado)
-    barcode = Code128(cufe, writer=ImageWriter())
-    barcode_buffer = io.BytesIO()
-    barcode.write(barcode_buffer)
-    barcode_buffer.seek(0)
-    p.drawImage(ImageReader(barcode_buffer), 250, y - 180, width=200, height=50)
-    
-    p.showPage()
-    p.save()
-    buffer.seek(0)
-    
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="factura_{venta.numero_factura}.pdf"'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
 
-
 @login_required_custom
-@role_required(module='productos', action='leer')  # Asumir permisos en productos
-def kardex(request):
-    producto_id = request.GET.get('producto')
+@role_required(module='ventas', action='leer')
+def facturas_exportar(request):
+    """Descarga un ZIP con las facturas de un rango de fechas (?fecha_inicio=&fecha_fin=) o de ?ids=1,2,3."""
+    ventas = Venta.objects.all()
+    ids = request.GET.get('ids')
     fecha_inicio = request.GET.get('fecha_inicio')
     fecha_fin = request.GET.get('fecha_fin')
-    kardex_entries = Kardex.objects.all().order_by('fecha')  # Ordenar por fecha
-    
+    if ids:
+        try:
+            ventas = ventas.filter(pk__in=[int(i) for i in ids.split(',') if i.strip()])
+        except ValueError:
+            return JsonResponse({'error': 'El parámetro ids debe ser una lista de enteros separada por comas.'}, status=400)
+    elif fecha_inicio or fecha_fin:
+        if fecha_inicio:
+            ventas = ventas.filter(fecha__date__gte=fecha_inicio)
+        if fecha_fin:
+            ventas = ventas.filter(fecha__date__lte=fecha_fin)
+    else:
+        return JsonResponse({'error': 'Indique un rango de fechas o una lista de ids.'}, status=400)
+
+    venta_ids = list(ventas.order_by('numero_factura').values_list('id', flat=True))
+    if not venta_ids:
+        return JsonResponse({'error': 'No hay ventas para exportar.'}, status=404)
+
+    response = StreamingHttpResponse(exportar_facturas_zip(venta_ids), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="facturas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip"'
+    return response
+
+
+
+KARDEX_POR_PAGINA = 100
+KARDEX_API_MAX = 500
+
+
+def _filtrar_kardex(params):
+    """Filtros comunes de la vista y la API de Kardex (producto y rango de fechas)."""
+    kardex_entries = Kardex.objects.all()
+    producto_id = params.get('producto')
+    fecha_inicio = params.get('fecha_inicio')
+    fecha_fin = params.get('fecha_fin')
     if producto_id:
         kardex_entries = kardex_entries.filter(producto_id=producto_id)
+    # Rangos sobre la columna (no fecha__date, que aplica una función a cada fila) para usar los índices de fecha
     if fecha_inicio:
-        kardex_entries = kardex_entries.filter(fecha__date__gte=fecha_inicio)
+        kardex_entries = kardex_entries.filter(fecha__gte=make_aware(datetime.strptime(fecha_inicio, '%Y-%m-%d')))
     if fecha_fin:
-        kardex_entries = kardex_entries.filter(fecha__date__lte=fecha_fin)
-    productos = Producto.objects.all()
+        kardex_entries = kardex_entries.filter(
+            fecha__lt=make_aware(datetime.strptime(fecha_fin, '%Y-%m-%d') + timedelta(days=1))
+        )
+    return kardex_entries
+
+
+@login_required_custom
+@role_required(module='productos', action='leer')  # Asumir permisos en productos
+def kardex(request):
+    producto_id = request.GET.get('producto')
+    fecha_inicio = request.GET.get('fecha_inicio')
+    fecha_fin = request.GET.get('fecha_fin')
+    kardex_entries = _filtrar_kardex(request.GET).select_related('producto', 'usuario')
+    try:
+        # Por cursor sobre (fecha, id): la página 1.000 cuesta lo mismo que la primera
+        pagina = paginar_por_cursor(kardex_entries, request.GET.get('cursor'), KARDEX_POR_PAGINA)
+    except CursorInvalido:
+        pagina = paginar_por_cursor(kardex_entries, None, KARDEX_POR_PAGINA)
+    productos = Producto.objects.only('id', 'nombre')
     return render(request, 'account/kardex.html', {
-        'kardex_entries': kardex_entries,
+        'kardex_entries': pagina,
+        'pagina': pagina,
         'productos': productos,
         'producto_id': producto_id,
         'fecha_inicio': fecha_inicio,
         'fecha_fin': fecha_fin,
     })
 
+
+@login_required_custom
+@role_required(module='productos', action='leer')
+def kardex_api(request):
+    """Kardex en JSON, paginado por cursor: `siguiente`/`anterior` se pasan como ?cursor=."""
+    try:
+        limite = min(max(int(request.GET.get('limite', KARDEX_POR_PAGINA)), 1), KARDEX_API_MAX)
+        filas = _filtrar_kardex(request.GET).values(
+            'id', 'fecha', 'tipo', 'cantidad', 'stock_anterior', 'motivo', 'producto_id', 'venta_id',
+            producto_nombre=F('producto__nombre'), usuario_username=F('usuario__username'),
+        )
+        pagina = paginar_por_cursor(filas, request.GET.get('cursor'), limite)
+    except (ValueError, CursorInvalido) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    resultados = []
+    for fila in pagina:
+        signo = 1 if fila['tipo'] == 'entrada' else -1
+        resultados.append({**fila, 'stock_actual': fila['stock_anterior'] + signo * fila['cantidad']})
+    return JsonResponse({'resultados': resultados, 'siguiente': pagina.siguiente, 'anterior': pagina.anterior})
+
+
+def _instante(valor):
+    """'AAAA-MM-DD' = al cierre de ese día; también acepta fecha y hora ISO (sin zona = hora local)."""
+    try:
+        return make_aware(datetime.strptime(valor, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        instante = datetime.fromisoformat(valor)
+        return instante if is_aware(instante) else make_aware(instante)
+
+
+@login_required_custom
+@role_required(module='productos', action='leer')
+def stock_historico_api(request):
+    """
+    Stock (y valor en COP) en una fecha pasada, por producto o por almacén completo:
+    ?fecha=AAAA-MM-DD[THH:MM]&producto=<id> | &almacen=<id>. Parte de la foto de stock más cercana.
+    """
+    try:
+        fecha = _instante(request.GET.get('fecha', ''))
+        productos = Producto.objects.all()
+        if request.GET.get('producto'):
+            productos = productos.filter(pk=int(request.GET['producto']))
+        if request.GET.get('almacen'):
+            productos = productos.filter(almacen_id=int(request.GET['almacen']))
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos: fecha AAAA-MM-DD o ISO, producto y almacen numéricos.'}, status=400)
+
+    stock = StockSnapshot.stock_en(fecha, productos)
+    nombres = dict(Producto.objects.filter(pk__in=stock).values_list('id', 'nombre'))
+    resultados = [
+        {'producto_id': prod_id, 'nombre': nombres[prod_id], 'cantidad': cantidad,
+         'precio_unitario': precio, 'valor': cantidad * precio}
+        for prod_id, (cantidad, precio) in sorted(stock.items(), key=lambda item: nombres[item[0]])
+    ]
+    return JsonResponse({
+        'fecha': fecha,
+        'resultados': resultados,
+        'valor_total': sum(fila['valor'] for fila in resultados),
+    })
+
 @login_required_custom
 @role_required(module='ventas', action='leer')
 def reporte_ventas(request):
     fecha_inicio = request.GET.get('fecha_inicio')
     fecha_fin = request.GET.get('fecha_fin')
     producto_id = request.GET.get('producto')
+    formato = request.GET.get('formato', '').strip()
     exportar = request.GET.get('exportar') == '1'
     ventas = Venta.objects.select_related('usuario').prefetch_related('detalleventa_set__producto').all()
     if fecha_inicio:
@@ -1201,81 +1001,55 @@ def reporte_ventas(request):
         ventas = ventas.filter(fecha__lte=fecha_fin_aware)
     if producto_id:
         ventas = ventas.filter(detalleventa__producto_id=producto_id).distinct()
-    total_ventas = ventas.count()
+    if formato in FORMATOS_STREAMING:
+        # Una fila por línea de venta (más útil que concatenar productos en una celda)
+        lineas = DetalleVenta.objects.filter(venta__in=ventas.values('id')).order_by('venta__fecha', 'venta_id', 'id')
+        return exportar_streaming(lineas, [
+            ('Fecha', 'venta__fecha'),
+            ('Número factura', 'venta__numero_factura'),
+            ('Usuario', 'venta__usuario__username'),
+            ('Cliente', 'venta__cliente_nombre', formato_opcional),
+            ('Producto', 'producto__nombre'),
+            ('Cantidad', 'cantidad'),
+            ('Precio unitario', 'precio_unitario'),
+            ('Precio con IVA', 'precio_con_iva'),
+            ('Total venta', 'venta__total'),
+        ], formato, 'reporte_ventas')
     consulta_realizada = any([fecha_inicio, fecha_fin, producto_id])
-    
-    # Crear diccionario de movimientos por venta
-    movimientos_por_venta = {}
-    for venta in ventas:
-        kardex_filter = Kardex.objects.filter(
-            producto__in=venta.detalleventa_set.values_list('producto', flat=True),
-            fecha__date=venta.fecha.date()  # Solo día, sin hora
-        )
-        if producto_id:  # Si hay filtro por producto, limita movimientos a ese producto
-            kardex_filter = kardex_filter.filter(producto_id=producto_id)
-        movimientos_por_venta[venta.id] = kardex_filter.order_by('fecha')
-        
-        # ← MOVER EL PRINT AQUÍ (después de asignar el valor)
-        movimientos = movimientos_por_venta[venta.id]
-        print(f"Venta {venta.id}: {movimientos.count()} movimientos")
-    
+
+    def consultar():
+        lista = list(ventas)  # una consulta (+ prefetch); la plantilla y el PDF reutilizan la lista
+        # Movimientos de Kardex por venta: dos consultas para todo el reporte, agrupadas en memoria
+        return lista, Kardex.movimientos_por_venta(lista, producto_id)
+
+    # En caché por filtros; ventas, stock, productos o usuarios nuevos cambian la versión y la invalidan
+    clave = clave_reporte('reporte_ventas', [fecha_inicio or '', fecha_fin or '', producto_id or ''],
+                          versiones((Venta, DetalleVenta, Kardex, Producto, Usuario)))
+    ventas, movimientos_por_venta = cachear(clave, consultar, filas=lambda resultado: len(resultado[0]))
+    total_ventas = len(ventas)
+
+    # Totales del período desde el resumen diario: cuestan lo mismo con un mes o con años de ventas
+    filtros_resumen = {'producto_id': producto_id} if producto_id else {}
+    resumen = VentaResumenDiario.totales(fecha_inicio, fecha_fin, **filtros_resumen)
+    resumen_por_producto = VentaResumenDiario.agrupado('producto__nombre', fecha_inicio, fecha_fin, **filtros_resumen)[:10]
+
     productos = Producto.objects.all()  # Para el dropdown de productos
     
     if exportar:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Título
-        title = Paragraph("Reporte de Ventas", styles['Heading1'])
-        elements.append(title)
-        
-        # Tabla de Ventas
-        data_ventas = [['Fecha', 'Usuario', 'Productos', 'Total']]
-        for v in ventas:
-            productos_str = ', '.join([f"{d.producto.nombre} (Cant: {d.cantidad}, Precio: ${d.precio_unitario})" for d in v.detalleventa_set.all()])
-            data_ventas.append([v.fecha.strftime('%Y-%m-%d'), v.usuario.username, productos_str, str(v.total)])
-        table_ventas = Table(data_ventas)
-        table_ventas.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.skyblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(table_ventas)
-        
-        # Espacio
-        elements.append(Paragraph("<br/><br/>", styles['Normal']))
-        
-        # Título de Movimientos
-        title_mov = Paragraph("Movimientos de Kardex", styles['Heading2'])
-        elements.append(title_mov)
-        
-        # Tabla de Movimientos
-        data_mov = [['Producto', 'Tipo', 'Stock Anterior', 'Cantidad Movida', 'Stock Actual', 'Motivo', 'Fecha']]
-        for v in ventas:
-            movimientos = movimientos_por_venta.get(v.id, [])
-            for m in movimientos:
-                data_mov.append([
-                    m.producto.nombre, m.tipo, str(m.stock_anterior), str(m.cantidad), str(m.stock_actual()), m.motivo, m.fecha.strftime('%Y-%m-%d %H:%M')
-                ])
-        if data_mov:
-            table_mov = Table(data_mov)
-            table_mov.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ]))
-            elements.append(table_mov)
-        doc.build(elements)
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename="reporte_ventas.pdf")
+        def filas_ventas():
+            for v in ventas:
+                productos_str = ', '.join([f"{d.producto.nombre} (Cant: {d.cantidad}, Precio: ${d.precio_unitario})" for d in v.detalleventa_set.all()])
+                yield [v.fecha.strftime('%Y-%m-%d'), v.usuario.username, productos_str, str(v.total)]
+
+        def filas_movimientos():
+            for v in ventas:
+                for m in movimientos_por_venta.get(v.id, []):
+                    yield [m.producto.nombre, m.tipo, m.stock_anterior, m.cantidad, m.stock_actual(), m.motivo, m.fecha.strftime('%Y-%m-%d %H:%M')]
+
+        return exportar_pdf("Reporte de Ventas", [
+            (None, ['Fecha', 'Usuario', 'Productos', 'Total'], filas_ventas()),
+            ("Movimientos de Kardex", ['Producto', 'Tipo', 'Stock Anterior', 'Cantidad Movida', 'Stock Actual', 'Motivo', 'Fecha'], filas_movimientos()),
+        ], 'reporte_ventas')
     return render(request, 'account/reporte_ventas.html', {
         'ventas': ventas,
         'movimientos_por_venta': movimientos_por_venta,
@@ -1285,6 +1059,8 @@ def reporte_ventas(request):
         'producto_id': producto_id,
         'consulta_realizada': consulta_realizada,
         'total_ventas': total_ventas,
+        'resumen': resumen,
+        'resumen_por_producto': resumen_por_producto,
     })
     
 @login_required_custom
@@ -1308,8 +1084,12 @@ def venta_editar(request, pk):
 def venta_eliminar(request, pk):
     venta = get_object_or_404(Venta, pk=pk)
     if request.method == 'POST':
-        venta.estado = False  # Desactiva en lugar de eliminar
-        venta.save()
+        with transaction.atomic():
+            # UPDATE condicional: dos anulaciones simultáneas no descuentan dos veces del resumen diario
+            if Venta.objects.filter(pk=venta.pk, estado=True).update(estado=False):
+                VentaResumenDiario.acumular([(venta, venta.detalleventa_set.all())], signo=-1)
+            venta.estado = False  # Desactiva en lugar de eliminar
+            venta.save()
         messages.success(request, f'Venta "{venta.id}" desactivada correctamente.')
         return redirect('ventas_listar')
     return render(request, 'account/venta_confirmar_eliminar.html', {'venta': venta})
@@ -1317,53 +1097,162 @@ def venta_eliminar(request, pk):
 # ====================================================
 # --- Funciones para Logs ---
 # ====================================================
+LOGS_API_POR_PAGINA = 50
+LOGS_API_MAX = 200
+
+
 @login_required_custom
 def logs_api(request):
-    logs = Log.objects.all().order_by('-fecha')  # Sin límite, todos los logs
-    data = [{'detalles': log.detalles, 'fecha': str(log.fecha)} for log in logs]
-    return JsonResponse(data, safe=False)
+    """
+    Feed incremental de logs para el dashboard: ?desde_id=N devuelve los registros con id > N en orden
+    (sin desde_id, los últimos `limite`). El cliente vuelve a pedir con el `ultimo_id` recibido, así
+    que cada consulta recorre solo los eventos nuevos por la clave primaria. El ETag es el último id:
+    si no hubo eventos desde la respuesta anterior se contesta 304 sin consultar la página.
+    """
+    try:
+        desde_id = request.GET.get('desde_id')
+        desde_id = int(desde_id) if desde_id not in (None, '') else None
+        limite = min(max(int(request.GET.get('limite', LOGS_API_POR_PAGINA)), 1), LOGS_API_MAX)
+    except ValueError:
+        return JsonResponse({'error': 'desde_id y limite deben ser números enteros.'}, status=400)
+
+    ultimo_id = Log.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    etag = f'"logs-{ultimo_id}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    if desde_id is not None and desde_id >= ultimo_id:
+        logs, hay_mas = [], False
+    else:
+        logs, hay_mas = consultar_logs(desde_id, limite)
+    response = JsonResponse({
+        'resultados': logs,
+        'ultimo_id': logs[-1]['id'] if logs else (desde_id or 0),
+        'hay_mas': hay_mas,
+    })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required_custom
+async def logs_stream(request):
+    """
+    Logs en vivo por Server-Sent Events. Bajo ASGI la conexión queda abierta y recibe los eventos del
+    hub en proceso; el navegador reconecta solo y retoma desde Last-Event-ID. Bajo WSGI no se retiene
+    un worker: se envía lo pendiente y el navegador vuelve a conectar a los LOGS_SSE_REINTENTO ms.
+    """
+    desde_id = request.headers.get('Last-Event-ID') or request.GET.get('desde_id')
+    try:
+        desde_id = int(desde_id) if desde_id else None
+    except ValueError:
+        return JsonResponse({'error': 'desde_id debe ser un número entero.'}, status=400)
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(flujo_logs(desde_id), content_type='text/event-stream')
+    else:
+        logs, _ = await sync_to_async(consultar_logs)(desde_id, settings.LOGS_SSE_PENDIENTES)
+        contenido = f'retry: {settings.LOGS_SSE_REINTENTO}\n\n' + ''.join(formato_sse(evento) for evento in logs)
+        response = HttpResponse(contenido, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # sin buffer en nginx
+    return response
+
+
+LOGS_POR_PAGINA = 100
+
+
+# Filtros exactos sobre los campos estructurados del log (cada uno con su índice por fecha)
+FILTROS_LOGS_EXACTOS = ('ip', 'ruta', 'objeto_tipo', 'objeto_id', 'request_id')
+
+
+def _filtros_logs(params):
+    """
+    Filtros del listado de logs normalizados (None si no se indicó): desde, hasta, usuario, modelo, accion
+    y los de FILTROS_LOGS_EXACTOS. Lanza ValueError si una fecha o el objeto_id no son válidos.
+    """
+    fecha_desde = params.get('fecha_desde')
+    fecha_hasta = params.get('fecha_hasta')
+    filtros = {
+        'desde': make_aware(datetime.strptime(fecha_desde + ' 00:00:00', '%Y-%m-%d %H:%M:%S')) if fecha_desde else None,
+        'hasta': make_aware(datetime.strptime(fecha_hasta + ' 23:59:59', '%Y-%m-%d %H:%M:%S')) if fecha_hasta else None,
+    }
+    for campo in ('usuario', 'modelo', 'accion', *FILTROS_LOGS_EXACTOS):
+        valor = (params.get(campo) or '').strip()
+        filtros[campo] = valor if valor not in ["", "None"] else None
+    if filtros['objeto_id']:
+        filtros['objeto_id'] = int(filtros['objeto_id'])
+    return filtros
+
+
+def _filtrar_logs(filtros):
+    logs = Log.objects.select_related('usuario')
+    if filtros['desde']:
+        logs = logs.filter(fecha__gte=filtros['desde'])
+    if filtros['hasta']:
+        logs = logs.filter(fecha__lte=filtros['hasta'])
+    # Usuario, módulo y acción vienen de listas fijas: igualdad exacta, que sí aprovecha los índices
+    if filtros['usuario']:
+        logs = logs.filter(usuario__username=filtros['usuario'])
+    if filtros['modelo']:
+        logs = logs.filter(modelo=filtros['modelo'])
+    if filtros['accion']:
+        logs = logs.filter(accion=filtros['accion'])
+    for campo in FILTROS_LOGS_EXACTOS:
+        if filtros[campo] is not None:
+            logs = logs.filter(**{campo: filtros[campo]})
+    return logs
 
 
 @login_required_custom
 @role_required(module='logs', action='leer')
 def logs_listar(request):
-    logs = Log.objects.all().order_by('-fecha')
-    
-    # Filtros
     fecha_desde = request.GET.get('fecha_desde')
     fecha_hasta = request.GET.get('fecha_hasta')
     usuario = request.GET.get('usuario')
     modelo = request.GET.get('modelo')
     accion = request.GET.get('accion')
-    
-    if fecha_desde:
-        fecha_desde_aware = make_aware(datetime.strptime(fecha_desde + ' 00:00:00', '%Y-%m-%d %H:%M:%S'))
-        logs = logs.filter(fecha__gte=fecha_desde_aware)
-    if fecha_hasta:
-        fecha_hasta_aware = make_aware(datetime.strptime(fecha_hasta + ' 23:59:59', '%Y-%m-%d %H:%M:%S'))
-        logs = logs.filter(fecha__lte=fecha_hasta_aware)
-    if usuario and usuario not in ["", "None", None]:
-        logs = logs.filter(Q(usuario__username__icontains=usuario))
-    if modelo and modelo not in ["", "None", None]:
-        logs = logs.filter(modelo__icontains=modelo)
-    if accion and accion not in ["", "None", None]:
-        logs = logs.filter(accion__icontains=accion)
+    buscar_archivo = request.GET.get('archivo') == '1'
+    try:
+        filtros = _filtros_logs(request.GET)
+    except ValueError:
+        messages.error(request, 'Filtros inválidos: fechas AAAA-MM-DD y ID de objeto numérico.')
+        filtros = _filtros_logs({})
+    logs = _filtrar_logs(filtros)
+
+    # Más recientes primero, por cursor sobre (fecha, id)
+    try:
+        pagina = paginar_por_cursor(logs, request.GET.get('cursor'), LOGS_POR_PAGINA, descendente=True)
+    except CursorInvalido:
+        pagina = paginar_por_cursor(logs, None, LOGS_POR_PAGINA, descendente=True)
+
+    # Los logs anteriores a la retención están en los archivos mensuales: solo se leen si se piden
+    archivados = log_archive.buscar_archivo(**filtros) if buscar_archivo else None
     
     # Datos para selects
     usuarios = Usuario.objects.all().order_by('username')
     modelos = ['productos', 'usuarios', 'proveedores', 'almacenes', 'categorias', 'roles', 'informes', 'ventas', 'kardex', 'logs']  # Lista fija de módulos principales
     acciones = ['crear', 'leer', 'actualizar', 'eliminar', 'login', 'logout', 'exportar']  # Agregado 'exportar'
+    tipos_objeto = ['producto', 'venta', 'usuario', 'rol', 'almacen', 'proveedor', 'categoria']
     
     return render(request, 'account/logs_listar.html', {
-        'logs': logs,
+        'logs': pagina,
+        'pagina': pagina,
+        'archivados': archivados,
+        'buscar_archivo': buscar_archivo,
+        'max_archivados': settings.LOGS_ARCHIVO_MAX_RESULTADOS,
         'fecha_desde': fecha_desde,
         'fecha_hasta': fecha_hasta,
         'usuario': usuario,
         'modelo': modelo,
         'accion': accion,
+        'filtros_exactos': {campo: request.GET.get(campo, '') for campo in FILTROS_LOGS_EXACTOS},
         'usuarios': usuarios,
         'modelos': modelos,
         'acciones': acciones,
+        'tipos_objeto': tipos_objeto,
     })
     
 # Registro de usuarios
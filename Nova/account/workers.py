@@ -0,0 +1,25 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def inicializar_proceso():
+    """Initializer de los procesos del pool: cada proceso arranca Django con sus propias conexiones."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Nova.settings')
+    import django
+    django.setup()
+
+
+def crear_pool(modo, max_workers, nombre='nova'):
+    """
+    Crea un pool local sin broker externo.
+    modo 'hilo': ThreadPoolExecutor en el mismo proceso.
+    modo 'proceso': ProcessPoolExecutor con contexto 'spawn' (no hereda sockets de la base de datos).
+    """
+    if modo == 'proceso':
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=inicializar_proceso,
+        )
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=nombre)